@@ -12,17 +12,72 @@ load_dotenv()
 class DatabaseConfig:
     """Конфигурация хранилища данных"""
     data_dir: Path = Path(os.getenv('DATA_DIR', 'bot_data'))
+    backend: str = os.getenv('STORAGE_BACKEND', 'json')
+    sqlite_file: str = os.getenv('SQLITE_FILE', 'storage.db')
+    cache_size: int = int(os.getenv('CACHE_SIZE', '1000'))
+    cache_flush_interval: float = float(os.getenv('CACHE_FLUSH_INTERVAL', '5'))
+    io_workers: int = int(os.getenv('STORAGE_IO_WORKERS', '8'))
+    review_snapshot_every: int = int(os.getenv('REVIEW_SNAPSHOT_EVERY', '50'))
+    review_log_max_bytes: int = int(os.getenv('REVIEW_LOG_MAX_BYTES', '65536'))
+    group_commit_window: float = float(os.getenv('GROUP_COMMIT_WINDOW', '0'))
+    archive_after_days: float = float(os.getenv('ARCHIVE_AFTER_DAYS', '0'))
+    archive_interval: float = float(os.getenv('ARCHIVE_INTERVAL', '24'))
 
 @dataclass
 class QuizConfig:
     """Конфигурация викторины"""
     empty_qa_interval: int = int(os.getenv('EMPTY_QA_INTERVAL', '60'))
+    dispatch_workers: int = int(os.getenv('QUIZ_DISPATCH_WORKERS', '16'))
+    restore_batch_size: int = int(os.getenv('QUIZ_RESTORE_BATCH_SIZE', '200'))
+    restore_batch_delay: float = float(os.getenv('QUIZ_RESTORE_BATCH_DELAY', '1'))
+    restore_spread: int = int(os.getenv('QUIZ_RESTORE_SPREAD', '300'))
+    due_queue_users: int = int(os.getenv('QUIZ_DUE_QUEUE_USERS', '1000'))
+    ask_cooldown: int = int(os.getenv('QUIZ_ASK_COOLDOWN', '3600'))
+    open_spread: int = int(os.getenv('QUIZ_OPEN_SPREAD', '900'))
+    max_qps: float = float(os.getenv('QUIZ_MAX_QPS', '10'))
+    lease_ttl: float = float(os.getenv('QUIZ_LEASE_TTL', '0'))
+    replica_id: str = os.getenv('REPLICA_ID', '')
+
+@dataclass
+class OutboxConfig:
+    """Конфигурация очереди исходящих сообщений"""
+    workers: int = int(os.getenv('OUTBOX_WORKERS', '4'))
+    rate: float = float(os.getenv('OUTBOX_RATE', '25'))
+    burst: float = float(os.getenv('OUTBOX_BURST', '25'))
+    chat_rate: float = float(os.getenv('OUTBOX_CHAT_RATE', '1'))
+    chat_burst: float = float(os.getenv('OUTBOX_CHAT_BURST', '5'))
+    retries: int = int(os.getenv('OUTBOX_RETRIES', '3'))
+    retry_delay: float = float(os.getenv('OUTBOX_RETRY_DELAY', '1'))
+
+@dataclass
+class WorkersConfig:
+    """Конфигурация режима нескольких процессов-обработчиков"""
+    processes: int = int(os.getenv('WORKER_PROCESSES', '0'))
+    restart_delay: float = float(os.getenv('WORKER_RESTART_DELAY', '1'))
+    metrics_interval: float = float(os.getenv('WORKER_METRICS_INTERVAL', '60'))
+    concurrency: int = int(os.getenv('WORKER_CONCURRENCY', '32'))
+
+@dataclass
+class ImportConfig:
+    """Конфигурация импорта колод"""
+    batch_size: int = int(os.getenv('IMPORT_BATCH_SIZE', '200'))
+    max_bytes: int = int(os.getenv('IMPORT_MAX_BYTES', str(5 * 1024 * 1024)))
+
+@dataclass
+class BackupConfig:
+    """Конфигурация резервного копирования"""
+    backup_dir: Path = Path(os.getenv('BACKUP_DIR', 'backups'))
+    interval: float = float(os.getenv('BACKUP_INTERVAL', '0'))
+    keep: int = int(os.getenv('BACKUP_KEEP', '7'))
 
 @dataclass
 class BotConfig:
     """Конфигурация бота"""
     token: str = os.getenv('BOT_TOKEN', '')
     version: str = os.getenv('BOT_VERSION', '0.4.0')
+    admin_ids: frozenset = frozenset(
+        user_id.strip() for user_id in os.getenv('ADMIN_IDS', '').split(',') if user_id.strip()
+    )
 
 class Config:
     """
@@ -36,6 +91,10 @@ class Config:
         self.bot = BotConfig()
         self.database = DatabaseConfig()
         self.quiz = QuizConfig()
+        self.outbox = OutboxConfig()
+        self.workers = WorkersConfig()
+        self.importer = ImportConfig()
+        self.backup = BackupConfig()
 
     def _validate_required_env_vars(self):
         """Проверка обязательных переменных окружения"""
@@ -48,6 +107,7 @@ class Config:
                 "Please create .env file with the following variables:\n"
                 "BOT_TOKEN=your_bot_token_here\n"
                 "DATA_DIR=bot_data (optional)\n"
+                "STORAGE_BACKEND=json (optional: json, sqlite)\n"
                 "EMPTY_QA_INTERVAL=60 (optional)\n"
                 "BOT_VERSION=0.4.0 (optional)"
             )
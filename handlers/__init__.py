@@ -7,6 +7,7 @@ from .callbacks import CallbackHandlers
 from .messages import MessageHandlers
 from .settings import SettingsHandlers
 from .stats import StatsHandlers
+from .admin import AdminHandlers
 
 def register_handlers(dp: Dispatcher, quiz_manager, storage):
     """Регистрирует все обработчики в диспетчере"""
@@ -16,6 +17,7 @@ def register_handlers(dp: Dispatcher, quiz_manager, storage):
     messages = MessageHandlers(quiz_manager, storage)
     settings = SettingsHandlers(quiz_manager, storage)
     stats = StatsHandlers(quiz_manager, storage)
+    admin = AdminHandlers(quiz_manager, storage)
     
     callbacks.set_command_handlers(commands)
 
@@ -23,6 +25,8 @@ def register_handlers(dp: Dispatcher, quiz_manager, storage):
     dp.message_created(Command('help'))(commands.help_command)
     dp.message_created(Command('add_qa'))(commands.add_qa_pair)
     dp.message_created(Command('my_qa'))(commands.show_my_qa)
+    dp.message_created(Command('import'))(commands.import_command)
+    dp.message_created(Command('export'))(commands.export_command)
     dp.message_created(Command('remove_qa'))(commands.remove_qa_command)
     dp.message_created(Command('clear_qa'))(commands.clear_qa)
     dp.message_created(Command('start_quiz'))(commands.start_quiz)
@@ -38,5 +42,8 @@ def register_handlers(dp: Dispatcher, quiz_manager, storage):
     dp.message_created(Command('stats'))(stats.show_stats)
     dp.message_created(Command('question_stats'))(stats.show_question_stats)
     
+    dp.message_created(Command('dead_letters'))(admin.show_dead_letters)
+    dp.message_created(Command('replay_dead'))(admin.replay_dead_letters)
+    
     dp.message_created()(messages.handle_regular_message)
     dp.message_callback()(callbacks.handle_callback)
\ No newline at end of file
@@ -0,0 +1,74 @@
+# Copyright (c) 2025 Solovev Ivan, Usenko Evgeny, Alexandrov Arseniy
+
+import asyncio
+from datetime import datetime
+from maxapi.types import MessageCreated
+from core.config import config
+from utils.validators import Validators
+from .base import BaseHandler
+
+class AdminHandlers(BaseHandler):
+    """Обработчики команд администратора (ADMIN_IDS)"""
+
+    SHOW_LETTERS = 5
+    REPLAY_LIMIT = 20
+
+    def _shard_title(self) -> str:
+        """Команды администратора получает каждый процесс-обработчик, ответ подписан шардом"""
+        index, shards = self.quiz_manager.shard
+        return f"[шард {index + 1}/{shards}] " if shards > 1 else ""
+
+    async def _check_admin(self, event: MessageCreated) -> bool:
+        if str(event.from_user.user_id) in config.bot.admin_ids:
+            return True
+        if self.quiz_manager.owns(str(event.from_user.user_id)):
+            await self.answer(event, "❌ Команда доступна только администратору.")
+        return False
+
+    async def show_dead_letters(self, event: MessageCreated):
+        """Обработчик команды /dead_letters"""
+        if not await self._check_admin(event):
+            return
+
+        store = self.quiz_manager.dead_letters
+        total = await asyncio.to_thread(store.count)
+        if not total:
+            await self.answer(event, f"{self._shard_title()}✅ Недоставленных сообщений нет.")
+            return
+
+        lines = [f"{self._shard_title()}📭 Недоставленных сообщений: {total}\n"]
+        for letter in await asyncio.to_thread(store.list, self.SHOW_LETTERS):
+            created = datetime.fromtimestamp(letter["created"]).strftime('%d/%m %H:%M')
+            recipient = letter["chat_id"] or letter["user_id"]
+            lines.append(
+                f"#{letter['id']} {created} → {recipient} ({letter['kind']}, попыток: {letter['attempts']}, "
+                f"повторов: {letter['replays']})\n"
+                f"   {Validators.sanitize_text(letter['error'] or '', 100)}"
+            )
+        lines.append("\nОтправить повторно: `/replay_dead [количество]`")
+        await self.answer(event, "\n".join(lines))
+
+    async def replay_dead_letters(self, event: MessageCreated):
+        """Обработчик команды /replay_dead"""
+        if not await self._check_admin(event):
+            return
+
+        parts = event.message.body.text.split()
+        limit = self.REPLAY_LIMIT
+        if len(parts) > 1:
+            if not parts[1].isdigit() or int(parts[1]) < 1:
+                if self.quiz_manager.owns(str(event.from_user.user_id)):
+                    await self.answer(event, "❌ Используй: `/replay_dead [количество]`")
+                return
+            limit = int(parts[1])
+
+        counts = await self.quiz_manager.replay_dead_letters(limit)
+        left = await asyncio.to_thread(self.quiz_manager.dead_letters.count)
+        await self.answer(
+            event,
+            f"{self._shard_title()}📬 Повторная отправка:\n\n"
+            f"• Доставлено: {counts['sent']}\n"
+            f"• Снова не доставлено: {counts['failed']}\n"
+            f"• Устарело и удалено: {counts['dropped']}\n"
+            f"• Осталось в очереди: {left}"
+        )
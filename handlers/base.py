@@ -13,8 +13,18 @@ class BaseHandler:
         self.storage = storage
         self.keyboard_manager = KeyboardManager
         self.validators = Validators
+        self.outbox = quiz_manager.outbox
         self.logger = logging.getLogger(self.__class__.__name__)
 
+    async def answer(self, event, text: str = None, **kwargs):
+        """
+        Ответ в чат события через общую очередь отправки (вне очереди
+        вопросов викторины). Доставка не ожидается: лимиты чата и повторы
+        не задерживают обработку следующих апдейтов, а ошибки пишет Outbox.
+        """
+        recipient = event.message.recipient
+        return self.outbox.post(chat_id=recipient.chat_id, user_id=recipient.user_id, text=text, **kwargs)
+
 class MessageFormatter:
     """Форматирование сообщений с использованием валидаторов"""
     
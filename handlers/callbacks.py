@@ -35,7 +35,7 @@ class CallbackHandlers(BaseHandler):
             case "cancel_reset_settings":
                 await self.commands.cancel_reset_settings(fake_event)
             case _:
-                await callback.message.answer("❓ Неизвестная команда.")
+                await self.answer(callback, "❓ Неизвестная команда.")
 
     def _create_fake_event(self, callback):
         """Создает фейковое событие для совместимости с обработчиками команд"""
@@ -58,14 +58,16 @@ class CallbackHandlers(BaseHandler):
 
     async def _main_menu(self, callback: MessageCallback):
         """Обработчик возврата в главное меню"""
-        await callback.message.answer(
+        await self.answer(
+            callback,
             "Вы вернулись в главное меню.",
             attachments=[KeyboardManager.get_main_menu_keyboard()]
         )
 
     async def _add_qa_hint(self, callback: MessageCallback):
         """Обработчик подсказки добавления вопроса"""
-        await callback.message.answer(
+        await self.answer(
+            callback,
             "📝 Введите вопрос и ответ в формате:\n"
             "`/add_qa Вопрос || Ответ`\n"
             "Пример:\n"
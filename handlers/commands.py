@@ -1,25 +1,40 @@
 # Copyright (c) 2025 Solovev Ivan, Usenko Evgeny, Alexandrov Arseniy
 
-import asyncio
+import os
+import tempfile
 from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+from core.config import config
 from core.logger import logger
+from maxapi.enums.attachment import AttachmentType
 from maxapi.types import MessageCreated
+from maxapi.types.input_media import InputMedia
+from services.exporter import Exporter
+from services.importer import DeckImporter, download_file
 from .base import BaseHandler, MessageFormatter
 from utils.keyboards import KeyboardManager
 from utils.validators import Validators
 
 class CommandHandlers(BaseHandler):
     """Обработчики команд бота с использованием валидаторов"""
+
+    def __init__(self, quiz_manager, storage):
+        super().__init__(quiz_manager, storage)
+        self.importer = DeckImporter(storage, config.importer.batch_size)
+        self.exporter = Exporter(storage)
     
     async def start_command(self, event: MessageCreated):
         logger.info(f"Получена команда /start от user_id={event.from_user.user_id}")
         """Обработчик команды /start"""
         user_id = str(event.from_user.user_id)
         
-        self.storage.get_user_settings(user_id)
-        self.storage.get_user_qa(user_id)
+        async with self.storage.asession(user_id) as session:
+            session.get_user_settings(user_id)
+            session.get_user_qa(user_id)
 
-        await event.message.answer(
+        await self.answer(
+            event,
             "Добро пожаловать в умную викторину!\n"
             "Я помогу тебе эффективно запоминать информацию с помощью "
             "интервального повторения и адаптивного алгоритма.\n\n"
@@ -30,11 +45,14 @@ class CommandHandlers(BaseHandler):
     async def help_command(self, event: MessageCreated):
         """Обработчик команды /help"""
         logger.info(f"Получена команда /help от user_id={event.from_user.user_id}")
-        await event.message.answer(
+        await self.answer(
+            event,
             "📖 Помощь по командам:\n\n"
             "Добавление вопросов:\n"
             "• /add_qa Вопрос || Ответ - добавить пару\n"
             "• /my_qa - посмотреть все вопросы\n"
+            "• /import - загрузить колоду из файла (CSV, TSV, JSONL, Anki)\n"
+            "• /export [reviews] - выгрузить колоду или историю ответов в CSV\n"
             "• /clear_qa - удалить все вопросы\n\n"
             "Управление викториной:\n"
             "• /start_quiz - запустить\n"
@@ -61,7 +79,8 @@ class CommandHandlers(BaseHandler):
         is_valid, error_msg, qa_data = Validators.validate_question_answer_format(command_text)
         
         if not is_valid:
-            await event.message.answer(
+            await self.answer(
+                event,
                 f"❌ {error_msg}\n\n"
                 "Используй: `/add_qa Вопрос || Ответ`\n\n"
                 "Пример:\n"
@@ -72,26 +91,116 @@ class CommandHandlers(BaseHandler):
         question = Validators.sanitize_text(qa_data["question"], 500)
         answer = Validators.sanitize_text(qa_data["answer"], 200)
 
-        success = self.storage.add_user_qa(user_id, question, answer)
+        async with self.storage.asession(user_id) as session:
+            success = session.add_user_qa(user_id, question, answer)
+            qa_count = len(session.get_user_deck(user_id)["items"])
+        await self.quiz_manager.user_changed(user_id)
         if success:
-            qa_list = self.storage.get_user_qa(user_id)
-            await event.message.answer(
+            await self.answer(
+                event,
                 f"✅ Вопрос добавлен!\n\n"
                 f"Вопрос: {question}\n"
                 f"Ответ: {answer}\n\n"
-                f"📊 Всего вопросов: {len(qa_list)}"
+                f"📊 Всего вопросов: {qa_count}"
             )
         else:
-            await event.message.answer("❌ Ошибка при сохранении вопроса")
+            await self.answer(event, "❌ Ошибка при сохранении вопроса")
+
+    async def import_command(self, event: MessageCreated):
+        """Обработчик команды /import: колода из приложенного файла"""
+        logger.info(f"Получена команда /import от user_id={event.from_user.user_id}")
+        user_id = str(event.from_user.user_id)
+        attachments = event.message.body.attachments or []
+        attachment = next((a for a in attachments if a.type == AttachmentType.FILE), None)
+        fmt = DeckImporter.detect_format(attachment.filename) if attachment else None
+
+        if attachment is None or fmt is None:
+            await self.answer(
+                event,
+                "❌ Приложи к команде файл с вопросами.\n\n"
+                "Поддерживаются форматы:\n"
+                "• `.csv` — вопрос,ответ\n"
+                "• `.tsv` — вопрос и ответ через табуляцию\n"
+                "• `.jsonl` — {\"question\": ..., \"answer\": ...} в каждой строке\n"
+                "• `.txt` — текстовый экспорт Anki"
+            )
+            return
+
+        max_bytes = config.importer.max_bytes
+        if attachment.size and attachment.size > max_bytes:
+            await self.answer(event, f"❌ Файл слишком большой (макс. {max_bytes // 1024} КБ)")
+            return
+
+        fd, tmp_name = tempfile.mkstemp(prefix="import_", suffix=Path(attachment.filename).suffix)
+        os.close(fd)
+        try:
+            if await download_file(attachment.payload.url, Path(tmp_name), max_bytes) is None:
+                await self.answer(event, f"❌ Файл слишком большой (макс. {max_bytes // 1024} КБ)")
+                return
+            result = await self.storage.io.run(user_id, self.importer.import_file, user_id, Path(tmp_name), fmt)
+        except Exception as e:
+            self.logger.error(f"Import failed for {user_id}: {e}")
+            await self.answer(event, "❌ Не удалось загрузить файл")
+            return
+        finally:
+            os.unlink(tmp_name)
+
+        await self.quiz_manager.user_changed(user_id)
+        text = (
+            "📥 Импорт завершен\n\n"
+            f"• Добавлено: {result.added}\n"
+            f"• Повторы: {result.duplicates}\n"
+            f"• Отклонено: {result.rejected}\n"
+            f"• Строк обработано: {result.rows} за {result.elapsed:.2f} сек "
+            f"({result.rows_per_second:.0f} строк/сек)"
+        )
+        if result.errors:
+            text += "\n\nОшибки:\n" + "\n".join(
+                f"• строка {line_no}: {error}" for line_no, error in result.errors[:10]
+            )
+        await self.answer(event, text)
+
+    async def export_command(self, event: MessageCreated):
+        """Обработчик команды /export: колода или история ответов файлом CSV"""
+        logger.info(f"Получена команда /export от user_id={event.from_user.user_id}")
+        user_id = str(event.from_user.user_id)
+        parts = (event.message.body.text or "").split()
+        dataset = parts[1].lower() if len(parts) > 1 else "deck"
+        if dataset not in ("deck", "reviews"):
+            await self.answer(
+                event,
+                "❌ Неверный формат!\n\n"
+                "Используй: `/export` — колода, `/export reviews` — история ответов"
+            )
+            return
+
+        tmp_dir = Path(tempfile.mkdtemp(prefix="export_"))
+        file_path = tmp_dir / f"{dataset}_{user_id}.csv"
+        try:
+            count = await self.storage.io.run(user_id, self.exporter.export, file_path, dataset, [user_id])
+            if not count:
+                await self.answer(event, "📝 Выгружать пока нечего.")
+                return
+            await self.answer(
+                event,
+                f"📤 Выгружено строк: {count}",
+                attachments=[InputMedia(str(file_path))]
+            )
+        except Exception as e:
+            self.logger.error(f"Export failed for {user_id}: {e}")
+            await self.answer(event, "❌ Не удалось выгрузить данные")
+        finally:
+            file_path.unlink(missing_ok=True)
+            tmp_dir.rmdir()
 
     async def show_my_qa(self, event: MessageCreated):
         """Обработчик команды /my_qa"""
         logger.info(f"Получена команда /my_qa от user_id={event.from_user.user_id}")
         user_id = str(event.from_user.user_id)
-        qa_list = self.storage.get_user_qa(user_id)
+        qa_list = await self.storage.aget_user_qa(user_id)
         
         formatted_text = MessageFormatter.format_qa_list(qa_list)
-        await event.message.answer(formatted_text)
+        await self.answer(event, formatted_text)
 
     async def remove_qa_command(self, event: MessageCreated):
         """Обработчик команды /remove_qa с валидацией"""
@@ -101,7 +210,8 @@ class CommandHandlers(BaseHandler):
         
         parts = text.split()
         if len(parts) < 2:
-            await event.message.answer(
+            await self.answer(
+                event,
                 "❌ Неверный формат!\n\n"
                 "Используй: `/remove_qa <ID>`\n\n"
                 "Пример: `/remove_qa 3`\n"
@@ -110,41 +220,46 @@ class CommandHandlers(BaseHandler):
             return
         
         qa_id_str = parts[1]
-        qa_list = self.storage.get_user_qa(user_id)
-        
-        is_valid, error_msg, question_data = Validators.validate_question_id(qa_id_str, qa_list)
+        async with self.storage.asession(user_id) as session:
+            deck = session.get_user_deck(user_id)
+            is_valid, error_msg, question_data = Validators.validate_question_id(qa_id_str, deck["items"])
+            if is_valid:
+                success = session.remove_user_qa(user_id, int(qa_id_str))
         
         if not is_valid:
-            await event.message.answer(f"❌ {error_msg}")
+            await self.answer(event, f"❌ {error_msg}")
             return
 
-        success = self.storage.remove_user_qa(user_id, int(qa_id_str))
+        await self.quiz_manager.user_changed(user_id)
         if success:
-            await event.message.answer(
+            await self.answer(
+                event,
                 f"✅ Вопрос удален!\n\n"
                 f"Вопрос: {question_data['question']}\n"
                 f"Ответ: {question_data['answer']}\n"
                 f"ID: {qa_id_str}"
             )
         else:
-            await event.message.answer("❌ Ошибка при удалении вопроса")
+            await self.answer(event, "❌ Ошибка при удалении вопроса")
 
     async def clear_qa(self, event: MessageCreated):
         """Обработчик команды /clear_qa"""
         logger.info(f"Получена команда /clear_qa от user_id={event.from_user.user_id}")
         user_id = str(event.from_user.user_id)
-        qa_list = self.storage.get_user_qa(user_id)
+        qa_list = await self.storage.aget_user_qa(user_id)
         
         if not qa_list:
-            await event.message.answer("📝 У тебя и так нет вопросов.")
+            await self.answer(event, "📝 У тебя и так нет вопросов.")
             return
 
-        self.quiz_manager.stop_quiz_for_user(user_id)
-        self.storage.update_user_settings(user_id, active=False)
-
-        self.storage.save_user_qa(user_id, [])
-        
-        await event.message.answer(
+        await self.quiz_manager.stop_quiz_for_user(user_id)
+        async with self.storage.asession(user_id) as session:
+            session.update_user_settings(user_id, active=False)
+            session.save_user_qa(user_id, [])
+        await self.quiz_manager.user_changed(user_id)
+        
+        await self.answer(
+            event,
             f"🗑 Все вопросы очищены!\n\n"
             f"Удалено вопросов: {len(qa_list)}\n"
             f"Викторина остановлена.\n\n"
@@ -157,23 +272,43 @@ class CommandHandlers(BaseHandler):
         user_id = str(event.from_user.user_id)
         chat_id = event.chat.chat_id
 
-        qa_list = self.storage.get_user_qa(user_id)
+        # Проверка и включение викторины — в одной сессии: между ними
+        # никто не изменит настройки пользователя
+        async with self.storage.asession(user_id) as session:
+            qa_list = session.get_user_qa(user_id)
+            settings = session.get_user_settings(user_id)
+            error = self._start_quiz_error(qa_list, settings)
+            if error is None:
+                session.update_user_settings(user_id, active=True)
+                stats = session.get_user_stats(user_id)
+                stats["last_study_date"] = datetime.now().isoformat()
+                session.save_user_stats(user_id, stats)
+
+        if error is not None:
+            await self.answer(event, error)
+            return
+
+        await self.quiz_manager.start_quiz_for_user(user_id, chat_id)
+        
+        message = MessageFormatter.format_quiz_start_message(settings, len(qa_list))
+        await self.answer(event, message)
+
+    @staticmethod
+    def _start_quiz_error(qa_list: List[Dict], settings: Dict) -> Optional[str]:
+        """Почему викторину нельзя запустить (None — можно)"""
         if not qa_list:
-            await event.message.answer(
+            return (
                 "❌ Сначала добавь вопросы!\n\n"
                 "У тебя пока нет вопросов для викторины.\n"
                 "Добавь вопросы через: `/add_qa Вопрос || Ответ`"
             )
-            return
         
-        settings = self.storage.get_user_settings(user_id)
         if settings["active"]:
-            await event.message.answer(
+            return (
                 "ℹ️ Викторина уже запущена!\n\n"
                 "Используй `/stop_quiz` чтобы остановить,\n"
                 "или `/settings` чтобы изменить настройки."
             )
-            return
 
         daily_goal_valid, daily_error, _ = Validators.validate_daily_goal(settings["daily_goal"])
         interval_valid, interval_error, _ = Validators.validate_interval(
@@ -181,46 +316,40 @@ class CommandHandlers(BaseHandler):
         )
         
         if not daily_goal_valid:
-            await event.message.answer(
+            return (
                 f"❌ Некорректная дневная цель: {settings['daily_goal']}\n\n"
                 f"Исправь настройки: `/set_daily <число>`"
             )
-            return
             
         if not interval_valid:
-            await event.message.answer(
+            return (
                 f"❌ Некорректный интервал: {settings['min_interval']}-{settings['max_interval']}\n\n"
                 f"Исправь настройки: `/set_interval <мин> <макс>`"
             )
-            return
-
-        self.storage.update_user_settings(user_id, active=True, last_study_date=datetime.now().isoformat())
-        
-        asyncio.create_task(self.quiz_manager.smart_quiz_scheduler(user_id, chat_id))
-        
-        message = MessageFormatter.format_quiz_start_message(settings, len(qa_list))
-        await event.message.answer(message)
+        return None
 
     async def stop_quiz(self, event: MessageCreated):
         """Обработчик команды /stop_quiz"""
         logger.info(f"Получена команда /stop_quiz от user_id={event.from_user.user_id}")
         user_id = str(event.from_user.user_id)
-        settings = self.storage.get_user_settings(user_id)
+        settings = await self.storage.aget_user_settings(user_id)
         
         if not settings["active"]:
-            await event.message.answer(
+            await self.answer(
+                event,
                 "ℹ️ Викторина и так остановлена.\n\n"
                 "Используй `/start_quiz` чтобы запустить."
             )
             return
 
-        self.quiz_manager.stop_quiz_for_user(user_id)
-        self.storage.update_user_settings(user_id, active=False)
-        
-        stats = self.storage.get_user_stats(user_id)
+        await self.quiz_manager.stop_quiz_for_user(user_id)
+        async with self.storage.asession(user_id) as session:
+            session.update_user_settings(user_id, active=False)
+            stats = session.get_user_stats(user_id)
         questions_today = settings["questions_today"]
         
-        await event.message.answer(
+        await self.answer(
+            event,
             "⏹ Викторина остановлена\n\n"
             f"📊 Сегодня:\n"
             f"• Задано вопросов: {questions_today}\n"
@@ -236,12 +365,13 @@ class CommandHandlers(BaseHandler):
         """Обработчик команды /settings"""
         logger.info(f"Получена команда /settings от user_id={event.from_user.user_id}")
         user_id = str(event.from_user.user_id)
-        settings = self.storage.get_user_settings(user_id)
-        stats = self.storage.get_user_stats(user_id)
-        qa_count = len(self.storage.get_user_qa(user_id))
+        async with self.storage.asession(user_id) as session:
+            settings = session.get_user_settings(user_id)
+            stats = session.get_user_stats(user_id)
+            qa_count = len(session.get_user_qa(user_id))
         
         formatted_message = MessageFormatter.format_settings_message(settings, stats, qa_count)
-        await event.message.answer(formatted_message)
+        await self.answer(event, formatted_message)
 
     async def set_daily_goal(self, event: MessageCreated):
         """Обработчик команды /set_daily с валидацией"""
@@ -251,7 +381,8 @@ class CommandHandlers(BaseHandler):
         
         parts = text.split()
         if len(parts) < 2:
-            await event.message.answer(
+            await self.answer(
+                event,
                 "❌ Неверный формат!\n\n"
                 "Используй: `/set_daily <число>`\n\n"
                 "Пример: `/set_daily 15`\n"
@@ -264,14 +395,17 @@ class CommandHandlers(BaseHandler):
         is_valid, error_msg, goal_value = Validators.validate_daily_goal(goal_str)
         
         if not is_valid:
-            await event.message.answer(f"❌ {error_msg}")
+            await self.answer(event, f"❌ {error_msg}")
             return
         
-        settings = self.storage.get_user_settings(user_id)
-        old_goal = settings["daily_goal"]
-        self.storage.update_user_settings(user_id, daily_goal=goal_value)
+        async with self.storage.asession(user_id) as session:
+            settings = session.get_user_settings(user_id)
+            old_goal = settings["daily_goal"]
+            session.update_user_settings(user_id, daily_goal=goal_value)
+        await self.quiz_manager.refresh_user(user_id)
         
-        await event.message.answer(
+        await self.answer(
+            event,
             f"✅ Дневная цель изменена!\n\n"
             f"• Было: {old_goal} вопросов в день\n"
             f"• Стало: {goal_value} вопросов в день\n\n"
@@ -286,7 +420,8 @@ class CommandHandlers(BaseHandler):
         
         parts = text.split()
         if len(parts) < 3:
-            await event.message.answer(
+            await self.answer(
+                event,
                 "❌ Неверный формат!\n\n"
                 "Используй: `/set_interval <мин> <макс>`\n\n"
                 "Пример: `/set_interval 30 120`\n"
@@ -300,20 +435,23 @@ class CommandHandlers(BaseHandler):
         is_valid, error_msg, interval_data = Validators.validate_interval(min_str, max_str)
         
         if not is_valid:
-            await event.message.answer(f"❌ {error_msg}")
+            await self.answer(event, f"❌ {error_msg}")
             return
         
-        settings = self.storage.get_user_settings(user_id)
-        old_min = settings["min_interval"]
-        old_max = settings["max_interval"]
-        
-        self.storage.update_user_settings(
-            user_id, 
-            min_interval=interval_data["min"], 
-            max_interval=interval_data["max"]
-        )
+        async with self.storage.asession(user_id) as session:
+            settings = session.get_user_settings(user_id)
+            old_min = settings["min_interval"]
+            old_max = settings["max_interval"]
+
+            session.update_user_settings(
+                user_id, 
+                min_interval=interval_data["min"], 
+                max_interval=interval_data["max"]
+            )
+        await self.quiz_manager.refresh_user(user_id)
         
-        await event.message.answer(
+        await self.answer(
+            event,
             f"✅ Интервал изменен!\n\n"
             f"• Было: {old_min} - {old_max} минут\n"
             f"• Стало: {interval_data['min']} - {interval_data['max']} минут\n\n"
@@ -324,7 +462,7 @@ class CommandHandlers(BaseHandler):
         """Обработчик команды /set_schedule"""
         logger.info(f"Получена команда /set_schedule от user_id={event.from_user.user_id}")
         user_id = str(event.from_user.user_id)
-        settings = self.storage.get_user_settings(user_id)
+        settings = await self.storage.aget_user_settings(user_id)
         
         days_ru = {
             'monday': 'Понедельник',
@@ -356,7 +494,7 @@ class CommandHandlers(BaseHandler):
             "• `/set_day sun 00:00 00:00 off` - отключить день"
         )
         
-        await event.message.answer(schedule_text + instructions)
+        await self.answer(event, schedule_text + instructions)
 
     async def set_day_schedule(self, event: MessageCreated):
         """Обработчик команды /set_day"""
@@ -376,19 +514,22 @@ class CommandHandlers(BaseHandler):
             )
             
             if not is_valid:
-                await event.message.answer(f"❌ {error_msg}")
+                await self.answer(event, f"❌ {error_msg}")
                 return
             
-            settings = self.storage.get_user_settings(user_id)
-            settings["schedule"][schedule_data["day_en"]] = {
-                "start": schedule_data["start_time"],
-                "end": schedule_data["end_time"],
-                "enabled": schedule_data["enabled"]
-            }
-            self.storage.save_user_settings(user_id, settings)
+            async with self.storage.asession(user_id) as session:
+                settings = session.get_user_settings(user_id)
+                settings["schedule"][schedule_data["day_en"]] = {
+                    "start": schedule_data["start_time"],
+                    "end": schedule_data["end_time"],
+                    "enabled": schedule_data["enabled"]
+                }
+                session.save_user_settings(user_id, settings)
+            await self.quiz_manager.refresh_user(user_id)
             
             status = "включен" if schedule_data["enabled"] else "отключен"
-            await event.message.answer(
+            await self.answer(
+                event,
                 f"✅ Расписание обновлено!\n\n"
                 f"{schedule_data['day_ru']} {status}\n"
                 f"Время: {schedule_data['start_time']} - {schedule_data['end_time']}\n\n"
@@ -396,7 +537,8 @@ class CommandHandlers(BaseHandler):
             )
             
         except (IndexError, ValueError):
-            await event.message.answer(
+            await self.answer(
+                event,
                 "❌ Неверный формат!\n\n"
                 "Используй: `/set_day <день> <начало> <конец> <вкл/выкл>`\n\n"
                 "Примеры:\n"
@@ -410,12 +552,13 @@ class CommandHandlers(BaseHandler):
         """Обработчик команды /reset_settings"""
         user_id = str(event.from_user.user_id)
 
-        self.quiz_manager.stop_quiz_for_user(user_id)
+        await self.quiz_manager.stop_quiz_for_user(user_id)
         
         default_settings = self.storage.get_default_settings()
-        self.storage.save_user_settings(user_id, default_settings)
+        await self.storage.asave_user_settings(user_id, default_settings)
         
-        await event.message.answer(
+        await self.answer(
+            event,
             "🔄 Настройки сброшены!\n\n"
             "Все настройки возвращены к значениям по умолчанию.\n"
             "Викторина остановлена.\n\n"
@@ -425,7 +568,8 @@ class CommandHandlers(BaseHandler):
 
     async def cancel_reset_settings(self, event: MessageCreated):
         """Отмена сброса настроек"""
-        await event.message.answer(
+        await self.answer(
+            event,
             "❌ Сброс настроек отменён.\n\n"
             "Ваши текущие настройки сохранены.",
             attachments=[KeyboardManager.get_main_menu_keyboard()]
@@ -435,9 +579,10 @@ class CommandHandlers(BaseHandler):
         """Обработчик команды /stats"""
         logger.info(f"Получена команда /stats от user_id={event.from_user.user_id}")
         user_id = str(event.from_user.user_id)
-        stats = self.storage.get_user_stats(user_id)
-        settings = self.storage.get_user_settings(user_id)
-        qa_count = len(self.storage.get_user_qa(user_id))
+        async with self.storage.asession(user_id) as session:
+            stats = session.get_user_stats(user_id)
+            settings = session.get_user_settings(user_id)
+            qa_count = len(session.get_user_qa(user_id))
         
         total_answered = stats['total_questions_answered']
         if total_answered > 0:
@@ -452,7 +597,8 @@ class CommandHandlers(BaseHandler):
         else:
             time_text = f"{avg_response_time/60:.1f} мин"
         
-        await event.message.answer(
+        await self.answer(
+            event,
             "📊 Твоя статистика:\n\n"
             f"Обучение:\n"
             f"• Всего вопросов: {qa_count}\n"
@@ -474,17 +620,19 @@ class CommandHandlers(BaseHandler):
         """Обработчик команды /question_stats"""
         logger.info(f"Получена команда /question_stats от user_id={event.from_user.user_id}")
         user_id = str(event.from_user.user_id)
-        qa_list = self.storage.get_user_qa(user_id)
+        async with self.storage.asession(user_id) as session:
+            qa_list = session.get_user_qa(user_id)
+            stats = session.get_user_stats(user_id)
         
         if not qa_list:
-            await event.message.answer("📝 У тебя пока нет вопросов для статистики.")
+            await self.answer(event, "📝 У тебя пока нет вопросов для статистики.")
             return
         
         text = "📋 Статистика по вопросам:\n\n"
         
         for i, qa in enumerate(qa_list[:10], 1):  
             qa_id = qa.get('id', i)
-            q_stats = self.storage.get_question_stats(user_id, qa_id)
+            q_stats = stats["question_stats"].get(str(qa_id)) or self.storage.get_default_question_stats()
             
             times_asked = q_stats['times_asked']
             times_correct = q_stats['times_correct']
@@ -506,4 +654,4 @@ class CommandHandlers(BaseHandler):
         text += "💡 Обозначения:\n"
         text += "🟢 >80% 🟡 50-80% 🔴 <50% ⚪ не задавался"
         
-        await event.message.answer(text)
+        await self.answer(event, text)
@@ -18,36 +18,51 @@ class MessageHandlers(BaseHandler):
 
 
         user_id = str(event.from_user.user_id)
-        current_qa = self.storage.get_current_question(user_id)
-        
+        async with self.storage.asession(user_id) as session:
+            current_qa = session.get_current_question(user_id)
+            if current_qa:
+                user_answer = event.message.body.text.strip()
+                correct_answer = current_qa['answer'].strip()
+
+                is_correct = user_answer.lower() == correct_answer.lower()
+
+                asked_at = datetime.fromisoformat(current_qa.get('asked_at', datetime.now().isoformat()))
+                response_time = (datetime.now() - asked_at).total_seconds()
+
+                quality = 5 if is_correct and response_time < 30 else 3 if is_correct else 1
+                session.update_user_stats(
+                    user_id=user_id,
+                    question_id=current_qa.get('id'),
+                    correct=is_correct,
+                    response_time=response_time,
+                    quality=quality
+                )
+
+                if not current_qa.get('reviewed'):
+                    self.quiz_manager.repetition.review(session, current_qa.get('id'), quality)
+
+                if is_correct:
+                    session.remove_current_question(user_id)
+                elif not current_qa.get('reviewed'):
+                    session.save_current_question(user_id, dict(current_qa, reviewed=True))
+            else:
+                settings = session.get_user_settings(user_id)
+
+        if current_qa and not current_qa.get('reviewed'):
+            await self.quiz_manager.user_changed(user_id, reviewed=True)
+
         if not current_qa:
-            settings = self.storage.get_user_settings(user_id)
             if settings["active"]:
-                await event.message.answer(
+                await self.answer(
+                    event,
                     "Я задам следующий вопрос в случайное время в твоем интервале.\n"
                     "А пока можешь добавить новые вопросы или посмотреть статистику!"
                 )
             return
 
-        user_answer = event.message.body.text.strip()
-        correct_answer = current_qa['answer'].strip()
-        
-        is_correct = user_answer.lower() == correct_answer.lower()
-        
-        asked_at = datetime.fromisoformat(current_qa.get('asked_at', datetime.now().isoformat()))
-        response_time = (datetime.now() - asked_at).total_seconds()
-        
-        self.storage.update_user_stats(
-            user_id=user_id,
-            question_id=current_qa.get('id'),
-            correct=is_correct,
-            response_time=response_time,
-            quality=5 if is_correct and response_time < 30 else 3 if is_correct else 1
-        )
-        
         if is_correct:
-            self.storage.remove_current_question(user_id)
-            await event.message.answer(
+            await self.answer(
+                event,
                 "✅ Правильно! 🎉\n\n"
                 f"Вопрос: {current_qa['question']}\n"
                 f"Твой ответ: {user_answer}\n"
@@ -55,9 +70,10 @@ class MessageHandlers(BaseHandler):
                 "Отличная работа! Следующий вопрос скоро."
             )
         else:
-            await event.message.answer(
+            await self.answer(
+                event,
                 "❌ Пока не верно.\n\n"
                 f"Вопрос: {current_qa['question']}\n"
                 f"Твой ответ: {user_answer}\n\n"
                 "Попробуй еще раз! 💪"
-            )
\ No newline at end of file
+            )
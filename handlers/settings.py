@@ -13,12 +13,13 @@ class SettingsHandlers(BaseHandler):
     async def show_settings(self, event: MessageCreated):
         """Обработчик команды /settings"""
         user_id = str(event.from_user.user_id)
-        settings = self.storage.get_user_settings(user_id)
-        stats = self.storage.get_user_stats(user_id)
-        qa_count = len(self.storage.get_user_qa(user_id))
+        async with self.storage.asession(user_id) as session:
+            settings = session.get_user_settings(user_id)
+            stats = session.get_user_stats(user_id)
+            qa_count = len(session.get_user_qa(user_id))
         
         formatted_message = MessageFormatter.format_settings_message(settings, stats, qa_count)
-        await event.message.answer(formatted_message)
+        await self.answer(event, formatted_message)
 
     async def set_daily_goal(self, event: MessageCreated):
         """Обработчик команды /set_daily с валидацией"""
@@ -27,7 +28,8 @@ class SettingsHandlers(BaseHandler):
         
         parts = text.split()
         if len(parts) < 2:
-            await event.message.answer(
+            await self.answer(
+                event,
                 "❌ Неверный формат!\n\n"
                 "Используй: `/set_daily <число>`\n\n"
                 "Пример: `/set_daily 15`\n"
@@ -40,14 +42,17 @@ class SettingsHandlers(BaseHandler):
         is_valid, error_msg, goal_value = Validators.validate_daily_goal(goal_str)
         
         if not is_valid:
-            await event.message.answer(f"❌ {error_msg}")
+            await self.answer(event, f"❌ {error_msg}")
             return
         
-        settings = self.storage.get_user_settings(user_id)
-        old_goal = settings["daily_goal"]
-        self.storage.update_user_settings(user_id, daily_goal=goal_value)
+        async with self.storage.asession(user_id) as session:
+            settings = session.get_user_settings(user_id)
+            old_goal = settings["daily_goal"]
+            session.update_user_settings(user_id, daily_goal=goal_value)
+        await self.quiz_manager.refresh_user(user_id)
         
-        await event.message.answer(
+        await self.answer(
+            event,
             f"✅ Дневная цель изменена!\n\n"
             f"• Было: {old_goal} вопросов в день\n"
             f"• Стало: {goal_value} вопросов в день\n\n"
@@ -61,7 +66,8 @@ class SettingsHandlers(BaseHandler):
         
         parts = text.split()
         if len(parts) < 3:
-            await event.message.answer(
+            await self.answer(
+                event,
                 "❌ Неверный формат!\n\n"
                 "Используй: `/set_interval <мин> <макс>`\n\n"
                 "Пример: `/set_interval 30 120`\n"
@@ -75,20 +81,23 @@ class SettingsHandlers(BaseHandler):
         is_valid, error_msg, interval_data = Validators.validate_interval(min_str, max_str)
         
         if not is_valid:
-            await event.message.answer(f"❌ {error_msg}")
+            await self.answer(event, f"❌ {error_msg}")
             return
         
-        settings = self.storage.get_user_settings(user_id)
-        old_min = settings["min_interval"]
-        old_max = settings["max_interval"]
-        
-        self.storage.update_user_settings(
-            user_id, 
-            min_interval=interval_data["min"], 
-            max_interval=interval_data["max"]
-        )
+        async with self.storage.asession(user_id) as session:
+            settings = session.get_user_settings(user_id)
+            old_min = settings["min_interval"]
+            old_max = settings["max_interval"]
+
+            session.update_user_settings(
+                user_id, 
+                min_interval=interval_data["min"], 
+                max_interval=interval_data["max"]
+            )
+        await self.quiz_manager.refresh_user(user_id)
         
-        await event.message.answer(
+        await self.answer(
+            event,
             f"✅ Интервал изменен!\n\n"
             f"• Было: {old_min} - {old_max} минут\n"
             f"• Стало: {interval_data['min']} - {interval_data['max']} минут\n\n"
@@ -98,7 +107,7 @@ class SettingsHandlers(BaseHandler):
     async def set_schedule_command(self, event: MessageCreated):
         """Обработчик команды /set_schedule"""
         user_id = str(event.from_user.user_id)
-        settings = self.storage.get_user_settings(user_id)
+        settings = await self.storage.aget_user_settings(user_id)
         
         days_ru = {
             'monday': 'Понедельник',
@@ -137,7 +146,7 @@ class SettingsHandlers(BaseHandler):
             "Совет: Старайтесь охватить все дни, когда вы обычно активны!"
         )
         
-        await event.message.answer(schedule_text + instructions)
+        await self.answer(event, schedule_text + instructions)
 
     async def set_day_schedule(self, event: MessageCreated):
         """Обработчик команды /set_day"""
@@ -156,16 +165,18 @@ class SettingsHandlers(BaseHandler):
             )
             
             if not is_valid:
-                await event.message.answer(f"❌ {error_msg}")
+                await self.answer(event, f"❌ {error_msg}")
                 return
             
-            settings = self.storage.get_user_settings(user_id)
-            settings["schedule"][schedule_data["day_en"]] = {
-                "start": schedule_data["start_time"],
-                "end": schedule_data["end_time"],
-                "enabled": schedule_data["enabled"]
-            }
-            self.storage.save_user_settings(user_id, settings)
+            async with self.storage.asession(user_id) as session:
+                settings = session.get_user_settings(user_id)
+                settings["schedule"][schedule_data["day_en"]] = {
+                    "start": schedule_data["start_time"],
+                    "end": schedule_data["end_time"],
+                    "enabled": schedule_data["enabled"]
+                }
+                session.save_user_settings(user_id, settings)
+            await self.quiz_manager.refresh_user(user_id)
             
             schedule_valid, schedule_error = Validators.validate_schedule_time_consistency(settings["schedule"])
             if not schedule_valid:
@@ -174,7 +185,8 @@ class SettingsHandlers(BaseHandler):
                 warning_msg = ""
             
             status = "включен" if schedule_data["enabled"] else "отключен"
-            await event.message.answer(
+            await self.answer(
+                event,
                 f"✅ Расписание обновлено!\n\n"
                 f"{schedule_data['day_ru']} {status}\n"
                 f"Время: {schedule_data['start_time']} - {schedule_data['end_time']}"
@@ -183,7 +195,8 @@ class SettingsHandlers(BaseHandler):
             )
             
         except (IndexError, ValueError):
-            await event.message.answer(
+            await self.answer(
+                event,
                 "❌ Неверный формат!\n\n"
                 "Используй: `/set_day <день> <начало> <конец> <вкл/выкл>`\n\n"
                 "Примеры:\n"
@@ -202,7 +215,8 @@ class SettingsHandlers(BaseHandler):
             no_payload="cancel_reset_settings"
         )
         
-        await event.message.answer(
+        await self.answer(
+            event,
             "🔄 Сброс настроек\n\n"
             "Вы уверены, что хотите сбросить все настройки к значениям по умолчанию?\n\n"
             "Это действие:\n"
@@ -215,12 +229,12 @@ class SettingsHandlers(BaseHandler):
 
     async def confirm_reset_settings(self, user_id: str, chat_id: str):
         """Подтверждение сброса настроек"""
-        self.quiz_manager.stop_quiz_for_user(user_id)
+        await self.quiz_manager.stop_quiz_for_user(user_id)
         
         default_settings = self.storage.get_default_settings()
-        self.storage.save_user_settings(user_id, default_settings)
+        await self.storage.asave_user_settings(user_id, default_settings)
         
-        await self.bot.send_message(
+        self.outbox.post(
             chat_id=chat_id,
             text=(
                 "🔄 Настройки сброшены!\n\n"
@@ -237,7 +251,7 @@ class SettingsHandlers(BaseHandler):
 
     async def cancel_reset_settings(self, user_id: str, chat_id: str):
         """Отмена сброса настроек"""
-        await self.bot.send_message(
+        self.outbox.post(
             chat_id=chat_id,
             text="❌ Сброс настроек отменен.\n\nТекущие настройки сохранены."
         )
@@ -245,7 +259,7 @@ class SettingsHandlers(BaseHandler):
     async def show_schedule_analysis(self, event: MessageCreated):
         """Показывает анализ текущего расписания"""
         user_id = str(event.from_user.user_id)
-        settings = self.storage.get_user_settings(user_id)
+        settings = await self.storage.aget_user_settings(user_id)
         
         coverage = Validators.calculate_schedule_coverage(settings["schedule"])
         
@@ -285,7 +299,7 @@ class SettingsHandlers(BaseHandler):
             else:
                 analysis_text += f"{status} {day_ru}: отключен\n"
         
-        await event.message.answer(analysis_text)
+        await self.answer(event, analysis_text)
 
     async def set_quick_schedule(self, event: MessageCreated):
         """Быстрая настройка расписания по шаблонам"""
@@ -339,7 +353,8 @@ class SettingsHandlers(BaseHandler):
                 {"text": "📅 Каждый день", "payload": "template_everyday"}
             ], columns=2)
             
-            await event.message.answer(
+            await self.answer(
+                event,
                 "🚀 Быстрая настройка расписания\n\n"
                 "Выберите готовый шаблон:\n\n"
                 "• 🏢 Рабочие дни - пн-пт 9:00-18:00, сб-вс 10:00-16:00\n"
@@ -352,7 +367,8 @@ class SettingsHandlers(BaseHandler):
         
         template_name = parts[1].lower()
         if template_name not in templates:
-            await event.message.answer(
+            await self.answer(
+                event,
                 "❌ Неизвестный шаблон!\n\n"
                 "Доступные шаблоны: workdays, weekend, everyday\n\n"
                 "Пример: `/quick_schedule workdays`"
@@ -360,13 +376,16 @@ class SettingsHandlers(BaseHandler):
             return
         
         template = templates[template_name]
-        settings = self.storage.get_user_settings(user_id)
-        settings["schedule"] = template["schedule"]
-        self.storage.save_user_settings(user_id, settings)
+        async with self.storage.asession(user_id) as session:
+            settings = session.get_user_settings(user_id)
+            settings["schedule"] = template["schedule"]
+            session.save_user_settings(user_id, settings)
+        await self.quiz_manager.refresh_user(user_id)
         
         coverage = Validators.calculate_schedule_coverage(settings["schedule"])
         
-        await event.message.answer(
+        await self.answer(
+            event,
             f"✅ Шаблон '{template['name']}' применен!\n\n"
             f"📊 Новое расписание:\n"
             f"• Активных дней: {coverage['enabled_days']}/7\n"
@@ -10,9 +10,10 @@ class StatsHandlers(BaseHandler):
     async def show_stats(self, event: MessageCreated):
         """Обработчик команды /stats"""
         user_id = str(event.from_user.user_id)
-        stats = self.storage.get_user_stats(user_id)
-        settings = self.storage.get_user_settings(user_id)
-        qa_count = len(self.storage.get_user_qa(user_id))
+        async with self.storage.asession(user_id) as session:
+            stats = session.get_user_stats(user_id)
+            settings = session.get_user_settings(user_id)
+            qa_count = len(session.get_user_qa(user_id))
         
         total_answered = stats['total_questions_answered']
         if total_answered > 0:
@@ -27,7 +28,8 @@ class StatsHandlers(BaseHandler):
         else:
             time_text = f"{avg_response_time/60:.1f} мин"
         
-        await event.message.answer(
+        await self.answer(
+            event,
             "📊 Твоя статистика:\n\n"
             f"Обучение:\n"
             f"• Всего вопросов: {qa_count}\n"
@@ -48,18 +50,19 @@ class StatsHandlers(BaseHandler):
     async def show_question_stats(self, event: MessageCreated):
         """Обработчик команды /question_stats"""
         user_id = str(event.from_user.user_id)
-        qa_list = self.storage.get_user_qa(user_id)
-        stats = self.storage.get_user_stats(user_id)
+        async with self.storage.asession(user_id) as session:
+            qa_list = session.get_user_qa(user_id)
+            stats = session.get_user_stats(user_id)
         
         if not qa_list:
-            await event.message.answer("📝 У тебя пока нет вопросов для статистики.")
+            await self.answer(event, "📝 У тебя пока нет вопросов для статистики.")
             return
         
         text = "📋 Статистика по вопросам:\n\n"
         
         for i, qa in enumerate(qa_list[:10], 1):
             qa_id = qa.get('id', i)
-            q_stats = self.storage.get_question_stats(user_id, qa_id)
+            q_stats = stats["question_stats"].get(str(qa_id)) or self.storage.get_default_question_stats()
             
             times_asked = q_stats['times_asked']
             times_correct = q_stats['times_correct']
@@ -81,4 +84,4 @@ class StatsHandlers(BaseHandler):
         text += "💡 Обозначения:\n"
         text += "🟢 >80% 🟡 50-80% 🔴 <50% ⚪ не задавался"
         
-        await event.message.answer(text)
\ No newline at end of file
+        await self.answer(event, text)
\ No newline at end of file
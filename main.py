@@ -2,27 +2,83 @@
 
 import asyncio
 import signal
+from typing import Optional
 from maxapi import Bot, Dispatcher
 from services import Storage, QuizManager, AnalyticsService
+from services.backup import BackupManager
+from services.workers import ShardSupervisor
 from core.config import config
 from core.logger import logger
 
 async def shutdown(quiz_manager: QuizManager):
     """Корректное завершение работы."""
     logger.info("Остановка бота...")
-    for user_id in list(quiz_manager.active_users):
-        quiz_manager.stop_quiz_for_user(user_id)
-    logger.info("Викторины остановлены. Бот завершил работу.")
+    await quiz_manager.stop()
+    quiz_manager.storage.close()
+    logger.info("Планировщик остановлен, состояние викторин сохранено. Бот завершил работу.")
+
+async def backup_loop(storage: Optional[Storage], supervisor: Optional[ShardSupervisor] = None):
+    """Периодические снимки каталога данных раз в BACKUP_INTERVAL часов."""
+    manager = BackupManager(config.database.data_dir, config.backup.backup_dir, config.backup.keep, storage)
+    while True:
+        await asyncio.sleep(config.backup.interval * 3600)
+        if supervisor:
+            # Запись идет в процессах-обработчиках: они сбрасывают кэш и ждут,
+            # пока снимок ставит ссылки на файлы; сжатие — уже без остановки
+            staged = await supervisor.run_quiesced(manager.stage)
+            if staged:
+                await asyncio.to_thread(manager.finish, staged)
+        else:
+            await storage.io.run(None, manager.snapshot)
+
+async def archive_loop(storage: Storage):
+    """Перенос неактивных пользователей в холодное хранилище раз в ARCHIVE_INTERVAL часов."""
+    while True:
+        await asyncio.sleep(config.database.archive_interval * 3600)
+        await storage.aarchive_inactive_users(config.database.archive_after_days)
+
+async def run_sharded():
+    """Режим WORKER_PROCESSES: polling здесь, викторины и хендлеры — в процессах-обработчиках."""
+    bot = Bot(config.bot.token)
+    supervisor = ShardSupervisor(
+        bot,
+        config.workers.processes,
+        restart_delay=config.workers.restart_delay,
+        metrics_interval=config.workers.metrics_interval
+    )
+    supervisor.start()
+    tasks = [asyncio.create_task(supervisor.supervise())]
+    if config.backup.interval > 0:
+        tasks.append(asyncio.create_task(backup_loop(None, supervisor)))
+    try:
+        logger.info(f"Бот запущен в {config.workers.processes} процессах. Ожидание событий...")
+        await bot.delete_webhook()
+        await supervisor.poll()
+    finally:
+        for task in tasks:
+            task.cancel()
+        logger.info("Остановка процессов-обработчиков...")
+        await supervisor.stop()
+        await bot.close_session()
 
 async def main():
     """Главная функция запуска бота."""
+    if config.workers.processes > 0:
+        await run_sharded()
+        return
+
     try:
         logger.info("Инициализация сервисов...")
 
         storage = Storage()
         bot = Bot(config.bot.token)
         quiz_manager = QuizManager(bot, storage)
-        analytics = AnalyticsService(storage)
+        quiz_manager.start()
+        analytics = AnalyticsService(storage, quiz_manager.outbox, quiz_manager.scheduler)
+        if config.backup.interval > 0:
+            backup_task = asyncio.create_task(backup_loop(storage))
+        if config.database.archive_after_days > 0:
+            archive_task = asyncio.create_task(archive_loop(storage))
 
         dp = Dispatcher()
 
@@ -38,6 +94,10 @@ async def main():
     except Exception as e:
         logger.error(f"Bot error: {e}")
     finally:
+        if 'backup_task' in locals():
+            backup_task.cancel()
+        if 'archive_task' in locals():
+            archive_task.cancel()
         if 'quiz_manager' in locals():
             await shutdown(quiz_manager)
 
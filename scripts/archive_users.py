@@ -0,0 +1,48 @@
+# Copyright (c) 2025 Solovev Ivan, Usenko Evgeny, Alexandrov Arseniy
+
+"""
+Перенос давно не писавших пользователей JSON-хранилища в холодное хранилище.
+
+Файлы пользователя уходят в сжатый архив его шарда users/ab/cd/cold.jsonl.gz
+и возвращаются на место при первом обращении к нему. Пользователи
+с запущенной викториной не переносятся. Работающий бот делает то же
+сам (ARCHIVE_AFTER_DAYS); из скрипта переносить лучше при остановленном боте.
+
+Пример:
+    python scripts/archive_users.py --days 90
+"""
+
+import argparse
+import logging
+import os
+import sys
+import time
+from pathlib import Path
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--data-dir", default=os.getenv("DATA_DIR", "bot_data"), help="каталог с данными бота")
+    parser.add_argument("--days", type=float, default=float(os.getenv("ARCHIVE_AFTER_DAYS", "0") or 0),
+                        help="сколько дней без записей считать неактивностью")
+    args = parser.parse_args()
+    if args.days <= 0:
+        parser.error("укажите --days больше нуля")
+
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s %(message)s")
+    sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+    from services.backends import JsonStorageBackend
+
+    backend = JsonStorageBackend(Path(args.data_dir))
+    try:
+        archived = backend.archive_inactive(time.time() - args.days * 86400)
+        total = len(backend.archived_user_ids())
+    finally:
+        backend.close()
+
+    print(f"Перенесено пользователей: {len(archived)}, всего в холодном хранилище: {total}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+# Copyright (c) 2025 Solovev Ivan, Usenko Evgeny, Alexandrov Arseniy
+
+"""
+Резервные копии каталога данных бота.
+
+Команды:
+    snapshot              — сделать снимок (только изменившееся содержимое)
+    list                  — список снимков
+    verify <id>           — проверить sha256 всех файлов снимка
+    restore <id> <каталог> — восстановить снимок с проверкой
+    prune                 — оставить BACKUP_KEEP последних снимков
+
+Работающий бот делает согласованные снимки сам (BACKUP_INTERVAL);
+snapshot из этого скрипта при запущенном боте не останавливает запись.
+Восстанавливать данные нужно при остановленном боте.
+
+Примеры:
+    python scripts/backup.py snapshot
+    python scripts/backup.py restore 20251118-030000-000000 bot_data --force
+"""
+
+import argparse
+import logging
+import os
+import sys
+from pathlib import Path
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--data-dir", default=os.getenv("DATA_DIR", "bot_data"), help="каталог с данными бота")
+    parser.add_argument("--backup-dir", default=os.getenv("BACKUP_DIR", "backups"), help="каталог резервных копий")
+    parser.add_argument("--keep", type=int, default=int(os.getenv("BACKUP_KEEP", "7")), help="сколько снимков хранить")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("snapshot")
+    commands.add_parser("list")
+    commands.add_parser("prune")
+    verify = commands.add_parser("verify")
+    verify.add_argument("snapshot_id")
+    restore = commands.add_parser("restore")
+    restore.add_argument("snapshot_id")
+    restore.add_argument("target", help="куда восстановить")
+    restore.add_argument("--force", action="store_true", help="заменить непустой каталог (старый откладывается)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s %(message)s")
+    sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+    from services.backup import BackupManager
+
+    manager = BackupManager(Path(args.data_dir), Path(args.backup_dir), args.keep)
+
+    if args.command == "snapshot":
+        snapshot_id = manager.snapshot()
+        if snapshot_id is None:
+            sys.exit(1)
+        print(snapshot_id)
+    elif args.command == "list":
+        for snapshot_id in manager.list_snapshots():
+            manifest = manager.load_manifest(snapshot_id)
+            size = sum(entry["size"] for entry in manifest["files"].values())
+            print(f"{snapshot_id}  файлов: {len(manifest['files'])}, {size / 1024:.0f} КБ")
+    elif args.command == "prune":
+        removed = manager.prune()
+        print(f"Удалено снимков: {len(removed)}")
+    elif args.command == "verify":
+        damaged = manager.verify(args.snapshot_id)
+        for relative in damaged:
+            print(f"Поврежден: {relative}")
+        print("Снимок цел" if not damaged else f"Повреждено файлов: {len(damaged)}")
+        sys.exit(1 if damaged else 0)
+    elif args.command == "restore":
+        ok = manager.restore(args.snapshot_id, Path(args.target), force=args.force)
+        sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
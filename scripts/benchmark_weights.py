@@ -0,0 +1,97 @@
+# Copyright (c) 2025 Solovev Ivan, Usenko Evgeny, Alexandrov Arseniy
+
+"""
+Сравнение выбора вопроса: старый путь (статистика читается для каждой
+карточки отдельно) и пакетный расчет весов (статистика читается один раз).
+
+Пример:
+    python scripts/benchmark_weights.py --cards 2000 --rounds 20
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+
+def build_deck(storage, user_id: str, cards: int):
+    """Создает колоду и случайную статистику по вопросам"""
+    now = datetime.now()
+    qa_list = []
+    question_stats = {}
+    for qa_id in range(1, cards + 1):
+        qa_list.append({
+            "question": f"Вопрос {qa_id}",
+            "answer": f"Ответ {qa_id}",
+            "created_date": now.isoformat(),
+            "id": qa_id
+        })
+        if random.random() < 0.8:
+            times_asked = random.randint(1, 30)
+            question_stats[str(qa_id)] = {
+                "times_asked": times_asked,
+                "times_correct": random.randint(0, times_asked),
+                "total_response_time": random.uniform(1, 600),
+                "last_quality": random.choice([1, 3, 5]),
+                "last_reviewed": (now - timedelta(days=random.uniform(0, 60))).isoformat()
+            }
+
+    stats = storage.get_default_stats()
+    stats["question_stats"] = question_stats
+    storage.save_user_qa(user_id, qa_list)
+    storage.save_user_stats(user_id, stats)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--cards", type=int, default=2000, help="размер колоды")
+    parser.add_argument("--rounds", type=int, default=20, help="число выборов вопроса")
+    parser.add_argument("--backend", default="json", help="бэкенд хранилища (json, sqlite)")
+    args = parser.parse_args()
+
+    os.environ["DATA_DIR"] = tempfile.mkdtemp(prefix="shalom_bench_")
+    os.environ["STORAGE_BACKEND"] = args.backend
+    os.environ["CACHE_SIZE"] = "0"
+    sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+    from services.storage import Storage
+    from services.weights import question_weight, question_weights, choose_weighted
+
+    storage = Storage()
+    user_id = "bench"
+    build_deck(storage, user_id, args.cards)
+    qa_list = storage.get_user_qa(user_id)
+
+    now = datetime.now()
+    started = time.perf_counter()
+    for _ in range(args.rounds):
+        legacy = [
+            question_weight(storage.get_question_stats(user_id, qa["id"]), now)
+            for qa in qa_list
+        ]
+        random.choices(qa_list, weights=legacy, k=1)
+    legacy_time = (time.perf_counter() - started) / args.rounds
+
+    started = time.perf_counter()
+    for _ in range(args.rounds):
+        stats = storage.get_user_stats(user_id)
+        batch = question_weights(qa_list, stats["question_stats"], now)
+        choose_weighted(qa_list, batch)
+    batch_time = (time.perf_counter() - started) / args.rounds
+
+    max_diff = max(abs(a - b) for a, b in zip(legacy, batch))
+    storage.close()
+
+    print(f"Бэкенд: {args.backend}, карточек: {args.cards}, раундов: {args.rounds}")
+    print(f"Поштучно:  {legacy_time * 1000:10.2f} мс на выбор")
+    print(f"Пакетно:   {batch_time * 1000:10.2f} мс на выбор")
+    print(f"Ускорение: {legacy_time / batch_time:10.1f}x")
+    print(f"Макс. расхождение весов: {max_diff:.2e}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+# Copyright (c) 2025 Solovev Ivan, Usenko Evgeny, Alexandrov Arseniy
+
+"""
+Потоковая выгрузка колод и истории ответов в JSONL или CSV.
+
+Формат определяется по расширению файла (.jsonl, .csv, с .gz в конце —
+со сжатием). Без --user-id выгружаются все пользователи хранилища.
+Хранилище берется из .env (DATA_DIR, STORAGE_BACKEND).
+
+Примеры:
+    python scripts/export_data.py --user-id 123 deck_123.csv
+    python scripts/export_data.py --dataset reviews reviews.csv.gz
+    python scripts/export_data.py --dataset all dump.jsonl.gz
+"""
+
+import argparse
+import logging
+import sys
+import time
+from pathlib import Path
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("file", help="файл для выгрузки")
+    parser.add_argument("--dataset", choices=["deck", "reviews", "all"], default="deck", help="что выгружать")
+    parser.add_argument("--user-id", action="append", help="пользователь (можно несколько раз)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s %(message)s")
+    sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+    from services.exporter import Exporter
+    from services.storage import Storage
+
+    storage = Storage()
+    started = time.perf_counter()
+    try:
+        count = Exporter(storage).export(Path(args.file), args.dataset, args.user_id)
+    except ValueError as e:
+        print(f"Ошибка: {e}")
+        sys.exit(2)
+    finally:
+        storage.close()
+
+    elapsed = time.perf_counter() - started
+    print(f"Выгружено строк: {count} за {elapsed:.2f} сек")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+# Copyright (c) 2025 Solovev Ivan, Usenko Evgeny, Alexandrov Arseniy
+
+"""
+Проверка целостности каталога данных JSON-хранилища.
+
+Находит неразбираемые файлы, битые строки журналов, повторяющиеся id
+вопросов, статистику удаленных вопросов и некорректные расписания
+(подробности — в services/fsck.py). Проверка только читает файлы и
+может идти рядом с работающим ботом; --repair чинит найденное и
+запускается при остановленном боте.
+
+Примеры:
+    python scripts/fsck.py
+    python scripts/fsck.py --workers 8 --repair
+"""
+
+import argparse
+import logging
+import os
+import sys
+from pathlib import Path
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--data-dir", default=os.getenv("DATA_DIR", "bot_data"), help="каталог с данными бота")
+    parser.add_argument("--workers", type=int, help="число процессов (по умолчанию по числу ядер)")
+    parser.add_argument("--repair", action="store_true", help="исправить найденное")
+    parser.add_argument("--limit", type=int, default=100, help="сколько проблем вывести (0 — все)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s %(message)s")
+    sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+    from services.fsck import DataChecker
+
+    default_schedule = None
+    if args.repair:
+        # Расписание по умолчанию — из конфигурации бота (.env)
+        from core.config import config
+        default_schedule = config.get_default_schedule()
+
+    result = DataChecker(Path(args.data_dir), args.workers, args.repair, default_schedule).run()
+
+    shown = result.issues if args.limit <= 0 else result.issues[:args.limit]
+    for issue in shown:
+        mark = " [исправлено]" if issue.repaired else ""
+        print(f"{issue.kind}: {issue.path} — {issue.detail}{mark}")
+    if len(shown) < len(result.issues):
+        print(f"... и еще {len(result.issues) - len(shown)}")
+
+    print(f"Файлов: {result.files} ({result.bytes / 1024:.0f} КБ), пользователей: {result.users}, "
+          f"за {result.elapsed:.2f} сек ({result.files_per_second:.0f} файлов/сек)")
+    counts = ", ".join(f"{kind}: {count}" for kind, count in sorted(result.counts().items()))
+    print(f"Проблем: {len(result.issues)}{' (' + counts + ')' if counts else ''}, исправлено: {result.repaired}")
+    sys.exit(1 if len(result.issues) > result.repaired else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+# Copyright (c) 2025 Solovev Ivan, Usenko Evgeny, Alexandrov Arseniy
+
+"""
+Импорт колоды пользователя из файла без запуска бота.
+
+Формат определяется по расширению (.csv, .tsv, .jsonl, .txt — экспорт
+Anki) или задается --format. Хранилище берется из .env (DATA_DIR,
+STORAGE_BACKEND); бот на время импорта лучше остановить.
+
+Пример:
+    python scripts/import_deck.py --user-id 123 deck.csv
+"""
+
+import argparse
+import logging
+import sys
+from pathlib import Path
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("file", help="файл с вопросами")
+    parser.add_argument("--user-id", required=True, help="идентификатор пользователя")
+    parser.add_argument("--format", choices=["csv", "tsv", "jsonl", "txt"], help="формат файла")
+    parser.add_argument("--batch-size", type=int, help="вопросов на одну запись в хранилище")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s %(message)s")
+    sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+    from core.config import config
+    from services.importer import DeckImporter
+    from services.storage import Storage
+
+    storage = Storage()
+    importer = DeckImporter(storage, args.batch_size or config.importer.batch_size)
+    try:
+        result = importer.import_file(args.user_id, Path(args.file), args.format)
+    except ValueError as e:
+        print(f"Ошибка: {e}")
+        sys.exit(2)
+    finally:
+        storage.close()
+
+    print(f"Строк: {result.rows}, добавлено: {result.added}, повторов: {result.duplicates}, "
+          f"отклонено: {result.rejected}, пачек: {result.batches}")
+    print(f"Время: {result.elapsed:.2f} сек ({result.rows_per_second:.0f} строк/сек)")
+    for line_no, error in result.errors:
+        print(f"  строка {line_no}: {error}")
+
+
+if __name__ == "__main__":
+    main()
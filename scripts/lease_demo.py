@@ -0,0 +1,223 @@
+# Copyright (c) 2025 Solovev Ivan, Usenko Evgeny, Alexandrov Arseniy
+
+"""
+Проверка аренды планировщика (QUIZ_LEASE_TTL) на двух локальных процессах.
+
+Во временном каталоге данных создаются пользователи с активной
+викториной, затем запускаются реплики — отдельные процессы с
+QuizManager на общем каталоге. Вместо Max API каждая реплика пишет
+отправленные вопросы в общий журнал, а расписание ускорено до
+--interval секунд. Первая реплика через --kill-after секунд убивается
+(SIGKILL, без освобождения аренд). --send-latency задерживает каждую
+отправку: при задержке около ttl аренда успевает перейти к другой
+реплике, пока вопрос еще отправляется.
+
+Проверяется, что пользователи поделены между репликами, что ни один
+вопрос не записан двумя репликами одновременно и что после падения
+оставшаяся реплика забирает пользователей не позже чем через
+ttl + ttl/3.
+
+Примеры:
+    python scripts/lease_demo.py --users 20 --ttl 3 --duration 20
+    python scripts/lease_demo.py --users 20 --ttl 3 --send-latency 2.5 --duration 30 --kill-after 12
+"""
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from pathlib import Path
+from typing import List
+
+ROOT = Path(__file__).resolve().parent.parent
+RESTORE_SPREAD = 1
+
+
+def _append(log_path: str, event: str, chat_id, replica: str):
+    line = json.dumps({"time": time.time(), "event": event, "chat_id": chat_id, "replica": replica}) + "\n"
+    # O_APPEND: короткие строки разных процессов не перемешиваются
+    fd = os.open(log_path, os.O_WRONLY | os.O_APPEND | os.O_CREAT)
+    try:
+        os.write(fd, line.encode("utf-8"))
+    finally:
+        os.close(fd)
+
+
+class _RecordingBot:
+    """Вместо отправки в Max дописывает строку в общий журнал"""
+
+    def __init__(self, replica: str, log_path: str, latency: float):
+        self.replica = replica
+        self.log_path = log_path
+        self.latency = latency
+
+    async def send_message(self, chat_id=None, user_id=None, text=None, **kwargs):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        _append(self.log_path, "send", chat_id, self.replica)
+        return {"ok": True}
+
+
+def run_replica(replica: str, log_path: str, interval: float, latency: float, stop):
+    """Процесс-реплика: QuizManager на общем каталоге данных"""
+    os.environ["REPLICA_ID"] = replica
+    sys.path.insert(0, str(ROOT))
+    asyncio.run(_replica(replica, log_path, interval, latency, stop))
+
+
+async def _replica(replica: str, log_path: str, interval: float, latency: float, stop):
+    from services.storage import Storage
+    from services.quiz_manager import QuizManager
+
+    class DemoQuizManager(QuizManager):
+        def _calculate_next_delay(self, session, settings):
+            # Ускоренное расписание: вопрос каждые interval секунд
+            return interval
+
+        def _commit_question_sent(self, session, qa):
+            _append(log_path, "commit", self.active_users.get(session.user_id), replica)
+            super()._commit_question_sent(session, qa)
+
+    storage = Storage()
+    quiz_manager = DemoQuizManager(_RecordingBot(replica, log_path, latency), storage)
+    quiz_manager.start()
+    while not stop.is_set():
+        await asyncio.sleep(0.1)
+    await quiz_manager.stop()
+    storage.close()
+
+
+def _prepare_users(count: int):
+    from core.config import config
+    from services.storage import Storage
+
+    schedule = {day: {"start": "00:00", "end": "23:59", "enabled": True} for day in config.get_default_schedule()}
+    storage = Storage()
+    for number in range(count):
+        user_id = f"demo{number}"
+        storage.add_user_qa(user_id, f"Вопрос {number}", "Ответ")
+        storage.update_user_settings(user_id, active=True, daily_goal=1000000, schedule=schedule)
+        storage.save_schedule(user_id, f"chat-{user_id}", time.time())
+    storage.close()
+
+
+def _analyze(log_path: str, interval: float, replicas: List[str], killed_at: float, ttl: float,
+             latency: float) -> bool:
+    killed = replicas[0]
+    sends, commits = defaultdict(list), defaultdict(list)
+    if not os.path.exists(log_path):
+        print("Ни одного вопроса не отправлено")
+        return False
+    with open(log_path, encoding="utf-8") as f:
+        for line in f:
+            record = json.loads(line)
+            events = commits if record["event"] == "commit" else sends
+            events[record["chat_id"]].append((record["time"], record["replica"]))
+
+    per_replica, recorded = defaultdict(int), defaultdict(int)
+    owners_before, owners_after = defaultdict(set), defaultdict(set)
+    overlaps, takeovers = 0, []
+    for chat_id, events in sends.items():
+        events.sort()
+        for moment, replica in events:
+            per_replica[replica] += 1
+            (owners_before if moment < killed_at else owners_after)[replica].add(chat_id)
+        before = [r for t, r in events if t < killed_at]
+        after = [t for t, r in events if t >= killed_at]
+        if before and before[-1] == killed and after:
+            # Пользователь упавшей реплики: когда его подхватила другая
+            takeovers.append(after[0] - killed_at)
+
+    for chat_id, events in commits.items():
+        events.sort()
+        for moment, replica in events:
+            recorded[replica] += 1
+        # Одна реплика записывает вопрос пользователю не чаще раза в interval;
+        # более частые записи из разных реплик значат, что пользователя вели
+        # обе. Отправка, начатая до перехода аренды, может дойти, но записать
+        # ее должна только одна реплика
+        for (t1, r1), (t2, r2) in zip(events, events[1:]):
+            if r1 != r2 and t2 - t1 < interval / 2:
+                overlaps += 1
+
+    # Аренда истекает через ttl после последнего продления, оставшаяся
+    # реплика замечает это за ttl/3, разбрасывает восстановление на
+    # RESTORE_SPREAD и отправляет вопрос за latency
+    limit = ttl + ttl / 3 + RESTORE_SPREAD + latency
+    print(f"Отправлено вопросов: {dict(per_replica)}, записано: {dict(recorded)}")
+    print("Пользователей до падения: " + ", ".join(f"{r}: {len(u)}" for r, u in sorted(owners_before.items())))
+    print("Пользователей после падения: " + ", ".join(f"{r}: {len(u)}" for r, u in sorted(owners_after.items())))
+    if takeovers:
+        print(f"Пользователей {killed} подхвачено: {len(takeovers)}, наибольшая задержка {max(takeovers):.1f} с "
+              f"(допустимо {limit:.1f} с)")
+    print(f"Одновременных записей из разных реплик: {overlaps}")
+    # Запас: срабатывание по расписанию и проверка, промахнувшаяся мимо
+    # истечения аренды на доли секунды
+    late = [delay for delay in takeovers if delay > limit + interval + ttl / 3]
+    split = all(owners_before.get(replica) for replica in replicas)
+    if not split:
+        print("До падения пользователей вели не все реплики")
+    if not takeovers:
+        print(f"Пользователи {killed} не были подхвачены")
+    return split and bool(takeovers) and overlaps == 0 and not late and not owners_after.get(killed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--replicas", type=int, default=2, help="сколько реплик запустить")
+    parser.add_argument("--users", type=int, default=20, help="сколько пользователей с активной викториной")
+    parser.add_argument("--ttl", type=float, default=3, help="QUIZ_LEASE_TTL, секунды")
+    parser.add_argument("--interval", type=float, default=1, help="пауза между вопросами пользователю, секунды")
+    parser.add_argument("--send-latency", type=float, default=0, help="задержка каждой отправки, секунды")
+    parser.add_argument("--duration", type=float, default=20, help="сколько секунд работают реплики")
+    parser.add_argument("--kill-after", type=float, default=8, help="через сколько секунд убить первую реплику")
+    parser.add_argument("--data-dir", help="каталог данных (по умолчанию временный)")
+    args = parser.parse_args()
+
+    data_dir = args.data_dir or tempfile.mkdtemp(prefix="lease_demo_")
+    os.environ["DATA_DIR"] = data_dir
+    os.environ["QUIZ_LEASE_TTL"] = str(args.ttl)
+    os.environ["CACHE_SIZE"] = "0"
+    # Без разброса при восстановлении: первые вопросы сразу после старта
+    os.environ["QUIZ_RESTORE_SPREAD"] = str(RESTORE_SPREAD)
+    # Медленная отправка занимает воркер Outbox целиком: воркеров хватает на всех
+    os.environ["OUTBOX_WORKERS"] = str(max(4, args.users))
+    os.environ.setdefault("BOT_TOKEN", "lease-demo")
+    sys.path.insert(0, str(ROOT))
+    log_path = str(Path(data_dir) / "sends.jsonl")
+    print(f"Каталог данных: {data_dir}")
+
+    _prepare_users(args.users)
+
+    ctx = multiprocessing.get_context("spawn")
+    stop = ctx.Event()
+    replicas = [f"replica-{chr(ord('a') + number)}" for number in range(args.replicas)]
+    processes = [
+        ctx.Process(target=run_replica, args=(replica, log_path, args.interval, args.send_latency, stop), name=replica)
+        for replica in replicas
+    ]
+    for process in processes:
+        process.start()
+
+    time.sleep(args.kill_after)
+    processes[0].kill()
+    killed_at = time.time()
+    print(f"{replicas[0]} убита (pid {processes[0].pid})")
+
+    time.sleep(max(0.0, args.duration - args.kill_after))
+    stop.set()
+    for process in processes[1:]:
+        process.join(30)
+
+    ok = _analyze(log_path, args.interval, replicas, killed_at, args.ttl, args.send_latency)
+    print("Аренда работает" if ok else "Обнаружены нарушения аренды")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
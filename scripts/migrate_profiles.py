@@ -0,0 +1,47 @@
+# Copyright (c) 2025 Solovev Ivan, Usenko Evgeny, Alexandrov Arseniy
+
+"""
+Перенос JSON-хранилища из раскладки "файл на документ" (user_, user_settings_,
+user_stats_, current_ ...) в единый профиль пользователя profile_<id>.json.
+
+Бот читает старые файлы и без миграции, пока у пользователя нет профиля.
+Скрипт переносит всех пользователей сразу; старые файлы удаляются только
+с флагом --remove-legacy и только если профиль совпал с ними.
+
+Пример:
+    python scripts/migrate_profiles.py --data-dir bot_data --remove-legacy
+"""
+
+import argparse
+import logging
+import os
+import sys
+from pathlib import Path
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--data-dir", default=os.getenv("DATA_DIR", "bot_data"), help="каталог с данными бота")
+    parser.add_argument("--remove-legacy", action="store_true", help="удалить старые файлы после проверки")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s %(message)s")
+    sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+    from services.backends import JsonStorageBackend
+
+    backend = JsonStorageBackend(Path(args.data_dir))
+    migrated = failed = 0
+    for user_id in sorted(backend.user_ids()):
+        if backend.migrate_user(user_id, remove_legacy=args.remove_legacy):
+            migrated += 1
+        else:
+            failed += 1
+    backend.close()
+
+    print(f"Перенесено пользователей: {migrated}, с ошибками: {failed}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,19 @@
 # Copyright (c) 2025 Solovev Ivan, Usenko Evgeny, Alexandrov Arseniy
 
+import asyncio
 import logging
 from datetime import datetime
+from pathlib import Path
 from typing import Dict, Any
+from .exporter import open_output, write_jsonl
 
 class AnalyticsService:
     """Сервис аналитики и метрик"""
     
-    def __init__(self, storage):
+    def __init__(self, storage, outbox=None, scheduler=None):
         self.storage = storage
+        self.outbox = outbox
+        self.scheduler = scheduler
         self.logger = logging.getLogger(__name__)
         self.events = []
 
@@ -49,9 +54,10 @@ class AnalyticsService:
 
     async def get_user_insights(self, user_id: str) -> Dict[str, Any]:
         """Получение аналитических данных по пользователю"""
-        stats = self.storage.get_user_stats(user_id)
-        settings = self.storage.get_user_settings(user_id)
-        qa_list = self.storage.get_user_qa(user_id)
+        async with self.storage.asession(user_id) as session:
+            stats = session.get_user_stats(user_id)
+            settings = session.get_user_settings(user_id)
+            qa_list = session.get_user_qa(user_id)
         
         total_answered = stats['total_questions_answered']
         if total_answered > 0:
@@ -65,7 +71,7 @@ class AnalyticsService:
         for qa in qa_list:
             qa_id = qa.get('id')
             if qa_id:
-                q_stats = self.storage.get_question_stats(user_id, qa_id)
+                q_stats = stats["question_stats"].get(str(qa_id)) or self.storage.get_default_question_stats()
                 times_asked = q_stats.get('times_asked', 0)
                 times_correct = q_stats.get('times_correct', 0)
                 
@@ -99,7 +105,8 @@ class AnalyticsService:
             "daily_progress": {
                 "questions_today": settings["questions_today"],
                 "daily_goal": settings["daily_goal"],
-                "completion_rate": (settings["questions_today"] / settings["daily_goal"]) * 100 if settings["daily_goal"] > 0 else 0
+                "completion_rate": (settings["questions_today"] / settings["daily_goal"]) * 100 if settings["daily_goal"] > 0 else 0,
+                "history": self.storage.get_daily_history(settings)
             },
             "question_analysis": question_difficulty,
             "study_habits": {
@@ -109,16 +116,16 @@ class AnalyticsService:
         }
 
     async def get_system_metrics(self) -> Dict[str, Any]:
-        """Получение системной аналитики"""
-        user_ids = self.storage.get_all_user_ids()
+        """Получение системной аналитики (пользователи из холодного хранилища только считаются)"""
+        user_ids = await self.storage.aget_all_user_ids()
         active_users = 0
         total_questions = 0
         total_answers = 0
         
         for user_id in user_ids:
-            settings = self.storage.get_user_settings(user_id)
-            stats = self.storage.get_user_stats(user_id)
-            qa_list = self.storage.get_user_qa(user_id)
+            settings = await self.storage.aget_user_settings(user_id)
+            stats = await self.storage.aget_user_stats(user_id)
+            qa_list = await self.storage.aget_user_qa(user_id)
             
             if settings["active"]:
                 active_users += 1
@@ -126,12 +133,18 @@ class AnalyticsService:
             total_questions += len(qa_list)
             total_answers += stats["total_questions_answered"]
         
+        archived_user_ids = await self.storage.aget_archived_user_ids()
+
         return {
-            "total_users": len(user_ids),
+            "total_users": len(user_ids) + len(archived_user_ids),
+            "archived_users": len(archived_user_ids),
             "active_users": active_users,
             "total_questions": total_questions,
             "total_answers": total_answers,
             "recent_events": len([e for e in self.events if self._is_recent(e['timestamp'])]),
+            "storage_cache": self.storage.get_cache_stats(),
+            "outbox": self.outbox.get_stats() if self.outbox else None,
+            "scheduler": self.scheduler.get_stats() if self.scheduler else None,
             "collection_timestamp": datetime.now().isoformat()
         }
 
@@ -150,11 +163,16 @@ class AnalyticsService:
         self.logger.info(f"Cleaned up events older than {days} days")
 
     async def export_events(self, file_path: str):
-        """Экспорт событий в файл"""
-        import json
+        """Экспорт событий в файл JSON Lines (*.gz — со сжатием)"""
+        # Снимок списка — только ссылки; запись идет в потоке, не блокируя бота
+        events = list(self.events)
         try:
-            with open(file_path, 'w', encoding='utf-8') as f:
-                json.dump(self.events, f, ensure_ascii=False, indent=2)
-            self.logger.info(f"Events exported to {file_path}")
+            count = await asyncio.to_thread(self._write_events, Path(file_path), events)
+            self.logger.info(f"{count} events exported to {file_path}")
         except Exception as e:
-            self.logger.error(f"Failed to export events: {e}")
\ No newline at end of file
+            self.logger.error(f"Failed to export events: {e}")
+
+    @staticmethod
+    def _write_events(file_path: Path, events) -> int:
+        with open_output(file_path) as f:
+            return write_jsonl(events, f)
@@ -0,0 +1,1247 @@
+# Copyright (c) 2025 Solovev Ivan, Usenko Evgeny, Alexandrov Arseniy
+
+import gzip
+import hashlib
+import json
+import logging
+import os
+import shutil
+import socket
+import sqlite3
+import tempfile
+import threading
+import time
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple, Any
+from .deck import OP_ADD, OP_DEL, as_deck, apply_op, compacted_ops, deck_from_list
+from .durability import GroupCommitter, WriteGate, file_lock, fsync_path, process_alive, write_temp
+from .registry import UserRegistry
+from .review_log import replay
+
+KIND_QA = "qa"
+KIND_SETTINGS = "settings"
+KIND_STATS = "stats"
+KIND_CURRENT = "current"
+KIND_SCHEDULE = "schedule"
+KIND_CARDS = "cards"
+
+KINDS = (KIND_QA, KIND_SETTINGS, KIND_STATS, KIND_CURRENT, KIND_SCHEDULE, KIND_CARDS)
+
+
+class StorageBackend(ABC):
+    """
+    Интерфейс низкоуровневого хранилища пользовательских документов.
+
+    Документ определяется парой (user_id, kind). Бизнес-логика (счетчики,
+    статистика, значения по умолчанию) остается в Storage.
+    """
+
+    @abstractmethod
+    def load(self, user_id: str, kind: str) -> Any:
+        """Загружает документ или возвращает None, если его нет"""
+
+    @abstractmethod
+    def save(self, user_id: str, kind: str, data: Any) -> bool:
+        """Сохраняет документ целиком"""
+
+    @abstractmethod
+    def delete(self, user_id: str, kind: str) -> bool:
+        """Удаляет документ. Возвращает True, если документ существовал"""
+
+    @abstractmethod
+    def user_ids(self, active_only: bool = False) -> List[str]:
+        """Возвращает идентификаторы всех известных пользователей (или только с активной викториной)"""
+
+    @abstractmethod
+    def append_review(self, user_id: str, record: List[Any]) -> bool:
+        """Дописывает запись в журнал ответов пользователя"""
+
+    @abstractmethod
+    def read_reviews(self, user_id: str, after_seq: int = 0) -> List[List[Any]]:
+        """Возвращает записи журнала с номером больше after_seq"""
+
+    def iter_reviews(self, user_id: str) -> Iterator[List[Any]]:
+        """Все записи журнала ответов по порядку, включая архив (по умолчанию через read_reviews)"""
+        yield from self.read_reviews(user_id)
+
+    def load_many(self, user_id: str, kinds: Optional[List[str]] = None) -> Dict[str, Any]:
+        """Загружает несколько документов пользователя (по умолчанию все виды KINDS)"""
+        return {kind: self.load(user_id, kind) for kind in (kinds or KINDS)}
+
+    def save_many(self, user_id: str, docs: Dict[str, Any]) -> bool:
+        """Сохраняет несколько документов пользователя; None удаляет документ"""
+        ok = True
+        for kind, data in docs.items():
+            if data is None:
+                self.delete(user_id, kind)
+            elif not self.save(user_id, kind, data):
+                ok = False
+        return ok
+
+    def append_deck_ops(self, user_id: str, ops: List[List[Any]]) -> bool:
+        """Применяет операции к колоде вопросов (по умолчанию перезаписью документа)"""
+        deck = as_deck(self.load(user_id, KIND_QA)) or deck_from_list([])
+        for op in ops:
+            apply_op(deck, op)
+        return self.save(user_id, KIND_QA, deck)
+
+    def remember(self, user_id: str, kind: str, data: Any):
+        """Сообщает актуальное состояние документа без записи (для кэширующих бэкендов)"""
+
+    @contextmanager
+    def quiesce(self):
+        """
+        Приостанавливает запись на время блока with, например для снимка
+        каталога данных. Начатые записи завершаются, новые ждут выхода.
+        """
+        yield
+
+    def archive_inactive(self, before: float, owns: Optional[Callable[[str], bool]] = None) -> List[str]:
+        """
+        Переносит пользователей без викторины, не писавших с момента before,
+        в холодное хранилище (только тех, для кого owns вернет True, если он
+        задан). Возвращает перенесенных (по умолчанию никого).
+        """
+        return []
+
+    def archived_user_ids(self) -> List[str]:
+        """Пользователи в холодном хранилище"""
+        return []
+
+    def iter_archived(self) -> Iterator[Tuple[str, Dict[str, Any], List[List[Any]]]]:
+        """
+        Пользователи холодного хранилища прямо из архива, без возврата в
+        горячее: (user_id, документы, журнал ответов). По умолчанию никого.
+        """
+        return iter(())
+
+    def load_question_stats(self, user_id: str, question_id: int) -> Optional[Dict[str, Any]]:
+        """Возвращает статистику одного вопроса (по умолчанию через полный документ)"""
+        stats = self.load(user_id, KIND_STATS) or {}
+        return stats.get("question_stats", {}).get(str(question_id))
+
+    def close(self):
+        """Освобождает ресурсы хранилища"""
+
+
+class JsonStorageBackend(StorageBackend):
+    """
+    Хранилище в виде JSON-файлов: все документы пользователя лежат в одном
+    файле profile_<id>.json, журнал ответов — рядом в reviews_<id>.jsonl,
+    колода вопросов — в журнале операций deck_<id>.jsonl.
+    Файлы разложены по двухуровневым каталогам users/ab/cd/ по хэшу
+    идентификатора, а список пользователей ведется в индексе UserRegistry.
+
+    Старая раскладка (отдельные user_, user_settings_, user_stats_,
+    current_ файлы) читается, пока у пользователя нет профиля, и больше
+    не изменяется: первая же запись переносит документы в профиль.
+
+    Файл пишется во временный и подменяется через os.replace после fsync,
+    так что при сбое на диске остается либо старая, либо новая версия.
+    При group_commit_window > 0 fsync выполняются пакетами GroupCommitter.
+
+    Давно не писавшие пользователи переносятся archive_inactive в сжатый
+    архив своего шарда (cold.jsonl.gz) и пропадают из перебора
+    пользователей; первое же обращение к ним возвращает файлы на место.
+    """
+
+    PROFILE_VERSION = 1
+    LOCK_STRIPES = 64
+    DECK_COMPACT_MIN = 64
+    PACK_NAME = "cold.jsonl.gz"
+    STALE_TEMP_AGE = 3600
+
+    # Свой каталог временных файлов процесс чистит один раз: следующие
+    # экземпляры хранилища в том же процессе уже пишут в него
+    _cleaned_tmp_dirs: Set[Path] = set()
+
+    LEGACY_PREFIXES = {
+        KIND_QA: "user_",
+        KIND_SETTINGS: "user_settings_",
+        KIND_STATS: "user_stats_",
+        KIND_CURRENT: "current_",
+    }
+
+    def __init__(self, data_dir: Path, review_log_max_bytes: int = 65536, group_commit_window: float = 0):
+        self.data_dir = Path(data_dir)
+        self.data_dir.mkdir(exist_ok=True, parents=True)
+        self.review_log_max_bytes = review_log_max_bytes
+        self.logger = logging.getLogger(__name__)
+        self._reviews_lock = threading.Lock()
+        self._pack_lock = threading.Lock()
+        self._profile_locks = [threading.Lock() for _ in range(self.LOCK_STRIPES)]
+        self._deck_deletes: Dict[str, int] = {}
+        self._gate = WriteGate()
+        self._committer = GroupCommitter(group_commit_window) if group_commit_window > 0 else None
+        # Общий tmp/ хранит блокировки, а временные файлы каждый процесс
+        # (обработчик WORKER_PROCESSES, копия бота) пишет в свой подкаталог
+        self.tmp_root = self.data_dir / "tmp"
+        self.tmp_root.mkdir(exist_ok=True)
+        self._host = socket.gethostname()
+        self.tmp_dir = self.tmp_root / f"{self._host}-{os.getpid()}"
+        self._remove_stale_temp_files()
+        self.tmp_dir.mkdir(exist_ok=True)
+        self._cleaned_tmp_dirs.add(self.tmp_dir)
+
+        self.registry = UserRegistry(self.data_dir / "registry.db")
+        if self.registry.count() == 0:
+            self.rebuild_registry()
+
+    def _remove_stale_temp_files(self):
+        """
+        Удаляет временные файлы записей, прерванных сбоем: каталоги
+        завершившихся процессов этой машины (и свой — от прежнего процесса
+        с тем же pid). Чужие каталоги и файлы старой раскладки удаляются,
+        только если пролежали дольше STALE_TEMP_AGE: их хозяин может быть
+        жив, например копия бота на другой машине.
+        """
+        stale_before = time.time() - self.STALE_TEMP_AGE
+        for path in list(self.tmp_root.iterdir()):
+            try:
+                if path.is_dir():
+                    host, _, pid = path.name.rpartition("-")
+                    if path == self.tmp_dir:
+                        if path not in self._cleaned_tmp_dirs:
+                            shutil.rmtree(path)
+                        continue
+                    if host == self._host and pid.isdigit() and not process_alive(int(pid)):
+                        shutil.rmtree(path)
+                        continue
+                    for tmp_path in path.glob(".*.tmp"):
+                        if tmp_path.stat().st_mtime < stale_before:
+                            tmp_path.unlink()
+                    if not any(path.iterdir()) and path.stat().st_mtime < stale_before:
+                        path.rmdir()
+                elif path.name.endswith(".tmp") and path.stat().st_mtime < stale_before:
+                    path.unlink()
+            except FileNotFoundError:
+                pass
+            except Exception as e:
+                self.logger.error(f"Error removing {path}: {e}")
+        for tmp_path in self.data_dir.glob(".*.tmp"):
+            try:
+                if tmp_path.stat().st_mtime < stale_before:
+                    tmp_path.unlink()
+            except FileNotFoundError:
+                pass
+            except Exception as e:
+                self.logger.error(f"Error removing {tmp_path}: {e}")
+
+    @classmethod
+    def legacy_prefix(cls, kind: str) -> str:
+        return cls.LEGACY_PREFIXES.get(kind, f"{kind}_")
+
+    def _legacy_file(self, user_id: str, kind: str) -> Path:
+        return self.data_dir / f"{self.legacy_prefix(kind)}{user_id}.json"
+
+    @staticmethod
+    def shard_dir(data_dir: Path, user_id: str) -> Path:
+        digest = hashlib.sha1(user_id.encode('utf-8')).hexdigest()
+        return Path(data_dir) / "users" / digest[:2] / digest[2:4]
+
+    def _shard_dir(self, user_id: str) -> Path:
+        return self.shard_dir(self.data_dir, user_id)
+
+    def _profile_file(self, user_id: str) -> Path:
+        return self._shard_dir(user_id) / f"profile_{user_id}.json"
+
+    def _profile_lock(self, user_id: str) -> threading.Lock:
+        return self._profile_locks[hash(user_id) % self.LOCK_STRIPES]
+
+    def _user_file_lock(self, user_id: str):
+        """
+        Блокировка файлов пользователя между процессами: копии бота
+        (QUIZ_LEASE_TTL) и обработчики могут писать одного пользователя.
+        Файлы блокировок полосами по хэшу лежат в общем tmp/.
+        """
+        digest = hashlib.sha1(user_id.encode('utf-8')).hexdigest()
+        return file_lock(self.tmp_root / f"user-{digest[:2]}.lock")
+
+    @contextmanager
+    def _writing(self, user_id: str):
+        """Запись документов пользователя: через ворота quiesce и под блокировками профиля"""
+        with self._gate.shared(), self._profile_lock(user_id), self._user_file_lock(user_id):
+            yield
+
+    def quiesce(self):
+        return self._gate.exclusive()
+
+    def _load_json_file(self, file_path: Path) -> Any:
+        try:
+            if file_path.exists():
+                with open(file_path, 'r', encoding='utf-8') as f:
+                    return json.load(f)
+        except ValueError as e:
+            self._quarantine(file_path, e)
+        except Exception as e:
+            self.logger.error(f"Error loading {file_path}: {e}")
+        return None
+
+    def _quarantine(self, file_path: Path, error: Exception):
+        """Откладывает поврежденный файл в сторону, чтобы его не затерла следующая запись"""
+        corrupt_path = file_path.with_name(f"{file_path.name}.corrupt-{datetime.now():%Y%m%d%H%M%S}")
+        try:
+            os.replace(file_path, corrupt_path)
+            self.logger.error(f"Corrupted {file_path} moved to {corrupt_path.name}: {error}")
+        except Exception as e:
+            self.logger.error(f"Corrupted {file_path} ({error}), failed to move it aside: {e}")
+
+    def _replace_durably(self, tmp_path: Path, file_path: Path):
+        if self._committer:
+            self._committer.replace(tmp_path, file_path)
+            return
+        fsync_path(tmp_path)
+        os.replace(tmp_path, file_path)
+        fsync_path(file_path.parent)
+
+    def _write_atomic(self, file_path: Path, text: str):
+        file_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = write_temp(file_path, text, self.tmp_dir)
+        try:
+            self._replace_durably(tmp_path, file_path)
+        except BaseException:
+            if tmp_path.exists():
+                tmp_path.unlink()
+            raise
+
+    def _save_json_file(self, file_path: Path, data: Any) -> bool:
+        try:
+            self._write_atomic(file_path, json.dumps(data, ensure_ascii=False, indent=2))
+            return True
+        except Exception as e:
+            self.logger.error(f"Error saving {file_path}: {e}")
+            return False
+
+    def _reviews_file(self, user_id: str) -> Path:
+        return self._shard_dir(user_id) / f"reviews_{user_id}.jsonl"
+
+    def _archive_file(self, user_id: str) -> Path:
+        return self._shard_dir(user_id) / f"reviews_{user_id}.archive.jsonl.gz"
+
+    def _deck_file(self, user_id: str) -> Path:
+        return self._shard_dir(user_id) / f"deck_{user_id}.jsonl"
+
+    # --- Профиль пользователя ---
+
+    def _load_legacy(self, user_id: str) -> Dict[str, Any]:
+        docs = {}
+        for kind in KINDS:
+            data = self._load_json_file(self._legacy_file(user_id, kind))
+            if data is not None:
+                docs[kind] = data
+        return docs
+
+    def _load_docs(self, user_id: str) -> Dict[str, Any]:
+        """Все документы пользователя: из профиля или, до миграции, из старых файлов"""
+        profile = self._load_json_file(self._profile_file(user_id))
+        if profile is not None:
+            return profile.get("docs", {})
+        return self._load_legacy(user_id)
+
+    def _replay_stats(self, user_id: str, docs: Dict[str, Any]):
+        stats = docs.get(KIND_STATS)
+        if stats is not None and self._reviews_file(user_id).exists():
+            docs[KIND_STATS] = replay(stats, self.read_reviews(user_id, stats.get("log_seq", 0)))
+
+    def load(self, user_id: str, kind: str) -> Any:
+        return self.load_many(user_id, [kind]).get(kind)
+
+    def load_many(self, user_id: str, kinds: Optional[List[str]] = None) -> Dict[str, Any]:
+        self._ensure_hot(user_id)
+        docs = self._load_docs(user_id)
+        docs = {kind: docs.get(kind) for kind in (kinds or KINDS)}
+        if KIND_QA in docs:
+            docs[KIND_QA] = self._load_deck(user_id, docs[KIND_QA])
+        self._replay_stats(user_id, docs)
+        return docs
+
+    def save(self, user_id: str, kind: str, data: Any) -> bool:
+        return self.save_many(user_id, {kind: data})
+
+    def save_many(self, user_id: str, docs: Dict[str, Any]) -> bool:
+        with self._writing(user_id):
+            if not self._save_many_locked(user_id, docs):
+                return False
+
+        stats = docs.get(KIND_STATS)
+        if stats is not None:
+            self._compact_reviews(user_id, stats.get("log_seq", 0))
+        return True
+
+    def _save_many_locked(self, user_id: str, docs: Dict[str, Any]) -> bool:
+        if not self._thaw_locked(user_id):
+            return False
+        current = self._load_docs(user_id)
+        for kind, data in docs.items():
+            if kind == KIND_QA:
+                # Колода живет в своем журнале, в профиле ее быть не должно
+                current.pop(kind, None)
+                if not self._save_deck(user_id, as_deck(data)):
+                    return False
+            elif data is None:
+                current.pop(kind, None)
+            else:
+                current[kind] = data
+        profile = {"version": self.PROFILE_VERSION, "docs": current}
+        if not self._save_json_file(self._profile_file(user_id), profile):
+            return False
+        self._touch_registry(user_id, docs)
+        return True
+
+    def delete(self, user_id: str, kind: str) -> bool:
+        if self.load(user_id, kind) is None:
+            return False
+        return self.save_many(user_id, {kind: None})
+
+    def migrate_user(self, user_id: str, remove_legacy: bool = False) -> bool:
+        """
+        Переносит документы пользователя из старой раскладки в профиль.
+
+        Уже существующий профиль создан первой записью из тех же файлов и
+        главнее их. Новый профиль перечитывается и сверяется со старыми
+        файлами; удаляются они только при remove_legacy.
+        """
+        with self._writing(user_id):
+            if not self._thaw_locked(user_id):
+                return False
+            legacy = self._load_legacy(user_id)
+            if not self._profile_file(user_id).exists():
+                profile = {"version": self.PROFILE_VERSION, "docs": legacy}
+                if not self._save_json_file(self._profile_file(user_id), profile):
+                    return False
+                self._touch_registry(user_id, legacy)
+                docs = (self._load_json_file(self._profile_file(user_id)) or {}).get("docs", {})
+                if docs != legacy:
+                    self.logger.error(f"Profile of {user_id} differs from legacy files, keeping them")
+                    return False
+            if remove_legacy:
+                for kind in legacy:
+                    self._legacy_file(user_id, kind).unlink()
+            return True
+
+    # --- Колода вопросов ---
+
+    def _read_deck(self, user_id: str):
+        """Собирает колоду из журнала операций: (колода или None, число мертвых строк)"""
+        file_path = self._deck_file(user_id)
+        try:
+            with open(file_path, 'r', encoding='utf-8') as f:
+                return self._parse_deck(f, file_path)
+        except FileNotFoundError:
+            return None, 0
+
+    def _parse_deck(self, lines: Iterable[str], source: Path):
+        deck = deck_from_list([])
+        count = 0
+        for line in lines:
+            try:
+                op = json.loads(line)
+            except ValueError:
+                # Оборванная при сбое последняя строка
+                self.logger.warning(f"Skipping damaged operation in {source}")
+                continue
+            apply_op(deck, op)
+            count += 1
+        # Живые строки — заголовок со счетчиком и по одной на вопрос
+        return deck, max(0, count - 1 - len(deck["items"]))
+
+    def _load_deck(self, user_id: str, profile_qa: Any) -> Any:
+        deck, dead = self._read_deck(user_id)
+        if deck is None:
+            # Журнала еще нет: колода в профиле или в старом файле
+            return as_deck(profile_qa)
+        if dead >= max(self.DECK_COMPACT_MIN, len(deck["items"])):
+            self._compact_deck(user_id)
+        return deck
+
+    def _compact_deck(self, user_id: str, force: bool = True):
+        """Переписывает журнал колоды без удаленных вопросов"""
+        with self._writing(user_id):
+            self._deck_deletes.pop(user_id, None)
+            deck, dead = self._read_deck(user_id)
+            if deck is not None and (force or dead >= max(self.DECK_COMPACT_MIN, len(deck["items"]))):
+                self._save_deck(user_id, deck)
+
+    def _save_deck(self, user_id: str, deck: Optional[Dict[str, Any]]) -> bool:
+        file_path = self._deck_file(user_id)
+        try:
+            if deck is None:
+                if file_path.exists():
+                    file_path.unlink()
+                return True
+            self._write_atomic(file_path, "".join(
+                json.dumps(op, ensure_ascii=False) + "\n" for op in compacted_ops(deck)
+            ))
+            return True
+        except Exception as e:
+            self.logger.error(f"Error saving {file_path}: {e}")
+            return False
+
+    def append_deck_ops(self, user_id: str, ops: List[List[Any]]) -> bool:
+        file_path = self._deck_file(user_id)
+        try:
+            with self._writing(user_id):
+                if not self._thaw_locked(user_id):
+                    return False
+                if not file_path.exists():
+                    # Первая операция: колода из профиля переезжает в журнал
+                    deck = as_deck(self._load_docs(user_id).get(KIND_QA)) or deck_from_list([])
+                    for op in ops:
+                        apply_op(deck, op)
+                    return self._save_many_locked(user_id, {KIND_QA: deck})
+
+                with open(file_path, 'a', encoding='utf-8') as f:
+                    f.writelines(json.dumps(op, ensure_ascii=False) + "\n" for op in ops)
+                    if not self._committer:
+                        f.flush()
+                        os.fsync(f.fileno())
+            if self._committer:
+                self._committer.sync(file_path)
+        except Exception as e:
+            self.logger.error(f"Error appending deck operations for {user_id}: {e}")
+            return False
+
+        # Удаления копятся в памяти, чтобы проверять журнал на мусор
+        # не при каждой операции, а раз в DECK_COMPACT_MIN удалений
+        deletes = self._deck_deletes.get(user_id, 0) + sum(1 for op in ops if op[0] == OP_DEL)
+        self._deck_deletes[user_id] = deletes
+        if deletes >= self.DECK_COMPACT_MIN:
+            self._compact_deck(user_id, force=False)
+        return True
+
+    # --- Журнал ответов ---
+
+    def append_review(self, user_id: str, record: List[Any]) -> bool:
+        file_path = self._reviews_file(user_id)
+        try:
+            line = json.dumps(record, ensure_ascii=False) + "\n"
+            file_path.parent.mkdir(parents=True, exist_ok=True)
+            while True:
+                # Флаг проверяется под той же блокировкой, под которой
+                # archive_inactive убирает журнал в архив шарда
+                with self._gate.shared(), self._user_file_lock(user_id), self._reviews_lock:
+                    if not self.registry.is_archived(user_id):
+                        with open(file_path, 'a', encoding='utf-8') as f:
+                            f.write(line)
+                            if not self._committer:
+                                f.flush()
+                                os.fsync(f.fileno())
+                        break
+                if not self._ensure_hot(user_id):
+                    return False
+            if self._committer:
+                self._committer.sync(file_path)
+            return True
+        except Exception as e:
+            self.logger.error(f"Error appending review for {user_id}: {e}")
+            return False
+
+    def read_reviews(self, user_id: str, after_seq: int = 0) -> List[List[Any]]:
+        file_path = self._reviews_file(user_id)
+        records = []
+        try:
+            with open(file_path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # Оборванная при сбое последняя строка
+                        self.logger.warning(f"Skipping damaged record in {file_path}")
+                        continue
+                    if record[0] > after_seq:
+                        records.append(record)
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            self.logger.error(f"Error reading {file_path}: {e}")
+        return records
+
+    def iter_reviews(self, user_id: str) -> Iterator[List[Any]]:
+        # Оба файла открываются под блокировкой: сжатие журнала подменяет
+        # его новым файлом, а открытый дескриптор продолжает видеть старый,
+        # поэтому записи не теряются, а повторы отсекаются по seq
+        self._ensure_hot(user_id)
+        handles = []
+        with self._reviews_lock:
+            for file_path, opener in ((self._archive_file(user_id), gzip.open), (self._reviews_file(user_id), open)):
+                try:
+                    handles.append((file_path, opener(file_path, 'rt', encoding='utf-8')))
+                except FileNotFoundError:
+                    pass
+
+        last_seq = 0
+        for file_path, f in handles:
+            with f:
+                try:
+                    for line in f:
+                        try:
+                            record = json.loads(line)
+                        except ValueError:
+                            self.logger.warning(f"Skipping damaged record in {file_path}")
+                            continue
+                        if record[0] > last_seq:
+                            last_seq = record[0]
+                            yield record
+                except (EOFError, OSError) as e:
+                    # Архив дописывается сжатием прямо сейчас
+                    self.logger.warning(f"Stopped reading {file_path}: {e}")
+
+    def _compact_reviews(self, user_id: str, log_seq: int):
+        """Переносит учтенные снимком записи журнала в сжатый архив"""
+        file_path = self._reviews_file(user_id)
+        try:
+            with self._gate.shared(), self._user_file_lock(user_id), self._reviews_lock:
+                if not file_path.exists() or file_path.stat().st_size <= self.review_log_max_bytes:
+                    return
+                records = self.read_reviews(user_id)
+                archived = [record for record in records if record[0] <= log_seq]
+                if not archived:
+                    return
+                tail = records[len(archived):]
+
+                archive_path = self._archive_file(user_id)
+                with gzip.open(archive_path, 'at', encoding='utf-8') as f:
+                    f.writelines(json.dumps(record, ensure_ascii=False) + "\n" for record in archived)
+                fsync_path(archive_path)
+
+                self._write_atomic(file_path, "".join(
+                    json.dumps(record, ensure_ascii=False) + "\n" for record in tail
+                ))
+        except Exception as e:
+            self.logger.error(f"Error compacting {file_path}: {e}")
+
+    # --- Индекс пользователей ---
+
+    def _touch_registry(self, user_id: str, docs: Dict[str, Any]):
+        settings = docs.get(KIND_SETTINGS)
+        quiz_active = bool(settings.get("active")) if settings else None
+        try:
+            self.registry.touch(user_id, quiz_active)
+        except Exception as e:
+            self.logger.error(f"Error updating registry for {user_id}: {e}")
+
+    def _scan_user_ids(self) -> List[str]:
+        """Обход каталога: профили в шардах и файлы старой раскладки"""
+        user_ids = set()
+
+        for profile_file in (self.data_dir / "users").glob("*/*/profile_*.json"):
+            user_id = profile_file.stem.replace("profile_", "", 1)
+            if user_id:
+                user_ids.add(user_id)
+
+        for deck_file in (self.data_dir / "users").glob("*/*/deck_*.jsonl"):
+            user_id = deck_file.stem.replace("deck_", "", 1)
+            if user_id:
+                user_ids.add(user_id)
+
+        for qa_file in self.data_dir.glob("user_*.json"):
+            user_id = qa_file.stem.replace("user_", "")
+            if user_id and not user_id.startswith("settings_") and not user_id.startswith("stats_"):
+                user_ids.add(user_id)
+
+        for settings_file in self.data_dir.glob("user_settings_*.json"):
+            user_id = settings_file.stem.replace("user_settings_", "")
+            if user_id:
+                user_ids.add(user_id)
+
+        return list(user_ids)
+
+    def rebuild_registry(self) -> int:
+        """Заполняет индекс пользователей обходом каталога (при первом запуске)"""
+        user_ids = self._scan_user_ids()
+        for user_id in user_ids:
+            settings = self.load(user_id, KIND_SETTINGS) or {}
+            profile_file = self._profile_file(user_id)
+            source = profile_file if profile_file.exists() else self._legacy_file(user_id, KIND_SETTINGS)
+            last_active = source.stat().st_mtime if source.exists() else None
+            self.registry.touch(user_id, bool(settings.get("active")), last_active)
+
+        # Пользователи из архивов шардов, которых нет среди горячих файлов
+        hot = set(user_ids)
+        for pack_file in (self.data_dir / "users").glob(f"*/*/{self.PACK_NAME}"):
+            for entry in self._read_pack(pack_file):
+                if entry["user_id"] not in hot:
+                    user_ids.append(entry["user_id"])
+                    self.registry.touch(entry["user_id"], False, entry["last_active"])
+                    self.registry.set_archived(entry["user_id"], True)
+        if user_ids:
+            self.logger.info(f"Registry rebuilt with {len(user_ids)} users")
+        return len(user_ids)
+
+    def user_ids(self, active_only: bool = False) -> List[str]:
+        return self.registry.user_ids(active_only)
+
+    def archived_user_ids(self) -> List[str]:
+        return self.registry.user_ids(archived=True)
+
+    def iter_archived(self) -> Iterator[Tuple[str, Dict[str, Any], List[List[Any]]]]:
+        # Архив шарда подменяется целиком через os.replace, так что
+        # читать его можно без блокировок, не мешая перезаписи
+        for pack_file in sorted((self.data_dir / "users").glob(f"*/*/{self.PACK_NAME}")):
+            for entry in self._read_pack(pack_file):
+                try:
+                    yield self._unpack_entry(entry, pack_file)
+                except Exception as e:
+                    self.logger.error(f"Error reading {entry.get('user_id')} from {pack_file}: {e}")
+
+    def _unpack_entry(self, entry: Dict[str, Any], pack_file: Path):
+        """Документы и журнал ответов пользователя из записи архива шарда"""
+        user_id = entry["user_id"]
+        files = entry["files"]
+        profile = files.get(self._profile_file(user_id).name)
+        docs = json.loads(profile).get("docs", {}) if profile else {}
+
+        deck_text = files.get(self._deck_file(user_id).name)
+        if deck_text is not None:
+            docs[KIND_QA], _ = self._parse_deck(deck_text.splitlines(), pack_file)
+
+        records = []
+        for name in (self._archive_file(user_id).name, self._reviews_file(user_id).name):
+            for line in (files.get(name) or "").splitlines():
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                if not records or record[0] > records[-1][0]:
+                    records.append(record)
+
+        stats = docs.get(KIND_STATS)
+        if stats is not None:
+            log_seq = stats.get("log_seq", 0)
+            docs[KIND_STATS] = replay(stats, [record for record in records if record[0] > log_seq])
+        return user_id, docs, records
+
+    # --- Холодное хранилище ---
+
+    def _pack_file(self, user_id: str) -> Path:
+        return self._shard_dir(user_id) / self.PACK_NAME
+
+    def _user_files(self, user_id: str) -> List[Path]:
+        return [self._profile_file(user_id), self._deck_file(user_id),
+                self._reviews_file(user_id), self._archive_file(user_id)]
+
+    def _read_pack(self, pack_file: Path) -> List[Dict[str, Any]]:
+        try:
+            with gzip.open(pack_file, 'rt', encoding='utf-8') as f:
+                return [json.loads(line) for line in f]
+        except FileNotFoundError:
+            return []
+
+    def _write_pack(self, pack_file: Path, entries: List[Dict[str, Any]]):
+        """Подменяет архив шарда; возвращается только после fsync"""
+        if not entries:
+            if pack_file.exists():
+                pack_file.unlink()
+                fsync_path(pack_file.parent)
+            return
+        fd, tmp_name = tempfile.mkstemp(dir=str(self.tmp_dir), prefix=f".{self.PACK_NAME}.", suffix=".tmp")
+        try:
+            with os.fdopen(fd, 'wb') as raw, gzip.GzipFile(fileobj=raw, mode='wb', mtime=0) as f:
+                for entry in entries:
+                    f.write((json.dumps(entry, ensure_ascii=False) + "\n").encode('utf-8'))
+            fsync_path(Path(tmp_name))
+            os.replace(tmp_name, pack_file)
+            fsync_path(pack_file.parent)
+        except BaseException:
+            if os.path.exists(tmp_name):
+                os.unlink(tmp_name)
+            raise
+
+    def _write_gzip_atomic(self, file_path: Path, text: str):
+        fd, tmp_name = tempfile.mkstemp(dir=str(self.tmp_dir), prefix=f".{file_path.name}.", suffix=".tmp")
+        try:
+            with os.fdopen(fd, 'wb') as raw, gzip.GzipFile(fileobj=raw, mode='wb') as f:
+                f.write(text.encode('utf-8'))
+            self._replace_durably(Path(tmp_name), file_path)
+        except BaseException:
+            if os.path.exists(tmp_name):
+                os.unlink(tmp_name)
+            raise
+
+    @contextmanager
+    def _pack_guard(self):
+        """
+        Блокировка перезаписи архивов шардов. В одном архиве лежат
+        пользователи разных процессов-обработчиков (WORKER_PROCESSES),
+        поэтому кроме потоков исключаются и другие процессы.
+        """
+        with self._pack_lock, file_lock(self.tmp_root / "cold.lock"):
+            yield
+
+    def _freeze_locked(self, user_id: str, last_active: float) -> bool:
+        """Убирает файлы пользователя в архив шарда (под блокировками профиля и журнала)"""
+        if self.registry.is_archived(user_id):
+            return False
+        if any(self._legacy_file(user_id, kind).exists() for kind in KINDS):
+            # Старая раскладка лежит вне шардов, сначала нужна миграция
+            return False
+        files = [path for path in self._user_files(user_id) if path.exists()]
+        if not files:
+            return False
+
+        # Архив журнала ответов кладется распакованным: весь архив шарда сжат целиком
+        entry = {"user_id": user_id, "last_active": last_active, "files": {}}
+        for path in files:
+            opener = gzip.open if path.suffix == ".gz" else open
+            with opener(path, 'rt', encoding='utf-8') as f:
+                entry["files"][path.name] = f.read()
+
+        pack_file = self._pack_file(user_id)
+        with self._pack_guard():
+            entries = [e for e in self._read_pack(pack_file) if e["user_id"] != user_id]
+            self._write_pack(pack_file, entries + [entry])
+        # Флаг ставится раньше удаления: после сбоя между ними файлы
+        # просто восстановятся из архива поверх таких же
+        self.registry.set_archived(user_id, True)
+        for path in files:
+            path.unlink()
+        fsync_path(pack_file.parent)
+        self._deck_deletes.pop(user_id, None)
+        return True
+
+    def _thaw_locked(self, user_id: str) -> bool:
+        """Возвращает файлы пользователя из архива шарда (под блокировкой профиля)"""
+        if not self.registry.is_archived(user_id):
+            return True
+        pack_file = self._pack_file(user_id)
+        try:
+            with self._reviews_lock, self._pack_guard():
+                entries = self._read_pack(pack_file)
+                entry = next((e for e in entries if e["user_id"] == user_id), None)
+                if entry is not None:
+                    shard_dir = self._shard_dir(user_id)
+                    for name, text in entry["files"].items():
+                        if name.endswith(".gz"):
+                            self._write_gzip_atomic(shard_dir / name, text)
+                        else:
+                            self._write_atomic(shard_dir / name, text)
+                    self._write_pack(pack_file, [e for e in entries if e["user_id"] != user_id])
+                else:
+                    self.logger.error(f"User {user_id} is marked archived but missing from {pack_file}")
+                self.registry.set_archived(user_id, False)
+        except Exception as e:
+            self.logger.error(f"Error restoring {user_id} from cold storage: {e}")
+            return False
+        self.logger.info(f"User {user_id} restored from cold storage")
+        return True
+
+    def _ensure_hot(self, user_id: str) -> bool:
+        """Возвращает пользователя из холодного хранилища, если он там"""
+        if not self.registry.is_archived(user_id):
+            return True
+        with self._writing(user_id):
+            return self._thaw_locked(user_id)
+
+    def archive_inactive(self, before: float, owns: Optional[Callable[[str], bool]] = None) -> List[str]:
+        archived = []
+        for user_id in self.registry.inactive_user_ids(before):
+            if owns is not None and not owns(user_id):
+                continue
+            try:
+                with self._writing(user_id), self._reviews_lock:
+                    record = self.registry.get(user_id)
+                    # Пока ждали блокировку, пользователь мог написать
+                    if not record or record["quiz_active"] or record["last_active"] >= before:
+                        continue
+                    if self._freeze_locked(user_id, record["last_active"]):
+                        archived.append(user_id)
+            except Exception as e:
+                self.logger.error(f"Error archiving {user_id}: {e}")
+        if archived:
+            self.logger.info(f"Moved {len(archived)} inactive users to cold storage")
+        return archived
+
+    def close(self):
+        if self._committer:
+            self._committer.close()
+        self.registry.close()
+
+
+class SqliteStorageBackend(StorageBackend):
+    """
+    Хранилище в SQLite (режим WAL).
+
+    Вопросы и статистика по вопросам лежат построчно, поэтому точечные
+    запросы (например, статистика одного вопроса) не читают весь документ,
+    а добавление и удаление вопроса — это одна строка qa_pairs. Счетчик
+    идентификаторов колоды хранится в documents под видом qa_meta.
+    Журнал ответов: по ключу (user_id, seq) читаются только записи после
+    снимка статистики. Учтенные снимком записи переносятся в
+    reviews_archive в той же транзакции, что и сам снимок, поэтому
+    таблица reviews остается короткой, а полную историю отдает
+    iter_reviews.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS settings (
+            user_id TEXT PRIMARY KEY,
+            data TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS qa_pairs (
+            user_id TEXT NOT NULL,
+            position INTEGER NOT NULL,
+            qa_id INTEGER,
+            data TEXT NOT NULL,
+            PRIMARY KEY (user_id, position)
+        );
+        CREATE INDEX IF NOT EXISTS qa_pairs_qa_id ON qa_pairs (user_id, qa_id);
+        CREATE TABLE IF NOT EXISTS user_stats (
+            user_id TEXT PRIMARY KEY,
+            data TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS question_stats (
+            user_id TEXT NOT NULL,
+            question_id TEXT NOT NULL,
+            times_asked INTEGER NOT NULL DEFAULT 0,
+            times_correct INTEGER NOT NULL DEFAULT 0,
+            total_response_time REAL NOT NULL DEFAULT 0,
+            last_quality INTEGER NOT NULL DEFAULT 0,
+            last_reviewed TEXT,
+            PRIMARY KEY (user_id, question_id)
+        );
+        CREATE TABLE IF NOT EXISTS current_question (
+            user_id TEXT PRIMARY KEY,
+            data TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS documents (
+            user_id TEXT NOT NULL,
+            kind TEXT NOT NULL,
+            data TEXT NOT NULL,
+            PRIMARY KEY (user_id, kind)
+        );
+        CREATE TABLE IF NOT EXISTS reviews (
+            user_id TEXT NOT NULL,
+            seq INTEGER NOT NULL,
+            data TEXT NOT NULL,
+            PRIMARY KEY (user_id, seq)
+        ) WITHOUT ROWID;
+        CREATE TABLE IF NOT EXISTS reviews_archive (
+            user_id TEXT NOT NULL,
+            seq INTEGER NOT NULL,
+            data TEXT NOT NULL,
+            PRIMARY KEY (user_id, seq)
+        ) WITHOUT ROWID;
+    """
+
+    DECK_META = "qa_meta"
+
+    QUESTION_STATS_FIELDS = ("times_asked", "times_correct", "total_response_time",
+                             "last_quality", "last_reviewed")
+
+    def __init__(self, db_path: Path):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(exist_ok=True, parents=True)
+        self.logger = logging.getLogger(__name__)
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(self.SCHEMA)
+
+    def _dumps(self, data: Any) -> str:
+        return json.dumps(data, ensure_ascii=False)
+
+    def _load_blob(self, table: str, user_id: str) -> Any:
+        row = self._conn.execute(f"SELECT data FROM {table} WHERE user_id = ?", (user_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def _save_blob(self, table: str, user_id: str, data: Any):
+        self._conn.execute(
+            f"INSERT INTO {table} (user_id, data) VALUES (?, ?) "
+            f"ON CONFLICT(user_id) DO UPDATE SET data = excluded.data",
+            (user_id, self._dumps(data))
+        )
+
+    def _question_stats_row(self, row: tuple) -> Dict[str, Any]:
+        return dict(zip(self.QUESTION_STATS_FIELDS, row))
+
+    def load(self, user_id: str, kind: str) -> Any:
+        try:
+            with self._lock:
+                if kind == KIND_SETTINGS:
+                    return self._load_blob("settings", user_id)
+                if kind == KIND_CURRENT:
+                    return self._load_blob("current_question", user_id)
+                if kind == KIND_QA:
+                    return self._load_deck(user_id)
+                if kind == KIND_STATS:
+                    stats = self._load_blob("user_stats", user_id)
+                    if stats is None:
+                        return None
+                    rows = self._conn.execute(
+                        "SELECT question_id, times_asked, times_correct, total_response_time, "
+                        "last_quality, last_reviewed FROM question_stats WHERE user_id = ?", (user_id,)
+                    ).fetchall()
+                    stats["question_stats"] = {row[0]: self._question_stats_row(row[1:]) for row in rows}
+                    return replay(stats, self.read_reviews(user_id, stats.get("log_seq", 0)))
+                row = self._conn.execute(
+                    "SELECT data FROM documents WHERE user_id = ? AND kind = ?", (user_id, kind)
+                ).fetchone()
+                return json.loads(row[0]) if row else None
+        except Exception as e:
+            self.logger.error(f"Error loading {kind} for {user_id}: {e}")
+        return None
+
+    def save(self, user_id: str, kind: str, data: Any) -> bool:
+        try:
+            with self._lock:
+                self._conn.execute("BEGIN IMMEDIATE")
+                try:
+                    self._save_in_transaction(user_id, kind, data)
+                    self._conn.execute("COMMIT")
+                except Exception:
+                    self._conn.execute("ROLLBACK")
+                    raise
+            return True
+        except Exception as e:
+            self.logger.error(f"Error saving {kind} for {user_id}: {e}")
+            return False
+
+    def _save_in_transaction(self, user_id: str, kind: str, data: Any):
+        if kind == KIND_SETTINGS:
+            self._save_blob("settings", user_id, data)
+        elif kind == KIND_CURRENT:
+            self._save_blob("current_question", user_id, data)
+        elif kind == KIND_QA:
+            deck = as_deck(data)
+            self._conn.execute("DELETE FROM qa_pairs WHERE user_id = ?", (user_id,))
+            self._conn.executemany(
+                "INSERT INTO qa_pairs (user_id, position, qa_id, data) VALUES (?, ?, ?, ?)",
+                [(user_id, position, qa["id"], self._dumps(qa))
+                 for position, qa in enumerate(deck["items"].values())]
+            )
+            self._save_deck_meta(user_id, deck["next_id"])
+        elif kind == KIND_STATS:
+            aggregates = {key: value for key, value in data.items() if key != "question_stats"}
+            self._save_blob("user_stats", user_id, aggregates)
+            self._conn.execute("DELETE FROM question_stats WHERE user_id = ?", (user_id,))
+            rows = []
+            for question_id, q_stats in data.get("question_stats", {}).items():
+                rows.append((
+                    user_id,
+                    str(question_id),
+                    q_stats.get("times_asked", 0),
+                    q_stats.get("times_correct", 0),
+                    q_stats.get("total_response_time", 0),
+                    q_stats.get("last_quality", 0),
+                    q_stats.get("last_reviewed")
+                ))
+            self._conn.executemany(
+                "INSERT INTO question_stats (user_id, question_id, times_asked, times_correct, "
+                "total_response_time, last_quality, last_reviewed) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                rows
+            )
+            self._archive_reviews(user_id, data.get("log_seq", 0))
+        else:
+            self._conn.execute(
+                "INSERT INTO documents (user_id, kind, data) VALUES (?, ?, ?) "
+                "ON CONFLICT(user_id, kind) DO UPDATE SET data = excluded.data",
+                (user_id, kind, self._dumps(data))
+            )
+
+    def _archive_reviews(self, user_id: str, log_seq: int):
+        """Переносит учтенные снимком записи журнала в reviews_archive (внутри транзакции)"""
+        if not log_seq:
+            return
+        self._conn.execute(
+            "INSERT OR IGNORE INTO reviews_archive (user_id, seq, data) "
+            "SELECT user_id, seq, data FROM reviews WHERE user_id = ? AND seq <= ?",
+            (user_id, log_seq)
+        )
+        self._conn.execute("DELETE FROM reviews WHERE user_id = ? AND seq <= ?", (user_id, log_seq))
+
+    def _load_deck(self, user_id: str) -> Optional[Dict[str, Any]]:
+        rows = self._conn.execute(
+            "SELECT data FROM qa_pairs WHERE user_id = ? ORDER BY position", (user_id,)
+        ).fetchall()
+        meta = self._conn.execute(
+            "SELECT data FROM documents WHERE user_id = ? AND kind = ?", (user_id, self.DECK_META)
+        ).fetchone()
+        if not rows and meta is None:
+            return None
+        next_id = json.loads(meta[0])["next_id"] if meta else 1
+        deck = deck_from_list([json.loads(row[0]) for row in rows], next_id)
+        if len(deck["items"]) != len(rows) or deck["next_id"] != next_id:
+            # Колода из старых строк (без счетчика или с повторами id) —
+            # закрепляем выданные идентификаторы, чтобы по ним можно было удалять
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._save_in_transaction(user_id, KIND_QA, deck)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return deck
+
+    def _save_deck_meta(self, user_id: str, next_id: int):
+        self._conn.execute(
+            "INSERT INTO documents (user_id, kind, data) VALUES (?, ?, ?) "
+            "ON CONFLICT(user_id, kind) DO UPDATE SET data = excluded.data",
+            (user_id, self.DECK_META, self._dumps({"next_id": next_id}))
+        )
+
+    def append_deck_ops(self, user_id: str, ops: List[List[Any]]) -> bool:
+        try:
+            with self._lock:
+                self._conn.execute("BEGIN IMMEDIATE")
+                try:
+                    for op in ops:
+                        if op[0] == OP_ADD:
+                            qa = op[1]
+                            self._conn.execute(
+                                "INSERT INTO qa_pairs (user_id, position, qa_id, data) VALUES (?, "
+                                "(SELECT COALESCE(MAX(position), -1) + 1 FROM qa_pairs WHERE user_id = ?), ?, ?)",
+                                (user_id, user_id, qa["id"], self._dumps(qa))
+                            )
+                            self._conn.execute(
+                                "INSERT INTO documents (user_id, kind, data) VALUES (?, ?, ?) "
+                                "ON CONFLICT(user_id, kind) DO UPDATE SET data = "
+                                "json_set(data, '$.next_id', max(json_extract(data, '$.next_id'), "
+                                "json_extract(excluded.data, '$.next_id')))",
+                                (user_id, self.DECK_META, self._dumps({"next_id": qa["id"] + 1}))
+                            )
+                        elif op[0] == OP_DEL:
+                            self._conn.execute(
+                                "DELETE FROM qa_pairs WHERE user_id = ? AND qa_id = ?", (user_id, op[1])
+                            )
+                    self._conn.execute("COMMIT")
+                except Exception:
+                    self._conn.execute("ROLLBACK")
+                    raise
+            return True
+        except Exception as e:
+            self.logger.error(f"Error appending deck operations for {user_id}: {e}")
+            return False
+
+    def save_many(self, user_id: str, docs: Dict[str, Any]) -> bool:
+        try:
+            with self._lock:
+                self._conn.execute("BEGIN IMMEDIATE")
+                try:
+                    for kind, data in docs.items():
+                        if data is None:
+                            self._delete_in_transaction(user_id, kind)
+                        else:
+                            self._save_in_transaction(user_id, kind, data)
+                    self._conn.execute("COMMIT")
+                except Exception:
+                    self._conn.execute("ROLLBACK")
+                    raise
+            return True
+        except Exception as e:
+            self.logger.error(f"Error saving {', '.join(docs)} for {user_id}: {e}")
+            return False
+
+    DELETE_TABLES = {
+        KIND_SETTINGS: ("settings",),
+        KIND_CURRENT: ("current_question",),
+        KIND_QA: ("qa_pairs",),
+        KIND_STATS: ("user_stats", "question_stats"),
+    }
+
+    def _delete_in_transaction(self, user_id: str, kind: str) -> int:
+        if kind not in self.DELETE_TABLES:
+            return self._conn.execute(
+                "DELETE FROM documents WHERE user_id = ? AND kind = ?", (user_id, kind)
+            ).rowcount
+        deleted = 0
+        for table in self.DELETE_TABLES[kind]:
+            deleted += self._conn.execute(f"DELETE FROM {table} WHERE user_id = ?", (user_id,)).rowcount
+        return deleted
+
+    def delete(self, user_id: str, kind: str) -> bool:
+        try:
+            with self._lock:
+                return self._delete_in_transaction(user_id, kind) > 0
+        except Exception as e:
+            self.logger.error(f"Error deleting {kind} for {user_id}: {e}")
+            return False
+
+    def user_ids(self, active_only: bool = False) -> List[str]:
+        if active_only:
+            query = "SELECT user_id FROM settings WHERE json_extract(data, '$.active')"
+        else:
+            query = "SELECT user_id FROM settings UNION SELECT DISTINCT user_id FROM qa_pairs"
+        with self._lock:
+            rows = self._conn.execute(query).fetchall()
+        return [row[0] for row in rows]
+
+    def append_review(self, user_id: str, record: List[Any]) -> bool:
+        try:
+            with self._lock:
+                self._conn.execute(
+                    "INSERT INTO reviews (user_id, seq, data) VALUES (?, ?, ?)",
+                    (user_id, record[0], self._dumps(record))
+                )
+            return True
+        except Exception as e:
+            self.logger.error(f"Error appending review for {user_id}: {e}")
+            return False
+
+    def read_reviews(self, user_id: str, after_seq: int = 0) -> List[List[Any]]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT data FROM reviews WHERE user_id = ? AND seq > ? ORDER BY seq", (user_id, after_seq)
+            ).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def iter_reviews(self, user_id: str, chunk_size: int = 500) -> Iterator[List[Any]]:
+        # Постранично по ключу, чтобы не держать блокировку на весь обход.
+        # Страница читается из обеих таблиц одним запросом: запись,
+        # перенесенная в архив между страницами, не теряется
+        last_seq = 0
+        while True:
+            with self._lock:
+                rows = self._conn.execute(
+                    "SELECT seq, data FROM ("
+                    "SELECT seq, data FROM reviews_archive WHERE user_id = ? AND seq > ? "
+                    "UNION ALL "
+                    "SELECT seq, data FROM reviews WHERE user_id = ? AND seq > ?"
+                    ") ORDER BY seq LIMIT ?",
+                    (user_id, last_seq, user_id, last_seq, chunk_size)
+                ).fetchall()
+            for seq, data in rows:
+                yield json.loads(data)
+            if len(rows) < chunk_size:
+                return
+            last_seq = rows[-1][0]
+
+    def load_question_stats(self, user_id: str, question_id: int) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            aggregates = self._load_blob("user_stats", user_id) or {}
+            if self.read_reviews(user_id, aggregates.get("log_seq", 0)):
+                # Снимок отстает от журнала — собираем документ целиком
+                return super().load_question_stats(user_id, question_id)
+            row = self._conn.execute(
+                "SELECT times_asked, times_correct, total_response_time, last_quality, last_reviewed "
+                "FROM question_stats WHERE user_id = ? AND question_id = ?", (user_id, str(question_id))
+            ).fetchone()
+        return self._question_stats_row(row) if row else None
+
+    @contextmanager
+    def quiesce(self):
+        # Все операции идут под self._lock; WAL сливается в основной файл,
+        # чтобы снимок базы был полным и без файла -wal
+        with self._lock:
+            self._conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            yield
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def create_backend(database_config) -> StorageBackend:
+    """Создает бэкенд хранилища по конфигурации DatabaseConfig"""
+    if database_config.backend == "json":
+        return JsonStorageBackend(
+            database_config.data_dir,
+            review_log_max_bytes=database_config.review_log_max_bytes,
+            group_commit_window=database_config.group_commit_window
+        )
+    if database_config.backend == "sqlite":
+        return SqliteStorageBackend(database_config.data_dir / database_config.sqlite_file)
+    raise ValueError(f"Unknown storage backend: {database_config.backend}")
@@ -0,0 +1,345 @@
+# Copyright (c) 2025 Solovev Ivan, Usenko Evgeny, Alexandrov Arseniy
+
+"""
+Инкрементальные снимки каталога данных.
+
+Раскладка каталога резервных копий:
+    objects/ab/<sha256>.gz     — сжатое содержимое файла, одно на каждое
+                                 уникальное содержимое во всех снимках
+    snapshots/<id>/manifest.json
+    snapshots/<id>/data/...    — дерево каталога данных; каждый файл —
+                                 жесткая ссылка на свой объект
+
+Снимок хранит только изменившееся содержимое: файл, у которого не
+поменялись размер, время изменения и inode, берет хэш из предыдущего
+манифеста без чтения, а одинаковое содержимое лежит на диске один раз.
+Базы SQLite копируются через backup API, поэтому их снимок согласован
+и без остановки записи.
+
+Если снимок делает работающий бот, каталог данных замораживается через
+Storage.quiesce(), но только на время stage: изменившиеся файлы получают
+жесткие ссылки в промежуточном каталоге tmp/ данных, а базы SQLite
+копируются туда же. Файлы подменяются атомарно, а журналы только
+дописываются, поэтому ссылка с запомненным размером хранит содержимое
+на момент stage; хэширование и сжатие (finish) идут уже при открытой
+записи. Снимок из отдельного процесса этой гарантии не имеет: каждый
+JSON-файл цел, но файлы могут относиться к разным моментам.
+"""
+
+import gzip
+import hashlib
+import json
+import logging
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+from contextlib import nullcontext
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Any
+
+CHUNK_SIZE = 1024 * 1024
+
+
+class BackupManager:
+    """Снимки, проверка, восстановление и ротация резервных копий"""
+
+    MANIFEST_VERSION = 1
+    EXCLUDE_DIRS = {"tmp", "logs"}
+    EXCLUDE_SUFFIXES = (".tmp", "-wal", "-shm", "-journal")
+    SQLITE_SUFFIXES = (".db", ".sqlite", ".sqlite3")
+    # Промежуточные каталоги снимков, прерванных сбоем, удаляются через сутки
+    STALE_STAGING_AGE = 86400
+
+    def __init__(self, data_dir: Path, backup_dir: Path, keep: int = 7, storage=None):
+        self.data_dir = Path(data_dir).resolve()
+        self.backup_dir = Path(backup_dir).resolve()
+        self.keep = keep
+        self.storage = storage
+        self.logger = logging.getLogger(__name__)
+        self.objects_dir = self.backup_dir / "objects"
+        self.snapshots_dir = self.backup_dir / "snapshots"
+        self.tmp_dir = self.backup_dir / "tmp"
+        for directory in (self.objects_dir, self.snapshots_dir, self.tmp_dir):
+            directory.mkdir(parents=True, exist_ok=True)
+
+    # --- Объекты ---
+
+    def _object_path(self, digest: str) -> Path:
+        return self.objects_dir / digest[:2] / f"{digest}.gz"
+
+    def _store(self, source: Path, size: Optional[int] = None) -> str:
+        """
+        Сжимает файл (или его первые size байт) в хранилище объектов,
+        возвращает sha256 содержимого
+        """
+        sha = hashlib.sha256()
+        fd, tmp_name = tempfile.mkstemp(dir=str(self.tmp_dir), suffix=".gz")
+        try:
+            with os.fdopen(fd, "wb") as raw, gzip.GzipFile(fileobj=raw, mode="wb", mtime=0) as out:
+                with open(source, "rb") as f:
+                    left = size
+                    while left is None or left > 0:
+                        chunk = f.read(CHUNK_SIZE if left is None else min(CHUNK_SIZE, left))
+                        if not chunk:
+                            break
+                        if left is not None:
+                            left -= len(chunk)
+                        sha.update(chunk)
+                        out.write(chunk)
+            digest = sha.hexdigest()
+            object_path = self._object_path(digest)
+            if object_path.exists():
+                os.unlink(tmp_name)
+            else:
+                object_path.parent.mkdir(exist_ok=True)
+                os.replace(tmp_name, object_path)
+            return digest
+        except BaseException:
+            if os.path.exists(tmp_name):
+                os.unlink(tmp_name)
+            raise
+
+    @staticmethod
+    def _copy_sqlite(source: Path, target: Path):
+        """Согласованная копия базы SQLite через backup API"""
+        src = sqlite3.connect(f"file:{source}?mode=ro", uri=True)
+        dst = sqlite3.connect(str(target))
+        try:
+            src.backup(dst)
+        finally:
+            dst.close()
+            src.close()
+
+    @staticmethod
+    def _link_or_copy(source: Path, target: Path):
+        try:
+            os.link(source, target)
+        except OSError:
+            # Файловая система без жестких ссылок
+            shutil.copy2(source, target)
+
+    # --- Снимки ---
+
+    def list_snapshots(self) -> List[str]:
+        """Завершенные снимки от старых к новым"""
+        return sorted(
+            path.name for path in self.snapshots_dir.iterdir()
+            if path.is_dir() and (path / "manifest.json").exists()
+        )
+
+    def load_manifest(self, snapshot_id: str) -> Optional[Dict[str, Any]]:
+        try:
+            with open(self.snapshots_dir / snapshot_id / "manifest.json", "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def _iter_data_files(self):
+        for root, dirs, files in os.walk(self.data_dir):
+            root_path = Path(root)
+            dirs[:] = sorted(
+                name for name in dirs
+                if not (root_path == self.data_dir and name in self.EXCLUDE_DIRS)
+                and (root_path / name).resolve() != self.backup_dir
+            )
+            for name in sorted(files):
+                if name.endswith(self.EXCLUDE_SUFFIXES) or ".corrupt-" in name:
+                    continue
+                yield root_path / name
+
+    def snapshot(self) -> Optional[str]:
+        """Делает снимок каталога данных, возвращает его id (None при ошибке)"""
+        quiesce = self.storage.quiesce() if self.storage else nullcontext()
+        with quiesce:
+            staged = self.stage()
+        return self.finish(staged) if staged else None
+
+    def stage(self) -> Optional[Dict[str, Any]]:
+        """
+        Часть снимка, которой нужна остановленная запись: обход каталога,
+        жесткие ссылки на изменившиеся файлы и копии баз SQLite. Только
+        stat и ссылки, без чтения файлов. Результат передается в finish.
+        """
+        snapshot_id = datetime.now().strftime("%Y%m%d-%H%M%S-%f")
+        previous_id = (self.list_snapshots() or [None])[-1]
+        previous = (self.load_manifest(previous_id) or {}).get("files", {}) if previous_id else {}
+        # Ссылки возможны только в пределах файловой системы каталога данных
+        staging_root = self.data_dir / "tmp"
+        staging_root.mkdir(exist_ok=True)
+        for path in staging_root.glob("backup-*"):
+            if path.stat().st_mtime < time.time() - self.STALE_STAGING_AGE:
+                shutil.rmtree(path, ignore_errors=True)
+        staging = Path(tempfile.mkdtemp(dir=str(staging_root), prefix=f"backup-{snapshot_id}."))
+
+        files: Dict[str, Dict[str, Any]] = {}
+        pending = []
+        try:
+            for file_path in self._iter_data_files():
+                relative = file_path.relative_to(self.data_dir).as_posix()
+                try:
+                    st = file_path.stat()
+                except FileNotFoundError:
+                    continue
+                entry = {"size": st.st_size, "mtime_ns": st.st_mtime_ns, "inode": st.st_ino}
+                known = previous.get(relative)
+                staged = staging / str(len(pending))
+                if file_path.name.endswith(self.SQLITE_SUFFIXES):
+                    self._copy_sqlite(file_path, staged)
+                    pending.append((relative, staged, None))
+                elif (known and all(known.get(key) == value for key, value in entry.items())
+                      and self._object_path(known["sha256"]).exists()):
+                    entry["sha256"] = known["sha256"]
+                else:
+                    try:
+                        self._link_or_copy(file_path, staged)
+                    except FileNotFoundError:
+                        continue
+                    pending.append((relative, staged, st.st_size))
+                files[relative] = entry
+        except Exception as e:
+            self.logger.error(f"Backup snapshot failed: {e}")
+            shutil.rmtree(staging, ignore_errors=True)
+            return None
+        return {"id": snapshot_id, "staging": staging, "files": files, "pending": pending}
+
+    def finish(self, staged: Dict[str, Any]) -> Optional[str]:
+        """Сжимает подготовленные stage файлы, собирает снимок и чистит старые"""
+        snapshot_id, files, pending = staged["id"], staged["files"], staged["pending"]
+        try:
+            for relative, staged_path, size in pending:
+                files[relative]["sha256"] = self._store(staged_path, size)
+            self._link_snapshot(snapshot_id, files)
+        except Exception as e:
+            self.logger.error(f"Backup snapshot failed: {e}")
+            shutil.rmtree(self.snapshots_dir / f"{snapshot_id}.partial", ignore_errors=True)
+            return None
+        finally:
+            shutil.rmtree(staged["staging"], ignore_errors=True)
+
+        reused = len(files) - len(pending)
+        self.logger.info(
+            f"Backup snapshot {snapshot_id}: {len(files)} files, {len(pending)} stored, {reused} unchanged"
+        )
+        self.prune()
+        return snapshot_id
+
+    def _link_snapshot(self, snapshot_id: str, files: Dict[str, Dict[str, Any]]):
+        """Собирает дерево снимка из жестких ссылок и пишет манифест последним"""
+        partial_dir = self.snapshots_dir / f"{snapshot_id}.partial"
+        for relative, entry in files.items():
+            target = partial_dir / "data" / f"{relative}.gz"
+            target.parent.mkdir(parents=True, exist_ok=True)
+            self._link_or_copy(self._object_path(entry["sha256"]), target)
+
+        manifest = {
+            "version": self.MANIFEST_VERSION,
+            "created": datetime.now().isoformat(),
+            "data_dir": str(self.data_dir),
+            "files": files
+        }
+        with open(partial_dir / "manifest.json", "w", encoding="utf-8") as f:
+            json.dump(manifest, f, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(partial_dir, self.snapshots_dir / snapshot_id)
+
+    # --- Ротация ---
+
+    def prune(self) -> List[str]:
+        """Оставляет keep последних снимков и удаляет объекты, на которые никто не ссылается"""
+        snapshots = self.list_snapshots()
+        removed = snapshots[:-self.keep] if self.keep > 0 else []
+        for snapshot_id in removed:
+            shutil.rmtree(self.snapshots_dir / snapshot_id)
+        for path in self.snapshots_dir.glob("*.partial"):
+            shutil.rmtree(path, ignore_errors=True)
+
+        referenced = set()
+        for snapshot_id in self.list_snapshots():
+            for entry in (self.load_manifest(snapshot_id) or {}).get("files", {}).values():
+                referenced.add(entry["sha256"])
+        for object_path in self.objects_dir.glob("*/*.gz"):
+            if object_path.name[:-len(".gz")] not in referenced:
+                object_path.unlink()
+
+        if removed:
+            self.logger.info(f"Pruned backup snapshots: {', '.join(removed)}")
+        return removed
+
+    # --- Проверка и восстановление ---
+
+    def _extract(self, digest: str, target: Optional[Path]) -> bool:
+        """Распаковывает объект (в target или никуда) и сверяет sha256"""
+        sha = hashlib.sha256()
+        out = open(target, "wb") if target else None
+        try:
+            with gzip.open(self._object_path(digest), "rb") as f:
+                for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+                    sha.update(chunk)
+                    if out:
+                        out.write(chunk)
+        except (OSError, EOFError) as e:
+            self.logger.error(f"Backup object {digest} is unreadable: {e}")
+            return False
+        finally:
+            if out:
+                out.close()
+        return sha.hexdigest() == digest
+
+    def verify(self, snapshot_id: str) -> List[str]:
+        """Проверяет целостность снимка, возвращает список поврежденных файлов"""
+        manifest = self.load_manifest(snapshot_id)
+        if manifest is None:
+            return [f"snapshot {snapshot_id} not found"]
+
+        damaged = []
+        checked: Dict[str, bool] = {}
+        for relative, entry in manifest["files"].items():
+            digest = entry["sha256"]
+            if digest not in checked:
+                checked[digest] = self._extract(digest, None)
+            if not checked[digest]:
+                damaged.append(relative)
+        return damaged
+
+    def restore(self, snapshot_id: str, target_dir: Path, force: bool = False) -> bool:
+        """
+        Восстанавливает снимок в target_dir с проверкой sha256 каждого файла.
+
+        Данные собираются во временном каталоге рядом и подменяют
+        target_dir только если все файлы сошлись. Существующий непустой
+        target_dir заменяется лишь с force и откладывается в сторону.
+        """
+        manifest = self.load_manifest(snapshot_id)
+        if manifest is None:
+            self.logger.error(f"Backup snapshot {snapshot_id} not found")
+            return False
+
+        target_dir = Path(target_dir).resolve()
+        if target_dir.exists() and any(target_dir.iterdir()) and not force:
+            self.logger.error(f"{target_dir} is not empty, use force to replace it")
+            return False
+
+        staging_dir = target_dir.with_name(f"{target_dir.name}.restoring")
+        shutil.rmtree(staging_dir, ignore_errors=True)
+        damaged = []
+        for relative, entry in manifest["files"].items():
+            target = staging_dir / relative
+            target.parent.mkdir(parents=True, exist_ok=True)
+            if not self._extract(entry["sha256"], target):
+                damaged.append(relative)
+        if damaged:
+            self.logger.error(f"Restore of {snapshot_id} aborted, damaged files: {', '.join(damaged)}")
+            shutil.rmtree(staging_dir, ignore_errors=True)
+            return False
+
+        if target_dir.exists():
+            aside = target_dir.with_name(f"{target_dir.name}.pre-restore-{datetime.now():%Y%m%d%H%M%S}")
+            os.replace(target_dir, aside)
+            self.logger.info(f"Previous {target_dir} moved to {aside.name}")
+        os.replace(staging_dir, target_dir)
+        self.logger.info(f"Snapshot {snapshot_id} restored to {target_dir} ({len(manifest['files'])} files)")
+        return True
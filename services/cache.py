@@ -0,0 +1,334 @@
+# Copyright (c) 2025 Solovev Ivan, Usenko Evgeny, Alexandrov Arseniy
+
+import json
+import logging
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Set, Tuple, Any
+from .backends import StorageBackend, KIND_SETTINGS
+
+_MISSING = object()
+
+
+class _CacheEntry:
+    """Документы одного пользователя в кэше"""
+
+    __slots__ = ("docs", "dirty", "complete")
+
+    def __init__(self):
+        self.docs: Dict[str, Any] = {}
+        self.dirty: Set[str] = set()
+        self.complete = False
+
+
+class CachedBackend(StorageBackend):
+    """
+    LRU-кэш пользовательских документов с отложенной записью.
+
+    Изменения помечаются как "грязные" и сбрасываются во вложенный бэкенд
+    фоновым потоком раз в flush_interval секунд, при вытеснении пользователя
+    из кэша и при закрытии хранилища.
+
+    Общая блокировка защищает только словари в памяти: чтение и запись
+    вложенного бэкенда идут без нее, под блокировкой пользователя
+    (полосы по хэшу id), так что диск одного пользователя не задерживает
+    остальных. Снятые, но еще не записанные документы лежат в _pending:
+    загрузка накладывает их поверх прочитанного с диска, а неудачная
+    запись остается там до следующего сброса.
+    """
+
+    LOCK_STRIPES = 64
+
+    def __init__(self, backend: StorageBackend, max_users: int, flush_interval: float):
+        self.backend = backend
+        self.max_users = max_users
+        self.flush_interval = flush_interval
+        self.logger = logging.getLogger(__name__)
+
+        self._entries: "OrderedDict[str, _CacheEntry]" = OrderedDict()
+        self._pending: Dict[str, Dict[str, Any]] = {}
+        self._loading: Dict[str, threading.Event] = {}
+        self._evicted: List[str] = []
+        self._lock = threading.RLock()
+        self._user_locks = [threading.Lock() for _ in range(self.LOCK_STRIPES)]
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.flushes = 0
+        self.flushed_documents = 0
+        self.failed_writes = 0
+
+        self._stop = threading.Event()
+        self._flusher = threading.Thread(target=self._flush_loop, name="storage-flusher", daemon=True)
+        self._flusher.start()
+
+    # --- Работа с записями ---
+
+    def _user_lock(self, user_id: str) -> threading.Lock:
+        return self._user_locks[hash(user_id) % self.LOCK_STRIPES]
+
+    def _entry(self, user_id: str) -> _CacheEntry:
+        """Запись пользователя (под self._lock); лишние записи снимаются в _pending"""
+        entry = self._entries.get(user_id)
+        if entry is None:
+            entry = _CacheEntry()
+            self._entries[user_id] = entry
+            while len(self._entries) > self.max_users:
+                evicted_id, evicted = self._entries.popitem(last=False)
+                self.evictions += 1
+                if evicted.dirty:
+                    self._snapshot(evicted_id, evicted)
+                    self._evicted.append(evicted_id)
+        else:
+            self._entries.move_to_end(user_id)
+        return entry
+
+    def _snapshot(self, user_id: str, entry: _CacheEntry):
+        """Переносит копии грязных документов в _pending (под self._lock)"""
+        if not entry.dirty:
+            return
+        # json.dumps без отступов целиком выполняется в C под GIL, поэтому
+        # копия консистентна даже если документ меняется в другом потоке
+        pending = self._pending.setdefault(user_id, {})
+        for kind in entry.dirty:
+            data = entry.docs.get(kind)
+            pending[kind] = None if data is None else json.loads(json.dumps(data, ensure_ascii=False))
+        entry.dirty.clear()
+
+    def _write_pending(self, user_id: str) -> bool:
+        """
+        Записывает снятые документы пользователя одной операцией вложенного
+        бэкенда. Под блокировкой пользователя пишется самое свежее
+        содержимое _pending, поэтому старая запись не ляжет поверх новой.
+        """
+        with self._user_lock(user_id):
+            with self._lock:
+                snapshot = dict(self._pending.get(user_id) or {})
+            if not snapshot:
+                return True
+            try:
+                ok = self.backend.save_many(user_id, snapshot)
+            except Exception as e:
+                self.logger.error(f"Error writing cached documents of {user_id}: {e}")
+                ok = False
+            with self._lock:
+                if not ok:
+                    self.failed_writes += 1
+                    self.logger.error(
+                        f"Failed to write {', '.join(snapshot)} for {user_id}, keeping them until the next flush"
+                    )
+                    return False
+                pending = self._pending.get(user_id, {})
+                for kind, data in snapshot.items():
+                    # Документ могли снять заново, пока шла запись
+                    if pending.get(kind, _MISSING) is data:
+                        del pending[kind]
+                if not pending:
+                    self._pending.pop(user_id, None)
+                self.flushed_documents += len(snapshot)
+            return True
+
+    def _write_evicted(self):
+        """Записывает только что вытесненных пользователей (вне self._lock); неудачи повторит flush"""
+        with self._lock:
+            user_ids, self._evicted = self._evicted, []
+        for user_id in user_ids:
+            self._write_pending(user_id)
+
+    def _read(self, user_id: str) -> Dict[str, Any]:
+        """
+        Читает документы пользователя с диска и накладывает несброшенные.
+        Блокировка пользователя исключает запись, которая закончилась бы
+        между чтением диска и чтением _pending.
+        """
+        with self._user_lock(user_id):
+            docs = self.backend.load_many(user_id)
+            with self._lock:
+                docs.update(self._pending.get(user_id, {}))
+        return docs
+
+    # --- Интерфейс StorageBackend ---
+
+    def load(self, user_id: str, kind: str) -> Any:
+        while True:
+            with self._lock:
+                entry = self._entry(user_id)
+                data = entry.docs.get(kind, _MISSING)
+                if data is not _MISSING:
+                    self.hits += 1
+                    return data
+                loading = self._loading.get(user_id)
+                if loading is None:
+                    self.misses += 1
+                    loading = self._loading[user_id] = threading.Event()
+                    break
+            # Пользователя уже читает другой поток — ждем и смотрим снова
+            loading.wait()
+
+        try:
+            self._write_evicted()
+            docs = {} if entry.complete else self._read(user_id)
+            with self._lock:
+                # Пользователь читается целиком одним обращением к бэкенду;
+                # документы, уже измененные в кэше, не затираются
+                for loaded_kind, loaded in docs.items():
+                    entry.docs.setdefault(loaded_kind, loaded)
+                entry.complete = True
+                data = entry.docs.get(kind, _MISSING)
+        finally:
+            with self._lock:
+                self._loading.pop(user_id).set()
+
+        if data is _MISSING:
+            data = self._read_one(user_id, kind, entry)
+        return data
+
+    def _read_one(self, user_id: str, kind: str, entry: _CacheEntry) -> Any:
+        """Документ вида, которого нет в load_many (редкий случай)"""
+        with self._user_lock(user_id):
+            data = self.backend.load(user_id, kind)
+            with self._lock:
+                data = self._pending.get(user_id, {}).get(kind, data)
+                return entry.docs.setdefault(kind, data)
+
+    def save(self, user_id: str, kind: str, data: Any) -> bool:
+        with self._lock:
+            entry = self._entry(user_id)
+            entry.docs[kind] = data
+            entry.dirty.add(kind)
+        self._write_evicted()
+        return True
+
+    def delete(self, user_id: str, kind: str) -> bool:
+        existed = self.load(user_id, kind) is not None
+        with self._lock:
+            entry = self._entry(user_id)
+            entry.docs[kind] = None
+            entry.dirty.add(kind)
+        self._write_evicted()
+        return existed
+
+    def append_review(self, user_id: str, record: List[Any]) -> bool:
+        return self.backend.append_review(user_id, record)
+
+    def read_reviews(self, user_id: str, after_seq: int = 0) -> List[List[Any]]:
+        return self.backend.read_reviews(user_id, after_seq)
+
+    def iter_reviews(self, user_id: str) -> Iterator[List[Any]]:
+        return self.backend.iter_reviews(user_id)
+
+    def append_deck_ops(self, user_id: str, ops: List[List[Any]]) -> bool:
+        return self.backend.append_deck_ops(user_id, ops)
+
+    def remember(self, user_id: str, kind: str, data: Any):
+        with self._lock:
+            self._entry(user_id).docs[kind] = data
+            pending = self._pending.get(user_id)
+            if pending is not None and kind in pending:
+                # Несброшенная копия устарела: бэкенд уже содержит data
+                pending[kind] = json.loads(json.dumps(data, ensure_ascii=False))
+        self._write_evicted()
+
+    def user_ids(self, active_only: bool = False) -> List[str]:
+        user_ids = set(self.backend.user_ids(active_only))
+        with self._lock:
+            # Несброшенные документы главнее индекса вложенного бэкенда;
+            # грязные документы в кэше новее снятых в _pending
+            unflushed = {user_id: dict(docs) for user_id, docs in self._pending.items()}
+            for user_id, entry in self._entries.items():
+                for kind in entry.dirty:
+                    unflushed.setdefault(user_id, {})[kind] = entry.docs.get(kind)
+        for user_id, docs in unflushed.items():
+            if active_only:
+                if KIND_SETTINGS in docs:
+                    settings = docs[KIND_SETTINGS]
+                    if settings and settings.get("active"):
+                        user_ids.add(user_id)
+                    else:
+                        user_ids.discard(user_id)
+            elif any(data is not None for data in docs.values()):
+                user_ids.add(user_id)
+        return list(user_ids)
+
+    def archive_inactive(self, before: float, owns: Optional[Callable[[str], bool]] = None) -> List[str]:
+        self.flush()
+        archived = self.backend.archive_inactive(before, owns)
+        with self._lock:
+            for user_id in archived:
+                entry = self._entries.get(user_id)
+                if entry is not None and not entry.dirty and user_id not in self._pending:
+                    del self._entries[user_id]
+        return archived
+
+    def archived_user_ids(self) -> List[str]:
+        return self.backend.archived_user_ids()
+
+    def iter_archived(self) -> Iterator[Tuple[str, Dict[str, Any], List[List[Any]]]]:
+        # В архиве только пользователи, которых archive_inactive убрал из кэша
+        return self.backend.iter_archived()
+
+    # --- Сброс на диск ---
+
+    @contextmanager
+    def quiesce(self):
+        # Сначала на диск уходит все накопленное; изменения, сделанные
+        # во время блока, остаются в кэше до следующего сброса
+        self.flush()
+        with self.backend.quiesce():
+            yield
+
+    def flush(self) -> int:
+        """
+        Сбрасывает все грязные документы, повторяя и неудавшиеся прежде.
+        Возвращает число записанных пользователей.
+        """
+        with self._lock:
+            for user_id, entry in self._entries.items():
+                self._snapshot(user_id, entry)
+            user_ids = list(self._pending)
+
+        written = sum(1 for user_id in user_ids if self._write_pending(user_id))
+        if user_ids:
+            self.flushes += 1
+        return written
+
+    def _flush_loop(self):
+        while not self._stop.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception as e:
+                self.logger.error(f"Background flush failed: {e}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Счетчики кэша для подбора его размера"""
+        with self._lock:
+            cached_users = len(self._entries)
+            dirty_users = sum(1 for entry in self._entries.values() if entry.dirty)
+            pending_users = len(self._pending)
+        lookups = self.hits + self.misses
+        return {
+            "cached_users": cached_users,
+            "max_users": self.max_users,
+            "dirty_users": dirty_users,
+            "pending_users": pending_users,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits / lookups) * 100 if lookups else 0,
+            "evictions": self.evictions,
+            "flushes": self.flushes,
+            "flushed_documents": self.flushed_documents,
+            "failed_writes": self.failed_writes
+        }
+
+    def close(self):
+        self._stop.set()
+        self._flusher.join()
+        self.flush()
+        if self._pending:
+            self.logger.error(
+                f"Closing storage with unwritten documents of {len(self._pending)} users: "
+                f"{', '.join(list(self._pending)[:10])}"
+            )
+        self.backend.close()
@@ -0,0 +1,120 @@
+# Copyright (c) 2025 Solovev Ivan, Usenko Evgeny, Alexandrov Arseniy
+
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Any
+
+
+class DeadLetterStore:
+    """
+    Сообщения, которые очередь отправки не смогла доставить за все попытки.
+
+    Хранятся в SQLite рядом с данными бота и переживают перезапуск;
+    администратор отправляет их повторно командой /replay_dead.
+    Недоставленный вопрос викторины хранится в одном экземпляре на
+    пользователя и вопрос: новая неудача обновляет прежнюю запись.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS dead_letters (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            created REAL NOT NULL,
+            chat_id TEXT,
+            user_id TEXT,
+            kind TEXT NOT NULL,
+            text TEXT,
+            payload TEXT,
+            error TEXT,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            replays INTEGER NOT NULL DEFAULT 0,
+            dedup_key TEXT
+        );
+    """
+
+    def __init__(self, db_path: Path):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(self.SCHEMA)
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(dead_letters)")}
+        if "dedup_key" not in columns:
+            # База, созданная до объединения повторных вопросов
+            self._conn.execute("ALTER TABLE dead_letters ADD COLUMN dedup_key TEXT")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS dead_letters_dedup ON dead_letters (dedup_key)")
+
+    @staticmethod
+    def _dedup_key(chat_id, user_id, kind: str, payload: Optional[Dict[str, Any]]) -> Optional[str]:
+        """Ключ вопроса викторины: пользователь, чат и id вопроса; остальное не объединяется"""
+        if kind != "question" or not payload:
+            return None
+        question_id = (payload.get("qa") or {}).get("id")
+        if question_id is None:
+            return None
+        return json.dumps([str(payload.get("user_id", user_id)), str(chat_id), str(question_id)])
+
+    def add(self, chat_id, user_id, kind: str, text: Optional[str], payload: Optional[Dict[str, Any]],
+            error: str, attempts: int) -> int:
+        dedup_key = self._dedup_key(chat_id, user_id, kind, payload)
+        chat_id = None if chat_id is None else str(chat_id)
+        user_id = None if user_id is None else str(user_id)
+        payload_json = json.dumps(payload, ensure_ascii=False) if payload is not None else None
+        with self._lock:
+            if dedup_key is not None:
+                row = self._conn.execute(
+                    "SELECT id FROM dead_letters WHERE dedup_key = ? ORDER BY id LIMIT 1", (dedup_key,)
+                ).fetchone()
+                if row is not None:
+                    # Тот же вопрос не доставлен снова: место в очереди прежнее
+                    self._conn.execute(
+                        "UPDATE dead_letters SET text = ?, payload = ?, error = ?, attempts = attempts + ? "
+                        "WHERE id = ?",
+                        (text, payload_json, error, attempts, row[0])
+                    )
+                    return row[0]
+            cursor = self._conn.execute(
+                "INSERT INTO dead_letters (created, chat_id, user_id, kind, text, payload, error, attempts, dedup_key) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (time.time(), chat_id, user_id, kind, text, payload_json, error, attempts, dedup_key)
+            )
+            return cursor.lastrowid
+
+    def list(self, limit: int = 20) -> List[Dict[str, Any]]:
+        """Самые старые сообщения первыми"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, created, chat_id, user_id, kind, text, payload, error, attempts, replays "
+                "FROM dead_letters ORDER BY id LIMIT ?", (limit,)
+            ).fetchall()
+        return [
+            {
+                "id": row[0], "created": row[1], "chat_id": row[2], "user_id": row[3], "kind": row[4],
+                "text": row[5], "payload": json.loads(row[6]) if row[6] else None,
+                "error": row[7], "attempts": row[8], "replays": row[9]
+            }
+            for row in rows
+        ]
+
+    def record_failure(self, letter_id: int, error: str):
+        """Неудачная повторная отправка: сообщение остается в очереди"""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE dead_letters SET error = ?, replays = replays + 1 WHERE id = ?",
+                (error, letter_id)
+            )
+
+    def remove(self, letter_id: int):
+        with self._lock:
+            self._conn.execute("DELETE FROM dead_letters WHERE id = ?", (letter_id,))
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM dead_letters").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,75 @@
+# Copyright (c) 2025 Solovev Ivan, Usenko Evgeny, Alexandrov Arseniy
+
+"""
+Колода вопросов пользователя.
+
+Документ колоды — {"next_id": N, "items": {"<id>": qa}}: вопросы лежат в
+словаре по идентификатору в порядке добавления, а счетчик next_id только
+растет, поэтому идентификатор удаленного вопроса не достается новому.
+Поиск, добавление и удаление — операции со словарем, без обхода колоды.
+
+Изменения описываются операциями ["add", qa] и ["del", id], которые
+хранилище может дописывать в журнал вместо перезаписи всей колоды.
+"""
+
+from typing import Dict, List, Optional, Any
+
+OP_ADD = "add"
+OP_DEL = "del"
+OP_NEXT_ID = "next_id"
+
+
+def empty_deck(next_id: int = 1) -> Dict[str, Any]:
+    return {"next_id": next_id, "items": {}}
+
+
+def deck_from_list(qa_list: List[Dict[str, Any]], next_id: int = 1) -> Dict[str, Any]:
+    """
+    Собирает колоду из списка вопросов (старый формат документа).
+
+    Вопросы без id и с повторяющимся id (их выдавал прежний
+    len(qa_list) + 1 после удалений) получают новые идентификаторы.
+    """
+    ids = [qa["id"] for qa in qa_list if isinstance(qa.get("id"), int)]
+    deck = empty_deck(max([next_id] + [qa_id + 1 for qa_id in ids]))
+    for qa in qa_list:
+        qa_id = qa.get("id")
+        if not isinstance(qa_id, int) or str(qa_id) in deck["items"]:
+            qa = dict(qa, id=deck["next_id"])
+            deck["next_id"] += 1
+        deck["items"][str(qa["id"])] = qa
+    return deck
+
+
+def as_deck(data: Any) -> Optional[Dict[str, Any]]:
+    """Приводит сохраненный документ вопросов к колоде (None остается None)"""
+    if data is None or isinstance(data, dict):
+        return data
+    return deck_from_list(data)
+
+
+def deck_items(deck: Optional[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    return list(deck["items"].values()) if deck else []
+
+
+def apply_op(deck: Dict[str, Any], op: List[Any]) -> bool:
+    """
+    Применяет операцию к колоде на месте.
+    Возвращает False для операции, которая ничего не изменила.
+    """
+    if op[0] == OP_ADD:
+        qa = op[1]
+        deck["items"][str(qa["id"])] = qa
+        deck["next_id"] = max(deck["next_id"], qa["id"] + 1)
+        return True
+    if op[0] == OP_DEL:
+        return deck["items"].pop(str(op[1]), None) is not None
+    if op[0] == OP_NEXT_ID:
+        deck["next_id"] = max(deck["next_id"], op[1])
+        return True
+    return False
+
+
+def compacted_ops(deck: Dict[str, Any]) -> List[List[Any]]:
+    """Минимальный журнал, из которого собирается та же колода"""
+    return [[OP_NEXT_ID, deck["next_id"]]] + [[OP_ADD, qa] for qa in deck["items"].values()]
@@ -0,0 +1,232 @@
+# Copyright (c) 2025 Solovev Ivan, Usenko Evgeny, Alexandrov Arseniy
+
+import logging
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import List, Optional, Set, Tuple
+
+try:
+    import fcntl
+except ImportError:
+    # Windows: межпроцессных блокировок нет, бот работает одним процессом
+    fcntl = None
+
+
+def fsync_path(path: Path):
+    """Сбрасывает на диск содержимое файла или каталога"""
+    if Path(path).is_dir():
+        if os.name == "nt":
+            # Каталоги в Windows не открываются для fsync
+            return
+        flags = os.O_RDONLY
+    else:
+        flags = os.O_RDWR
+    fd = os.open(str(path), flags)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+@contextmanager
+def file_lock(lock_path: Path):
+    """
+    Эксклюзивная блокировка между процессами (flock на lock_path).
+
+    Нужна там, где общий файл переписывают обработчики из разных
+    процессов; внутри процесса ее дополняют обычной threading.Lock.
+    """
+    if fcntl is None:
+        yield
+        return
+    with open(lock_path, 'a') as f:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+def process_alive(pid: int) -> bool:
+    """Жив ли процесс pid на этой машине (в Windows проверка не выполняется)"""
+    if os.name == "nt":
+        # os.kill(pid, 0) в Windows не проверяет процесс, а посылает CTRL_C_EVENT
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def write_temp(file_path: Path, text: str, tmp_dir: Optional[Path] = None) -> Path:
+    """
+    Пишет text во временный файл и возвращает его путь. Файл создается
+    в tmp_dir (по умолчанию рядом с file_path) — каталог должен быть на
+    той же файловой системе, чтобы os.replace оставался атомарным.
+    """
+    directory = tmp_dir or file_path.parent
+    fd, tmp_name = tempfile.mkstemp(dir=str(directory), prefix=f".{file_path.name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(text)
+    except BaseException:
+        os.unlink(tmp_name)
+        raise
+    return Path(tmp_name)
+
+
+class WriteGate:
+    """
+    Ворота записей хранилища.
+
+    Записи проходят их параллельно (shared), а quiesce (exclusive)
+    дожидается завершения начатых записей и не пускает новые, пока
+    держит ворота. Поток, уже прошедший ворота, проходит их повторно
+    без ожидания, поэтому вложенные записи не блокируются.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._writers = 0
+        self._closed = False
+        self._local = threading.local()
+
+    @contextmanager
+    def shared(self):
+        depth = getattr(self._local, "depth", 0)
+        if not depth:
+            with self._cond:
+                while self._closed:
+                    self._cond.wait()
+                self._writers += 1
+        self._local.depth = depth + 1
+        try:
+            yield
+        finally:
+            self._local.depth = depth
+            if not depth:
+                with self._cond:
+                    self._writers -= 1
+                    self._cond.notify_all()
+
+    @contextmanager
+    def exclusive(self):
+        with self._cond:
+            while self._closed:
+                self._cond.wait()
+            self._closed = True
+            while self._writers:
+                self._cond.wait()
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._closed = False
+                self._cond.notify_all()
+
+
+class _Batch:
+    __slots__ = ("replaces", "syncs", "done", "error")
+
+    def __init__(self):
+        self.replaces: List[Tuple[Path, Path]] = []
+        self.syncs: Set[Path] = set()
+        self.done = threading.Event()
+        self.error: Optional[BaseException] = None
+
+
+class GroupCommitter:
+    """
+    Групповая фиксация записей на диск.
+
+    Потоки хранилища ставят в очередь подмену файлов и fsync журналов и
+    ждут завершения пакета. Фоновый поток раз в window секунд сбрасывает
+    весь пакет: каждый файл синхронизируется один раз, сколько бы записей
+    в него ни пришло, а каталоги — один раз на пакет, а не на запись.
+    """
+
+    def __init__(self, window: float):
+        self.window = window
+        self.logger = logging.getLogger(__name__)
+        self._cond = threading.Condition()
+        self._batch = _Batch()
+        self._closed = False
+
+        self.batches = 0
+        self.committed = 0
+
+        self._thread = threading.Thread(target=self._loop, name="storage-committer", daemon=True)
+        self._thread.start()
+
+    def replace(self, tmp_path: Path, file_path: Path):
+        """Надежно подменяет file_path временным файлом (блокирует до фиксации)"""
+        self._wait(self._submit(replace=(tmp_path, file_path)))
+
+    def sync(self, file_path: Path):
+        """Дожидается, пока дописанный файл будет сброшен на диск"""
+        self._wait(self._submit(sync=file_path))
+
+    def _submit(self, replace: Tuple[Path, Path] = None, sync: Path = None) -> _Batch:
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("Group committer is closed")
+            batch = self._batch
+            if replace is not None:
+                batch.replaces.append(replace)
+            if sync is not None:
+                batch.syncs.add(sync)
+            self._cond.notify()
+            return batch
+
+    @staticmethod
+    def _wait(batch: _Batch):
+        batch.done.wait()
+        if batch.error is not None:
+            raise batch.error
+
+    def _loop(self):
+        while True:
+            with self._cond:
+                while not self._closed and not (self._batch.replaces or self._batch.syncs):
+                    self._cond.wait()
+                if self._closed and not (self._batch.replaces or self._batch.syncs):
+                    return
+            if not self._closed:
+                # Окно, за которое подтягиваются записи других пользователей
+                time.sleep(self.window)
+            with self._cond:
+                batch, self._batch = self._batch, _Batch()
+            self._commit(batch)
+
+    def _commit(self, batch: _Batch):
+        try:
+            directories = set()
+            for path in batch.syncs:
+                fsync_path(path)
+            for tmp_path, file_path in batch.replaces:
+                fsync_path(tmp_path)
+                os.replace(tmp_path, file_path)
+                directories.add(file_path.parent)
+            for directory in directories:
+                fsync_path(directory)
+            self.batches += 1
+            self.committed += len(batch.syncs) + len(batch.replaces)
+        except BaseException as e:
+            self.logger.error(f"Group commit failed: {e}")
+            batch.error = e
+        finally:
+            batch.done.set()
+
+    def close(self):
+        """Фиксирует оставшийся пакет и останавливает поток"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        self._thread.join()
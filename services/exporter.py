@@ -0,0 +1,182 @@
+# Copyright (c) 2025 Solovev Ivan, Usenko Evgeny, Alexandrov Arseniy
+
+"""
+Потоковый экспорт колод и истории ответов.
+
+Строки выдаются генераторами и сразу пишутся в файл — JSON Lines или CSV,
+с расширением .gz через gzip. В памяти одновременно лежит не больше
+документов одного пользователя, сколько бы пользователей и ответов ни
+было в хранилище. Данные читаются обычными методами Storage, поэтому
+экспорт можно запускать рядом с работающим ботом; пользователи
+холодного хранилища читаются прямо из архива и остаются в нем.
+
+Наборы данных:
+    deck    — вопросы со статистикой и состоянием карточки
+    reviews — журнал ответов
+    all     — оба набора с полем type (только JSONL)
+"""
+
+import csv
+import gzip
+import itertools
+import json
+import logging
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, TextIO, Any
+from .backends import KIND_CARDS, KIND_QA, KIND_STATS
+from .deck import as_deck, deck_items
+from .repetition import new_card
+from .review_log import default_question_stats, is_answer, SEQ, TIMESTAMP, QUESTION_ID, CORRECT, RESPONSE_TIME, QUALITY
+
+DATASETS = ("deck", "reviews", "all")
+
+DECK_FIELDS = (
+    "user_id", "id", "question", "answer", "created_date",
+    "times_asked", "times_correct", "total_response_time", "last_quality", "last_reviewed",
+    "ease_factor", "interval", "repetitions", "due"
+)
+REVIEW_FIELDS = ("user_id", "seq", "timestamp", "question_id", "correct", "response_time", "quality")
+
+
+def detect_format(file_path: Path) -> Optional[str]:
+    """csv или jsonl по расширению (.gz в конце не учитывается)"""
+    suffixes = [suffix.lower() for suffix in Path(file_path).suffixes]
+    if suffixes and suffixes[-1] == ".gz":
+        suffixes.pop()
+    suffix = suffixes[-1] if suffixes else ""
+    return {".csv": "csv", ".jsonl": "jsonl"}.get(suffix)
+
+
+def open_output(file_path: Path) -> TextIO:
+    """Текстовый файл на запись; *.gz сжимается на лету"""
+    if str(file_path).lower().endswith(".gz"):
+        return gzip.open(file_path, "wt", encoding="utf-8", newline="")
+    return open(file_path, "w", encoding="utf-8", newline="")
+
+
+def write_jsonl(rows: Iterable[Dict[str, Any]], f: TextIO) -> int:
+    count = 0
+    for row in rows:
+        f.write(json.dumps(row, ensure_ascii=False) + "\n")
+        count += 1
+    return count
+
+
+def write_csv(rows: Iterable[Dict[str, Any]], f: TextIO, fields: Iterable[str]) -> int:
+    writer = csv.DictWriter(f, fieldnames=list(fields), extrasaction="ignore")
+    writer.writeheader()
+    count = 0
+    for row in rows:
+        writer.writerow(row)
+        count += 1
+    return count
+
+
+class Exporter:
+    """Экспорт данных пользователей из хранилища"""
+
+    def __init__(self, storage):
+        self.storage = storage
+        self.logger = logging.getLogger(__name__)
+
+    def iter_deck(self, user_id: str) -> Iterator[Dict[str, Any]]:
+        """Вопросы пользователя вместе со статистикой и карточкой SM-2"""
+        # Одна сессия — одно чтение документов пользователя
+        with self.storage.session(user_id) as session:
+            qa_list = session.get_user_qa(user_id)
+            question_stats = session.get_user_stats(user_id)["question_stats"]
+            cards = session.get_user_cards(user_id)
+        return self._deck_rows(user_id, qa_list, question_stats, cards)
+
+    def _deck_rows(self, user_id: str, qa_list: List[Dict], question_stats: Dict[str, Any],
+                   cards: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+        for qa in qa_list:
+            question_id = str(qa.get("id"))
+            row = {"user_id": user_id}
+            row.update(qa)
+            row.update(question_stats.get(question_id) or default_question_stats())
+            row.update(cards.get(question_id) or new_card())
+            yield row
+
+    def iter_reviews(self, user_id: str) -> Iterator[Dict[str, Any]]:
+        """Журнал ответов пользователя"""
+        return self._review_rows(user_id, self.storage.iter_user_reviews(user_id))
+
+    def _review_rows(self, user_id: str, records: Iterable[List[Any]]) -> Iterator[Dict[str, Any]]:
+        for record in records:
+            if not is_answer(record):
+                # Отправка вопроса, а не ответ
+                continue
+            yield {
+                "user_id": user_id,
+                "seq": record[SEQ],
+                "timestamp": datetime.fromtimestamp(record[TIMESTAMP]).isoformat(),
+                "question_id": record[QUESTION_ID],
+                "correct": bool(record[CORRECT]),
+                "response_time": record[RESPONSE_TIME],
+                "quality": record[QUALITY]
+            }
+
+    def _rows(self, dataset: str, deck_rows, review_rows) -> Iterator[Dict[str, Any]]:
+        if dataset in ("deck", "all"):
+            for row in deck_rows():
+                yield dict(row, type="question") if dataset == "all" else row
+        if dataset in ("reviews", "all"):
+            for row in review_rows():
+                yield dict(row, type="review") if dataset == "all" else row
+
+    def iter_rows(self, dataset: str, user_ids: Iterable[str]) -> Iterator[Dict[str, Any]]:
+        for user_id in user_ids:
+            yield from self._rows(
+                dataset,
+                lambda: self.iter_deck(user_id),
+                lambda: self.iter_reviews(user_id)
+            )
+
+    def iter_archived_rows(self, dataset: str) -> Iterator[Dict[str, Any]]:
+        """Строки пользователей холодного хранилища, прочитанные из архива без возврата в горячее"""
+        for user_id, docs, records in self.storage.iter_archived_users():
+            stats = docs.get(KIND_STATS) or {}
+            yield from self._rows(
+                dataset,
+                lambda: self._deck_rows(
+                    user_id, deck_items(as_deck(docs.get(KIND_QA))),
+                    stats.get("question_stats", {}), docs.get(KIND_CARDS) or {}
+                ),
+                lambda: self._review_rows(user_id, records)
+            )
+
+    def export(self, file_path: Path, dataset: str = "deck", user_ids: Optional[List[str]] = None,
+               fmt: Optional[str] = None) -> int:
+        """
+        Пишет набор данных в файл (блокирующий вызов).
+        user_ids=None — все пользователи хранилища, включая холодное
+        (они читаются из архива и остаются в нем). Возвращает число строк.
+        """
+        file_path = Path(file_path)
+        fmt = fmt or detect_format(file_path)
+        if dataset not in DATASETS:
+            raise ValueError(f"Unknown dataset: {dataset}")
+        if fmt not in ("csv", "jsonl"):
+            raise ValueError(f"Cannot detect export format of {file_path}")
+        if fmt == "csv" and dataset == "all":
+            raise ValueError("Dataset 'all' is only available as JSONL")
+
+        if user_ids is None:
+            user_ids = self.storage.get_all_user_ids()
+            rows = itertools.chain(self.iter_rows(dataset, user_ids), self.iter_archived_rows(dataset))
+        else:
+            rows = self.iter_rows(dataset, user_ids)
+        try:
+            with open_output(file_path) as f:
+                if fmt == "jsonl":
+                    count = write_jsonl(rows, f)
+                else:
+                    count = write_csv(rows, f, DECK_FIELDS if dataset == "deck" else REVIEW_FIELDS)
+        except BaseException:
+            file_path.unlink(missing_ok=True)
+            raise
+
+        self.logger.info(f"Exported {count} {dataset} rows to {file_path}")
+        return count
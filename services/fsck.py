@@ -0,0 +1,479 @@
+# Copyright (c) 2025 Solovev Ivan, Usenko Evgeny, Alexandrov Arseniy
+
+"""
+Проверка целостности каталога данных JSON-хранилища.
+
+Бот читает поврежденный файл как пустой (и откладывает его в сторону),
+а статистика и карточки удаленных вопросов остаются в профиле навсегда.
+Проверка находит такие места, не запуская бота:
+
+    unparsable      — файл не разбирается как JSON (или gzip)
+    damaged_lines   — оборванные или битые строки журналов колоды и ответов
+    duplicate_ids   — вопросы с одинаковым id в колоде
+    orphaned_stats  — статистика, карточки и текущий вопрос удаленных вопросов
+    bad_schedule    — расписание не проходит validate_schedule_time_consistency
+    bad_schedule_record — запись планировщика без chat_id или next_due
+    corrupt_copy    — отложенная ботом поврежденная копия файла
+    sqlite          — базы SQLite, не прошедшие PRAGMA quick_check
+    orphaned_rows   — строки question_stats базы SQLite без вопроса в qa_pairs
+
+Единица работы — каталог шарда users/ab/cd/ или пачка пользователей
+старой раскладки (user_, user_settings_, ... в корне каталога, те же
+проверки документов); они проверяются в пуле процессов, поэтому разбор
+JSON не упирается в GIL. С repair найденное
+исправляется на месте атомарной подменой файлов; чинить нужно при
+остановленном боте.
+"""
+
+import gzip
+import json
+import logging
+import os
+import sqlite3
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple, Any
+from utils.validators import Validators
+from .backends import JsonStorageBackend, KINDS, KIND_QA, KIND_SETTINGS, KIND_STATS, KIND_CURRENT, KIND_SCHEDULE, KIND_CARDS
+from .deck import OP_ADD, OP_DEL, OP_NEXT_ID, as_deck, compacted_ops, deck_from_list, empty_deck
+from .durability import fsync_path, write_temp
+from .review_log import replay
+
+PROFILE_PREFIX = "profile_"
+LEGACY_CHUNK = 500
+# Длинные префиксы раньше: user_settings_1.json — не колода пользователя settings_1
+LEGACY_PREFIXES = sorted(((kind, JsonStorageBackend.legacy_prefix(kind)) for kind in KINDS), key=lambda item: -len(item[1]))
+
+ORPHANED_ROWS = """
+    FROM question_stats WHERE NOT EXISTS (
+        SELECT 1 FROM qa_pairs
+        WHERE qa_pairs.user_id = question_stats.user_id
+          AND qa_pairs.qa_id = CAST(question_stats.question_id AS INTEGER)
+    )
+"""
+
+
+def legacy_kind(name: str) -> Optional[Tuple[str, str]]:
+    """(вид документа, user_id) для файла старой раскладки, иначе None"""
+    if not name.endswith(".json"):
+        return None
+    for kind, prefix in LEGACY_PREFIXES:
+        if name.startswith(prefix) and len(name) > len(prefix) + len(".json"):
+            return kind, name[len(prefix):-len(".json")]
+    return None
+
+
+@dataclass
+class Issue:
+    """Найденная проблема"""
+    path: str
+    kind: str
+    detail: str
+    repaired: bool = False
+
+
+@dataclass
+class FsckResult:
+    """Итог проверки"""
+    files: int = 0
+    bytes: int = 0
+    users: int = 0
+    elapsed: float = 0.0
+    issues: List[Issue] = field(default_factory=list)
+
+    @property
+    def files_per_second(self) -> float:
+        return self.files / self.elapsed if self.elapsed > 0 else 0.0
+
+    @property
+    def repaired(self) -> int:
+        return sum(1 for issue in self.issues if issue.repaired)
+
+    def counts(self) -> Dict[str, int]:
+        counts: Dict[str, int] = {}
+        for issue in self.issues:
+            counts[issue.kind] = counts.get(issue.kind, 0) + 1
+        return counts
+
+
+class _ShardChecker:
+    """Проверка одного каталога (выполняется в процессе пула)"""
+
+    def __init__(self, directory: Path, tmp_dir: Path, repair: bool, default_schedule: Optional[Dict[str, Any]]):
+        self.directory = directory
+        self.tmp_dir = tmp_dir
+        self.repair = repair
+        self.default_schedule = default_schedule
+        self.result = FsckResult()
+
+    def issue(self, path: Path, kind: str, detail: str, repaired: bool = False):
+        self.result.issues.append(Issue(str(path), kind, detail, repaired))
+
+    def count(self, path: Path):
+        self.result.files += 1
+        self.result.bytes += path.stat().st_size
+
+    # --- Запись при починке ---
+
+    def write(self, path: Path, text: str):
+        tmp_path = write_temp(path, text, self.tmp_dir)
+        fsync_path(tmp_path)
+        os.replace(tmp_path, path)
+        fsync_path(path.parent)
+
+    def quarantine(self, path: Path) -> bool:
+        if not self.repair:
+            return False
+        os.replace(path, path.with_name(f"{path.name}.corrupt-{datetime.now():%Y%m%d%H%M%S}"))
+        return True
+
+    # --- Файлы ---
+
+    def load_json(self, path: Path) -> Tuple[bool, Any]:
+        """(разобран ли файл, содержимое); неразобранный откладывается при repair"""
+        self.count(path)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                return True, json.load(f)
+        except ValueError as e:
+            self.issue(path, "unparsable", str(e), self.quarantine(path))
+            return False, None
+
+    def read_lines(self, path: Path, valid) -> Tuple[List[Any], int]:
+        """Строки журнала, прошедшие valid, и число отброшенных"""
+        self.count(path)
+        records, damaged = [], 0
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    damaged += 1
+                    continue
+                if valid(record):
+                    records.append(record)
+                else:
+                    damaged += 1
+        return records, damaged
+
+    @staticmethod
+    def valid_op(op: Any) -> bool:
+        if not isinstance(op, list) or not op:
+            return False
+        if op[0] == OP_ADD:
+            return len(op) == 2 and isinstance(op[1], dict) and isinstance(op[1].get("id"), int)
+        return op[0] in (OP_DEL, OP_NEXT_ID) and len(op) == 2 and isinstance(op[1], int)
+
+    @staticmethod
+    def valid_review(record: Any) -> bool:
+        return isinstance(record, list) and len(record) >= 2 and isinstance(record[0], int)
+
+    # --- Пользователь ---
+
+    def check_deck(self, path: Path) -> Optional[Dict[str, Any]]:
+        ops, damaged = self.read_lines(path, self.valid_op)
+        deck, duplicates = empty_deck(), 0
+        for op in ops:
+            if op[0] == OP_ADD and str(op[1]["id"]) in deck["items"]:
+                # Повторный add с живым id молча затер бы вопрос
+                duplicates += 1
+                op = [OP_ADD, dict(op[1], id=deck["next_id"])]
+            if op[0] == OP_ADD:
+                deck["items"][str(op[1]["id"])] = op[1]
+                deck["next_id"] = max(deck["next_id"], op[1]["id"] + 1)
+            elif op[0] == OP_DEL:
+                deck["items"].pop(str(op[1]), None)
+            else:
+                deck["next_id"] = max(deck["next_id"], op[1])
+
+        if damaged:
+            self.issue(path, "damaged_lines", f"{damaged} lines", self.repair)
+        if duplicates:
+            self.issue(path, "duplicate_ids", f"{duplicates} questions renumbered", self.repair)
+        if self.repair and (damaged or duplicates):
+            self.write(path, "".join(json.dumps(op, ensure_ascii=False) + "\n" for op in compacted_ops(deck)))
+        return deck
+
+    def check_reviews(self, user_id: str) -> List[List[Any]]:
+        """Проверяет журнал ответов и его архив, возвращает записи журнала"""
+        records = []
+        path = self.directory / f"reviews_{user_id}.jsonl"
+        if path.exists():
+            records, damaged = self.read_lines(path, self.valid_review)
+            if damaged:
+                self.issue(path, "damaged_lines", f"{damaged} lines", self.repair)
+                if self.repair:
+                    self.write(path, "".join(json.dumps(record, ensure_ascii=False) + "\n" for record in records))
+
+        archive = self.directory / f"reviews_{user_id}.archive.jsonl.gz"
+        if archive.exists():
+            self.count(archive)
+            try:
+                with gzip.open(archive, 'rt', encoding='utf-8') as f:
+                    for line in f:
+                        json.loads(line)
+            except (OSError, EOFError, ValueError) as e:
+                # Архив не чинится: записи в нем уже учтены снимком статистики
+                self.issue(archive, "unparsable", str(e))
+        return records
+
+    def check_docs(self, path: Path, docs: Dict[str, Any], deck: Optional[Dict[str, Any]],
+                   reviews: List[List[Any]]) -> bool:
+        """Логические проверки документов профиля; True — документы изменены"""
+        changed = False
+        if deck is None and KIND_QA in docs:
+            # Колода еще не переехала в журнал
+            qa_list = docs[KIND_QA]
+            deck = as_deck(qa_list)
+            if isinstance(qa_list, list):
+                ids = [qa.get("id") for qa in qa_list]
+                duplicates = len(ids) - len(set(ids))
+                if duplicates or any(not isinstance(qa_id, int) for qa_id in ids):
+                    self.issue(path, "duplicate_ids", f"{duplicates} repeated or missing ids", self.repair)
+                    if self.repair:
+                        docs[KIND_QA] = deck_from_list(qa_list)
+                        changed = True
+        live = set((deck or empty_deck())["items"])
+
+        # Статистика — снимок плюс еще не учтенные в нем записи журнала,
+        # как ее собирает хранилище; при починке журнал входит в снимок
+        stats = replay(docs[KIND_STATS], reviews) if docs.get(KIND_STATS) else {}
+        orphaned = [qa_id for qa_id in stats.get("question_stats", {}) if qa_id not in live]
+        cards = docs.get(KIND_CARDS) or {}
+        orphaned_cards = [qa_id for qa_id in cards if qa_id not in live]
+        current = docs.get(KIND_CURRENT)
+        orphaned_current = bool(current) and str(current.get("id")) not in live
+        if orphaned or orphaned_cards or orphaned_current:
+            detail = f"{len(orphaned)} stats, {len(orphaned_cards)} cards" + (", current question" if orphaned_current else "")
+            self.issue(path, "orphaned_stats", detail, self.repair)
+            if self.repair:
+                for qa_id in orphaned:
+                    del stats["question_stats"][qa_id]
+                if stats:
+                    docs[KIND_STATS] = stats
+                for qa_id in orphaned_cards:
+                    del cards[qa_id]
+                if orphaned_current:
+                    docs.pop(KIND_CURRENT)
+                changed = True
+
+        settings = docs.get(KIND_SETTINGS)
+        if settings and "schedule" in settings:
+            schedule = settings["schedule"]
+            try:
+                valid, error = Validators.validate_schedule_time_consistency(schedule)
+            except (AttributeError, TypeError, ValueError) as e:
+                valid, error = False, str(e)
+            if not valid:
+                repaired = self.repair and self.default_schedule is not None
+                self.issue(path, "bad_schedule", error, repaired)
+                if repaired:
+                    settings["schedule"] = dict(self.default_schedule)
+                    changed = True
+
+        record = docs.get(KIND_SCHEDULE)
+        if record is not None:
+            if (not isinstance(record, dict) or not record.get("chat_id")
+                    or not isinstance(record.get("next_due"), (int, float))):
+                # Без записи активная викторина просто запустится заново
+                self.issue(path, "bad_schedule_record", json.dumps(record, ensure_ascii=False)[:100], self.repair)
+                if self.repair:
+                    docs.pop(KIND_SCHEDULE)
+                    changed = True
+        return changed
+
+    def check_user(self, user_id: str):
+        self.result.users += 1
+        deck_path = self.directory / f"deck_{user_id}.jsonl"
+        deck = self.check_deck(deck_path) if deck_path.exists() else None
+        reviews = self.check_reviews(user_id)
+
+        path = self.directory / f"{PROFILE_PREFIX}{user_id}.json"
+        if not path.exists():
+            return
+        ok, profile = self.load_json(path)
+        if not ok:
+            return
+        if not isinstance(profile, dict) or not isinstance(profile.get("docs"), dict):
+            self.issue(path, "unparsable", "profile has no docs", self.quarantine(path))
+            return
+        if self.check_docs(path, profile["docs"], deck, reviews):
+            self.write(path, json.dumps(profile, ensure_ascii=False, indent=2))
+
+    # --- Каталоги ---
+
+    def check_shard(self) -> FsckResult:
+        user_ids = set()
+        for path in self.directory.iterdir():
+            name = path.name
+            if ".corrupt-" in name:
+                self.count(path)
+                self.issue(path, "corrupt_copy", "left aside by the bot")
+            elif name == JsonStorageBackend.PACK_NAME:
+                self.check_pack(path)
+            elif name.startswith(PROFILE_PREFIX) and name.endswith(".json"):
+                user_ids.add(name[len(PROFILE_PREFIX):-len(".json")])
+            elif name.startswith("deck_") and name.endswith(".jsonl"):
+                user_ids.add(name[len("deck_"):-len(".jsonl")])
+            elif name.startswith("reviews_") and name.endswith(".jsonl"):
+                user_ids.add(name[len("reviews_"):-len(".jsonl")])
+        for user_id in sorted(user_ids):
+            self.check_user(user_id)
+        return self.result
+
+    def check_pack(self, path: Path):
+        self.count(path)
+        try:
+            with gzip.open(path, 'rt', encoding='utf-8') as f:
+                for line in f:
+                    entry = json.loads(line)
+                    if not isinstance(entry.get("files"), dict) or "user_id" not in entry:
+                        raise ValueError("pack entry without user_id or files")
+        except (OSError, EOFError, ValueError) as e:
+            # В архиве единственная копия данных пользователей: только отчет
+            self.issue(path, "unparsable", str(e))
+
+    def check_files(self, paths: List[Path]) -> FsckResult:
+        """
+        Файлы старой раскладки: разбор, а затем те же проверки документов,
+        что у профиля, для документов каждого пользователя вместе
+        """
+        users: Dict[str, Dict[str, Path]] = {}
+        for path in paths:
+            if ".corrupt-" in path.name:
+                self.count(path)
+                self.issue(path, "corrupt_copy", "left aside by the bot")
+                continue
+            parsed = legacy_kind(path.name)
+            if parsed is None:
+                if path.exists():
+                    self.load_json(path)
+                continue
+            kind, user_id = parsed
+            users.setdefault(user_id, {})[kind] = path
+        for user_id in sorted(users):
+            self.check_legacy_user(user_id, users[user_id])
+        return self.result
+
+    def check_legacy_user(self, user_id: str, files: Dict[str, Path]):
+        docs = {}
+        for kind, path in files.items():
+            ok, data = self.load_json(path)
+            if ok and data is not None:
+                docs[kind] = data
+        data_dir = next(iter(files.values())).parent
+        if (JsonStorageBackend.shard_dir(data_dir, user_id) / f"{PROFILE_PREFIX}{user_id}.json").exists():
+            # После миграции бот старые файлы не читает
+            return
+        self.result.users += 1
+        # Журналы у пользователя появляются только вместе с профилем
+        path = files.get(KIND_SETTINGS) or next(iter(files.values()))
+        if not self.check_docs(path, docs, None, []):
+            return
+        for kind, path in files.items():
+            if kind in docs:
+                self.write(path, json.dumps(docs[kind], ensure_ascii=False, indent=2))
+            elif path.exists():
+                path.unlink()
+                fsync_path(path.parent)
+
+def _check_task(task: Tuple[str, Any, str, bool, Optional[Dict[str, Any]]]) -> FsckResult:
+    kind, target, tmp_dir, repair, default_schedule = task
+    try:
+        if kind == "shard":
+            checker = _ShardChecker(Path(target), Path(tmp_dir), repair, default_schedule)
+            return checker.check_shard()
+        checker = _ShardChecker(Path(tmp_dir), Path(tmp_dir), repair, default_schedule)
+        return checker.check_files([Path(path) for path in target])
+    except Exception as e:
+        result = FsckResult()
+        result.issues.append(Issue(str(target)[:200], "error", str(e)))
+        return result
+
+
+class DataChecker:
+    """Проверка (и починка) всего каталога данных в пуле процессов"""
+
+    def __init__(self, data_dir: Path, workers: Optional[int] = None, repair: bool = False,
+                 default_schedule: Optional[Dict[str, Any]] = None):
+        self.data_dir = Path(data_dir)
+        self.workers = workers or os.cpu_count() or 1
+        self.repair = repair
+        self.default_schedule = default_schedule
+        self.tmp_dir = self.data_dir / "tmp"
+        self.logger = logging.getLogger(__name__)
+
+    def _tasks(self) -> Iterator[Tuple[str, Any, str, bool, Optional[Dict[str, Any]]]]:
+        tmp_dir = str(self.tmp_dir)
+        for shard_dir in sorted((self.data_dir / "users").glob("*/*")):
+            if shard_dir.is_dir():
+                yield "shard", str(shard_dir), tmp_dir, self.repair, self.default_schedule
+
+        # Файлы одного пользователя попадают в одну пачку
+        groups: Dict[str, List[str]] = {}
+        for path in sorted(self.data_dir.glob("*.json*")):
+            if path.is_file():
+                parsed = legacy_kind(path.name)
+                groups.setdefault(parsed[1] if parsed else "", []).append(str(path))
+        batch: List[str] = []
+        for key in sorted(groups):
+            batch.extend(groups[key])
+            if len(batch) >= LEGACY_CHUNK:
+                yield "files", batch, tmp_dir, self.repair, self.default_schedule
+                batch = []
+        if batch:
+            yield "files", batch, tmp_dir, self.repair, self.default_schedule
+
+    def _check_sqlite(self, result: FsckResult):
+        for path in sorted(self.data_dir.glob("*.db")):
+            result.files += 1
+            result.bytes += path.stat().st_size
+            try:
+                mode = "rw" if self.repair else "ro"
+                conn = sqlite3.connect(f"file:{path}?mode={mode}", uri=True)
+                try:
+                    status = conn.execute("PRAGMA quick_check").fetchone()[0]
+                    if status == "ok":
+                        self._check_sqlite_rows(path, conn, result)
+                finally:
+                    conn.close()
+            except sqlite3.Error as e:
+                status = str(e)
+            if status != "ok":
+                result.issues.append(Issue(str(path), "sqlite", status))
+
+    def _check_sqlite_rows(self, path: Path, conn: sqlite3.Connection, result: FsckResult):
+        """Статистика удаленных вопросов в базе бэкенда sqlite"""
+        tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        if not {"question_stats", "qa_pairs"} <= tables:
+            return
+        orphaned = conn.execute("SELECT COUNT(*)" + ORPHANED_ROWS).fetchone()[0]
+        if not orphaned:
+            return
+        result.issues.append(Issue(str(path), "orphaned_rows", f"{orphaned} question_stats rows", self.repair))
+        if self.repair:
+            with conn:
+                conn.execute("DELETE" + ORPHANED_ROWS)
+
+    def run(self) -> FsckResult:
+        """Проверяет каталог данных (блокирующий вызов)"""
+        started = time.perf_counter()
+        self.tmp_dir.mkdir(parents=True, exist_ok=True)
+        result = FsckResult()
+        with ProcessPoolExecutor(max_workers=self.workers) as pool:
+            for part in pool.map(_check_task, self._tasks(), chunksize=16):
+                result.files += part.files
+                result.bytes += part.bytes
+                result.users += part.users
+                result.issues.extend(part.issues)
+        self._check_sqlite(result)
+        result.elapsed = time.perf_counter() - started
+
+        self.logger.info(
+            f"Checked {result.files} files of {result.users} users in {result.elapsed:.2f}s "
+            f"({result.files_per_second:.0f} files/s): {len(result.issues)} issues, {result.repaired} repaired"
+        )
+        return result
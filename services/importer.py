@@ -0,0 +1,221 @@
+# Copyright (c) 2025 Solovev Ivan, Usenko Evgeny, Alexandrov Arseniy
+
+"""
+Пакетный импорт вопросов из файла.
+
+Файл читается потоком, строка за строкой: каждая строка разбирается,
+проверяется теми же валидаторами, что и /add_qa, и попадает в пачку.
+Пачка из batch_size вопросов — одна запись в хранилище
+(Storage.add_user_qa_many). Повторы отсекаются по нормализованному
+тексту вопроса — внутри файла и относительно уже существующей колоды.
+
+Форматы:
+    csv   — "вопрос,ответ"; строка-заголовок question,answer пропускается
+    tsv   — то же через табуляцию
+    jsonl — {"question": ..., "answer": ...} или ["вопрос", "ответ"]
+    txt   — текстовый экспорт Anki: поля через табуляцию (или разделитель
+            из заголовка #separator:...), строки с # — заголовки
+"""
+
+import csv
+import json
+import logging
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, Any
+import aiohttp
+from utils.validators import Validators
+
+
+@dataclass
+class ImportResult:
+    """Итог импорта"""
+    rows: int = 0
+    added: int = 0
+    duplicates: int = 0
+    rejected: int = 0
+    batches: int = 0
+    elapsed: float = 0.0
+    errors: List[Tuple[int, str]] = field(default_factory=list)
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.rows / self.elapsed if self.elapsed > 0 else 0.0
+
+
+class DeckImporter:
+    """Потоковый импорт колоды пользователя"""
+
+    FORMATS = {".csv": "csv", ".tsv": "tsv", ".jsonl": "jsonl", ".txt": "txt"}
+    HEADERS = {("question", "answer"), ("вопрос", "ответ"), ("front", "back")}
+    ANKI_SEPARATORS = {
+        "tab": "\t", "comma": ",", "semicolon": ";", "space": " ", "pipe": "|", "colon": ":"
+    }
+    MAX_ERRORS = 20
+
+    def __init__(self, storage, batch_size: int = 200):
+        self.storage = storage
+        self.batch_size = max(1, batch_size)
+        self.logger = logging.getLogger(__name__)
+
+    @classmethod
+    def detect_format(cls, filename: str) -> Optional[str]:
+        return cls.FORMATS.get(Path(filename or "").suffix.lower())
+
+    # --- Разбор строк ---
+
+    def iter_rows(self, lines: Iterable[str], fmt: str) -> Iterator[Tuple[int, Optional[List[str]], Optional[str]]]:
+        """Выдает (номер строки, поля, ошибка разбора) по одной строке"""
+        if fmt in ("csv", "tsv"):
+            yield from self._iter_csv(lines, "," if fmt == "csv" else "\t")
+        elif fmt == "jsonl":
+            yield from self._iter_jsonl(lines)
+        elif fmt == "txt":
+            yield from self._iter_anki(lines)
+        else:
+            raise ValueError(f"Unknown import format: {fmt}")
+
+    def _iter_csv(self, lines: Iterable[str], delimiter: str):
+        reader = csv.reader(lines, delimiter=delimiter)
+        first = True
+        for row in reader:
+            if not any(cell.strip() for cell in row):
+                continue
+            if first and tuple(cell.strip().lower() for cell in row[:2]) in self.HEADERS:
+                first = False
+                continue
+            first = False
+            yield reader.line_num, row, None
+
+    def _iter_jsonl(self, lines: Iterable[str]):
+        for line_no, line in enumerate(lines, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                item = json.loads(line)
+            except ValueError:
+                yield line_no, None, "строка не является JSON"
+                continue
+            if isinstance(item, dict):
+                yield line_no, [item.get("question"), item.get("answer")], None
+            elif isinstance(item, list):
+                yield line_no, item, None
+            else:
+                yield line_no, None, "ожидается объект {question, answer} или список"
+
+    def _iter_anki(self, lines: Iterable[str]):
+        separator = "\t"
+        for line_no, line in enumerate(lines, 1):
+            line = line.rstrip("\r\n")
+            if line.startswith("#"):
+                key, _, value = line[1:].partition(":")
+                if key.strip().lower() == "separator":
+                    value = value.strip()
+                    separator = self.ANKI_SEPARATORS.get(value.lower(), value or separator)
+                continue
+            if not line.strip():
+                continue
+            yield line_no, line.split(separator), None
+
+    # --- Проверка ---
+
+    @staticmethod
+    def _normalize(question: str) -> str:
+        return " ".join(question.split()).casefold()
+
+    def _validate(self, fields: List[Any]) -> Tuple[Optional[Dict[str, str]], Optional[str]]:
+        if len(fields) < 2 or not isinstance(fields[0], str) or not isinstance(fields[1], str):
+            return None, "нужны два текстовых поля: вопрос и ответ"
+        question, answer = fields[0].strip(), fields[1].strip()
+        if "||" in question:
+            return None, "вопрос не может содержать '||'"
+
+        is_valid, error_msg, qa_data = Validators.validate_question_answer_format(f"{question} || {answer}")
+        if not is_valid:
+            return None, error_msg
+        return {
+            "question": Validators.sanitize_text(qa_data["question"], 500),
+            "answer": Validators.sanitize_text(qa_data["answer"], 200)
+        }, None
+
+    def _reject(self, result: ImportResult, line_no: int, error: str):
+        result.rejected += 1
+        if len(result.errors) < self.MAX_ERRORS:
+            result.errors.append((line_no, error))
+
+    # --- Импорт ---
+
+    def import_lines(self, user_id: str, lines: Iterable[str], fmt: str) -> ImportResult:
+        """Импортирует вопросы из итератора строк (блокирующий вызов)"""
+        started = time.perf_counter()
+        result = ImportResult()
+        seen = {self._normalize(qa["question"]) for qa in self.storage.get_user_qa(user_id)}
+        batch: List[Tuple[int, Dict[str, str]]] = []
+
+        for line_no, fields, error in self.iter_rows(lines, fmt):
+            result.rows += 1
+            pair = None
+            if error is None:
+                pair, error = self._validate(fields)
+            if error is not None:
+                self._reject(result, line_no, error)
+                continue
+
+            key = self._normalize(pair["question"])
+            if key in seen:
+                result.duplicates += 1
+                continue
+            seen.add(key)
+            batch.append((line_no, pair))
+            if len(batch) >= self.batch_size:
+                self._commit_batch(user_id, batch, result)
+
+        self._commit_batch(user_id, batch, result)
+        result.elapsed = time.perf_counter() - started
+        self.logger.info(
+            f"Imported {result.added} questions for {user_id}: {result.rows} rows, "
+            f"{result.duplicates} duplicates, {result.rejected} rejected, "
+            f"{result.rows_per_second:.0f} rows/s"
+        )
+        return result
+
+    def _commit_batch(self, user_id: str, batch: List[Tuple[int, Dict[str, str]]], result: ImportResult):
+        if not batch:
+            return
+        added = self.storage.add_user_qa_many(user_id, [pair for _, pair in batch])
+        if added:
+            result.added += len(added)
+            result.batches += 1
+        else:
+            for line_no, _ in batch:
+                self._reject(result, line_no, "ошибка записи в хранилище")
+        batch.clear()
+
+    def import_file(self, user_id: str, file_path: Path, fmt: Optional[str] = None) -> ImportResult:
+        """Импортирует вопросы из файла; формат по умолчанию — по расширению"""
+        fmt = fmt or self.detect_format(str(file_path))
+        if fmt is None:
+            raise ValueError(f"Cannot detect import format of {file_path}")
+        # utf-8-sig: CSV из Excel начинается с BOM
+        with open(file_path, "r", encoding="utf-8-sig", errors="replace", newline="") as f:
+            return self.import_lines(user_id, f, fmt)
+
+
+async def download_file(url: str, file_path: Path, max_bytes: int, chunk_size: int = 65536) -> Optional[int]:
+    """
+    Скачивает вложение потоком в файл. Возвращает число байт
+    или None, если файл больше max_bytes.
+    """
+    size = 0
+    async with aiohttp.ClientSession() as session:
+        async with session.get(url) as response:
+            response.raise_for_status()
+            with open(file_path, "wb") as f:
+                async for chunk in response.content.iter_chunked(chunk_size):
+                    size += len(chunk)
+                    if size > max_bytes:
+                        return None
+                    f.write(chunk)
+    return size
@@ -0,0 +1,56 @@
+# Copyright (c) 2025 Solovev Ivan, Usenko Evgeny, Alexandrov Arseniy
+
+import asyncio
+from contextlib import asynccontextmanager
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Callable, Dict, Optional, Any
+
+
+class UserIOExecutor:
+    """
+    Выделенный пул потоков для блокирующего I/O хранилища.
+
+    Операции одного пользователя выполняются строго в порядке вызова
+    (очередь на asyncio.Lock справедлива), операции разных пользователей
+    идут параллельно в пределах max_workers потоков.
+    """
+
+    def __init__(self, max_workers: int):
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="storage-io")
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self._pending: Dict[str, int] = {}
+
+    @asynccontextmanager
+    async def lock(self, user_id: str):
+        """Захватывает очередь пользователя, например на время UserSession"""
+        lock = self._locks.get(user_id)
+        if lock is None:
+            lock = self._locks[user_id] = asyncio.Lock()
+        self._pending[user_id] = self._pending.get(user_id, 0) + 1
+
+        try:
+            async with lock:
+                yield
+        finally:
+            self._pending[user_id] -= 1
+            if not self._pending[user_id]:
+                del self._pending[user_id]
+                del self._locks[user_id]
+
+    async def run(self, user_id: Optional[str], func: Callable, *args, **kwargs) -> Any:
+        """Выполняет func в пуле, сохраняя порядок операций пользователя"""
+        if user_id is None:
+            return await self.run_unlocked(func, *args, **kwargs)
+
+        async with self.lock(user_id):
+            return await self.run_unlocked(func, *args, **kwargs)
+
+    async def run_unlocked(self, func: Callable, *args, **kwargs) -> Any:
+        """Выполняет func в пуле без очереди пользователя (очередь уже захвачена)"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._pool, partial(func, *args, **kwargs))
+
+    def shutdown(self):
+        """Дожидается завершения операций и останавливает пул"""
+        self._pool.shutdown(wait=True)
@@ -0,0 +1,152 @@
+# Copyright (c) 2025 Solovev Ivan, Usenko Evgeny, Alexandrov Arseniy
+
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import List, Set, Tuple
+
+
+class LeaseStore:
+    """
+    Аренда пользователей планировщиком, когда несколько копий бота
+    (реплик) работают с одним каталогом данных.
+
+    Вопросы пользователю планирует только реплика, держащая его аренду.
+    Реплика продлевает свои аренды раз в ttl/3 (heartbeat); аренда,
+    не продленная ttl секунд, считается свободной и ее забирает другая
+    реплика. Живые реплики тоже отмечаются в базе, чтобы делить
+    пользователей поровну. shard — номер шарда при WORKER_PROCESSES:
+    реплики делят пользователей внутри своего шарда.
+
+    Ответ или правку колоды может принять любая реплика. Если
+    пользователя держит другая, изменение отмечается в changes, и
+    владелец на своем heartbeat сбрасывает очередь повторения
+    этого пользователя.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS leases (
+            user_id TEXT PRIMARY KEY,
+            owner TEXT NOT NULL,
+            expires REAL NOT NULL
+        ) WITHOUT ROWID;
+        CREATE INDEX IF NOT EXISTS leases_owner ON leases (owner);
+        CREATE TABLE IF NOT EXISTS replicas (
+            owner TEXT PRIMARY KEY,
+            shard INTEGER NOT NULL DEFAULT 0,
+            expires REAL NOT NULL
+        ) WITHOUT ROWID;
+        CREATE TABLE IF NOT EXISTS changes (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id TEXT NOT NULL,
+            changed REAL NOT NULL
+        );
+    """
+
+    def __init__(self, db_path: Path, owner: str, ttl: float, shard: int = 0):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.owner = owner
+        self.ttl = ttl
+        self.shard = shard
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False, isolation_level=None, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(self.SCHEMA)
+
+    def acquire(self, user_id: str) -> bool:
+        """Берет или продлевает аренду; False — пользователя держит другая живая реплика"""
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO leases (user_id, owner, expires) VALUES (?, ?, ?) "
+                "ON CONFLICT(user_id) DO UPDATE SET owner = excluded.owner, expires = excluded.expires "
+                "WHERE leases.owner = excluded.owner OR leases.expires < ?",
+                (user_id, self.owner, now + self.ttl, now)
+            )
+            row = self._conn.execute("SELECT owner FROM leases WHERE user_id = ?", (user_id,)).fetchone()
+        return row is not None and row[0] == self.owner
+
+    def release(self, user_id: str):
+        """Отдает аренду (только свою)"""
+        with self._lock:
+            self._conn.execute("DELETE FROM leases WHERE user_id = ? AND owner = ?", (user_id, self.owner))
+
+    def release_all(self):
+        """Отдает все аренды и снимает отметку реплики — при штатной остановке"""
+        with self._lock:
+            self._conn.execute("DELETE FROM leases WHERE owner = ?", (self.owner,))
+            self._conn.execute("DELETE FROM replicas WHERE owner = ?", (self.owner,))
+
+    def heartbeat(self) -> int:
+        """Продлевает свои аренды и отметку реплики; возвращает число живых реплик шарда"""
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute(
+                    "INSERT INTO replicas (owner, shard, expires) VALUES (?, ?, ?) "
+                    "ON CONFLICT(owner) DO UPDATE SET shard = excluded.shard, expires = excluded.expires",
+                    (self.owner, self.shard, now + self.ttl)
+                )
+                self._conn.execute(
+                    "UPDATE leases SET expires = ? WHERE owner = ? AND expires >= ?",
+                    (now + self.ttl, self.owner, now)
+                )
+                self._conn.execute("DELETE FROM replicas WHERE expires < ?", (now - self.ttl,))
+                # Владелец читает отметки каждые ttl/3: старше 2*ttl они никому не нужны
+                self._conn.execute("DELETE FROM changes WHERE changed < ?", (now - 2 * self.ttl,))
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM replicas WHERE shard = ? AND expires >= ?", (self.shard, now)
+            ).fetchone()[0]
+
+    def mark_changed(self, user_id: str):
+        """Отмечает изменение данных пользователя для реплики, держащей его аренду"""
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO changes (user_id, changed) VALUES (?, ?)", (user_id, time.time())
+            )
+
+    def changes_after(self, last_id: int) -> Tuple[Set[str], int]:
+        """Пользователи, измененные после отметки last_id, и номер последней отметки"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, user_id FROM changes WHERE id > ? ORDER BY id", (last_id,)
+            ).fetchall()
+        if not rows:
+            return set(), last_id
+        return {row[1] for row in rows}, rows[-1][0]
+
+    def owned(self) -> Set[str]:
+        """Пользователи, чьи действующие аренды держит эта реплика"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT user_id FROM leases WHERE owner = ? AND expires >= ?", (self.owner, time.time())
+            ).fetchall()
+        return {row[0] for row in rows}
+
+    def held_by_others(self) -> Set[str]:
+        """Пользователи с действующей арендой другой реплики"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT user_id FROM leases WHERE owner != ? AND expires >= ?", (self.owner, time.time())
+            ).fetchall()
+        return {row[0] for row in rows}
+
+    def replicas(self) -> List[str]:
+        """Живые реплики шарда"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT owner FROM replicas WHERE shard = ? AND expires >= ? ORDER BY owner",
+                (self.shard, time.time())
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,353 @@
+# Copyright (c) 2025 Solovev Ivan, Usenko Evgeny, Alexandrov Arseniy
+
+"""
+Общая очередь исходящих сообщений.
+
+Все отправки идут через Outbox.send: сообщение встает в очередь, а пул
+обработчиков отправляет его, соблюдая общий лимит Max API и лимит на
+чат (token bucket). Ответы на действия пользователя
+(PRIORITY_INTERACTIVE) уходят раньше вопросов по расписанию
+(PRIORITY_SCHEDULED), поэтому утренний всплеск викторин не задерживает
+ответы на команды.
+
+Токен чата резервируется заранее: сообщение, которому не хватило
+токена, откладывается до его появления и не занимает обработчик,
+а сообщения одного чата уходят в порядке постановки.
+
+Временные ошибки (сеть, 429, 5xx) повторяются с экспоненциальной
+паузой, не больше retries раз. Сообщение, не доставленное и после
+этого, попадает в DeadLetterStore, откуда его можно отправить снова.
+"""
+
+import asyncio
+import itertools
+import logging
+import random
+import time
+from typing import Any, Dict, List, Optional
+import aiohttp
+from maxapi.exceptions.max import MaxConnection
+from maxapi.types.errors import Error
+from .dead_letters import DeadLetterStore
+
+PRIORITY_INTERACTIVE = 0
+PRIORITY_SCHEDULED = 1
+
+LANES = {PRIORITY_INTERACTIVE: "interactive", PRIORITY_SCHEDULED: "scheduled"}
+
+KIND_MESSAGE = "message"
+KIND_QUESTION = "question"
+
+RETRY_DELAY_MAX = 60
+
+
+def is_delivered(result: Any) -> bool:
+    """Результат Bot.send_message (или Outbox.send) означает доставку"""
+    return result is not None and not isinstance(result, Error)
+
+
+def is_transient(failure: Any) -> bool:
+    """Ошибка, которую имеет смысл повторить: сеть, лимит запросов, сбой сервера"""
+    if isinstance(failure, Error):
+        return failure.code == 429 or failure.code >= 500
+    return isinstance(failure, (MaxConnection, aiohttp.ClientError, asyncio.TimeoutError, ConnectionError))
+
+
+def is_permanent(failure: Any) -> bool:
+    """Отказ, который не пройдет и позже: бот заблокирован или чат удален"""
+    return isinstance(failure, Error) and failure.code in (403, 404)
+
+
+def describe_failure(failure: Any) -> str:
+    if isinstance(failure, Error):
+        return f"HTTP {failure.code}: {failure.raw}"
+    return f"{failure.__class__.__name__}: {failure}"
+
+
+class TokenBucket:
+    """Ведро на rate токенов в секунду емкостью burst (rate <= 0 — без лимита)"""
+
+    __slots__ = ("rate", "burst", "tokens", "updated")
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = max(1.0, burst)
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self, now: Optional[float] = None) -> float:
+        """Забирает токен (в долг, если их нет) и возвращает, сколько ждать его появления"""
+        if self.rate <= 0:
+            return 0.0
+        self._refill(time.monotonic() if now is None else now)
+        self.tokens -= 1
+        return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    def is_full(self, now: float) -> bool:
+        return self.rate <= 0 or self.tokens + (now - self.updated) * self.rate >= self.burst
+
+
+class _Outgoing:
+    """Сообщение в очереди"""
+
+    __slots__ = ("priority", "seq", "chat_id", "user_id", "kwargs", "future", "enqueued", "reserved",
+                 "attempts", "kind", "payload", "dead_letter")
+
+    def __init__(self, priority: int, seq: int, chat_id, user_id, kwargs: Dict[str, Any], future: asyncio.Future):
+        self.priority = priority
+        self.seq = seq
+        self.chat_id = chat_id
+        self.user_id = user_id
+        self.kwargs = kwargs
+        self.future = future
+        self.enqueued = time.monotonic()
+        self.reserved = False
+        self.attempts = 0
+        self.kind = KIND_MESSAGE
+        self.payload: Optional[Dict[str, Any]] = None
+        self.dead_letter = True
+
+    def __lt__(self, other: "_Outgoing") -> bool:
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+
+class _LaneStats:
+    __slots__ = ("queued", "sent", "failed", "wait_total", "wait_max")
+
+    def __init__(self):
+        self.queued = 0
+        self.sent = 0
+        self.failed = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+
+class Outbox:
+    """Очередь исходящих сообщений с лимитами и приоритетами"""
+
+    CHAT_BUCKETS_PRUNE = 10000
+
+    def __init__(self, bot, workers: int = 4, rate: float = 25, burst: float = 25,
+                 chat_rate: float = 1, chat_burst: float = 5, retries: int = 3, retry_delay: float = 1,
+                 dead_letters: Optional[DeadLetterStore] = None):
+        self.bot = bot
+        self.workers = max(1, workers)
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.retries = max(0, retries)
+        self.retry_delay = retry_delay
+        self.dead_letters = dead_letters
+        self.logger = logging.getLogger(__name__)
+
+        self._queue: asyncio.PriorityQueue = asyncio.PriorityQueue()
+        self._seq = itertools.count()
+        self._global = TokenBucket(rate, burst)
+        self._chats: Dict[Any, TokenBucket] = {}
+        self._tasks: List[asyncio.Task] = []
+
+        self._lanes = {priority: _LaneStats() for priority in LANES}
+        self.deferred = 0
+        self.throttled_global = 0
+        self.throttled_chat = 0
+        self.retried = 0
+        self.dead_lettered = 0
+
+    # --- Жизненный цикл ---
+
+    def start(self):
+        """Запускает пул обработчиков (внутри работающего цикла событий)"""
+        for _ in range(self.workers):
+            self._tasks.append(asyncio.create_task(self._worker()))
+
+    async def stop(self, timeout: float = 5):
+        """Дожидается отправки очереди (не дольше timeout) и останавливает обработчики"""
+        deadline = time.monotonic() + timeout
+        while self.depth and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks.clear()
+        if self.depth:
+            self.logger.warning(f"Outbox stopped with {self.depth} unsent messages")
+
+    @property
+    def depth(self) -> int:
+        """Сообщений в очереди, включая отложенные лимитом чата"""
+        return sum(lane.queued for lane in self._lanes.values())
+
+    # --- Отправка ---
+
+    async def send(self, chat_id=None, user_id=None, priority: int = PRIORITY_INTERACTIVE,
+                   kind: str = KIND_MESSAGE, payload: Optional[Dict[str, Any]] = None,
+                   dead_letter: bool = True, **kwargs):
+        """
+        Ставит сообщение в очередь и ждет отправки. Аргументы — как у
+        Bot.send_message; результат и исключения — тоже его, после
+        последней попытки. kind и payload сохраняются вместе с
+        недоставленным сообщением (dead_letter=False — не сохранять).
+        """
+        if not self._tasks:
+            # Очередь не запущена (скрипты, остановка бота) — отправка напрямую
+            return await self.bot.send_message(chat_id=chat_id, user_id=user_id, **kwargs)
+        return await self._enqueue(chat_id, user_id, priority, kind, payload, dead_letter, kwargs)
+
+    def post(self, chat_id=None, user_id=None, priority: int = PRIORITY_INTERACTIVE, **kwargs) -> asyncio.Future:
+        """
+        Ставит сообщение в очередь, не дожидаясь отправки (ответы из
+        обработчиков апдейтов). Недоставленное сообщение логируется и
+        попадает в DeadLetterStore, как при send; возвращается future
+        с результатом для тех, кому он все же нужен.
+        """
+        if self._tasks:
+            future = self._enqueue(chat_id, user_id, priority, KIND_MESSAGE, None, True, kwargs)
+        else:
+            future = asyncio.ensure_future(self.bot.send_message(chat_id=chat_id, user_id=user_id, **kwargs))
+        future.add_done_callback(self._posted)
+        return future
+
+    def _posted(self, future: asyncio.Future):
+        # Ошибку из очереди уже записал _deliver, здесь ее только забирают
+        if future.cancelled() or future.exception() is None:
+            return
+        if not self._tasks:
+            self.logger.error(f"Send failed: {describe_failure(future.exception())}")
+
+    def _enqueue(self, chat_id, user_id, priority: int, kind: str, payload: Optional[Dict[str, Any]],
+                 dead_letter: bool, kwargs: Dict[str, Any]) -> asyncio.Future:
+        future = asyncio.get_running_loop().create_future()
+        item = _Outgoing(priority, next(self._seq), chat_id, user_id, kwargs, future)
+        item.kind = kind
+        item.payload = payload
+        item.dead_letter = dead_letter
+        self._lanes[priority].queued += 1
+        self._queue.put_nowait(item)
+        return future
+
+    def _chat_bucket(self, key) -> TokenBucket:
+        bucket = self._chats.get(key)
+        if bucket is None:
+            if len(self._chats) >= self.CHAT_BUCKETS_PRUNE:
+                # Полное ведро ничем не отличается от нового
+                now = time.monotonic()
+                self._chats = {k: b for k, b in self._chats.items() if not b.is_full(now)}
+            bucket = self._chats[key] = TokenBucket(self.chat_rate, self.chat_burst)
+        return bucket
+
+    def _requeue(self, item: _Outgoing):
+        self.deferred -= 1
+        self._queue.put_nowait(item)
+
+    async def _worker(self):
+        while True:
+            item = await self._queue.get()
+            try:
+                if item.future.cancelled():
+                    # Отправитель больше не ждет
+                    self._lanes[item.priority].queued -= 1
+                    continue
+
+                if not item.reserved:
+                    item.reserved = True
+                    delay = self._chat_bucket(item.chat_id or item.user_id).reserve()
+                    if delay > 0:
+                        self.throttled_chat += 1
+                        self.deferred += 1
+                        asyncio.get_running_loop().call_later(delay, self._requeue, item)
+                        continue
+
+                delay = self._global.reserve()
+                if delay > 0:
+                    self.throttled_global += 1
+                    await asyncio.sleep(delay)
+                await self._deliver(item)
+            except Exception as e:
+                self.logger.error(f"Outbox worker error: {e}")
+            finally:
+                self._queue.task_done()
+
+    async def _deliver(self, item: _Outgoing):
+        lane = self._lanes[item.priority]
+        if item.attempts == 0:
+            waited = time.monotonic() - item.enqueued
+            lane.wait_total += waited
+            lane.wait_max = max(lane.wait_max, waited)
+        item.attempts += 1
+        try:
+            result = await self.bot.send_message(chat_id=item.chat_id, user_id=item.user_id, **item.kwargs)
+            failure = None if is_delivered(result) else result
+        except Exception as e:
+            result, failure = None, e
+
+        if failure is not None and is_transient(failure) and item.attempts <= self.retries:
+            # Повтор с экспоненциальной паузой; токены резервируются заново
+            delay = min(RETRY_DELAY_MAX, self.retry_delay * 2 ** (item.attempts - 1)) * random.uniform(0.8, 1.2)
+            self.retried += 1
+            self.deferred += 1
+            item.reserved = False
+            self.logger.warning(
+                f"Send to {item.chat_id or item.user_id} failed ({describe_failure(failure)}), "
+                f"retry {item.attempts}/{self.retries} in {delay:.1f}s"
+            )
+            asyncio.get_running_loop().call_later(delay, self._requeue, item)
+            return
+
+        lane.queued -= 1
+        if failure is None:
+            lane.sent += 1
+        else:
+            lane.failed += 1
+            self.logger.error(
+                f"Send to {item.chat_id or item.user_id} failed after {item.attempts} attempts: "
+                f"{describe_failure(failure)}"
+            )
+            if item.dead_letter and self.dead_letters is not None:
+                await self._store_dead_letter(item, failure)
+
+        if item.future.done():
+            return
+        if isinstance(failure, BaseException):
+            item.future.set_exception(failure)
+        else:
+            item.future.set_result(result)
+
+    async def _store_dead_letter(self, item: _Outgoing, failure: Any):
+        try:
+            await asyncio.to_thread(
+                self.dead_letters.add, item.chat_id, item.user_id, item.kind, item.kwargs.get("text"),
+                item.payload, describe_failure(failure), item.attempts
+            )
+            self.dead_lettered += 1
+        except Exception as e:
+            self.logger.error(f"Failed to store dead letter for {item.chat_id or item.user_id}: {e}")
+
+    # --- Метрики ---
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Глубина очереди, ожидание и срабатывания лимитов"""
+        lanes = {}
+        for priority, name in LANES.items():
+            lane = self._lanes[priority]
+            done = lane.sent + lane.failed
+            lanes[name] = {
+                "queued": lane.queued,
+                "sent": lane.sent,
+                "failed": lane.failed,
+                "avg_wait": lane.wait_total / done if done else 0.0,
+                "max_wait": lane.wait_max
+            }
+        return {
+            "depth": self.depth,
+            "deferred": self.deferred,
+            "workers": self.workers,
+            "throttled_global": self.throttled_global,
+            "throttled_chat": self.throttled_chat,
+            "retried": self.retried,
+            "dead_lettered": self.dead_lettered,
+            "chat_buckets": len(self._chats),
+            "lanes": lanes
+        }
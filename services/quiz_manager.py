@@ -1,74 +1,420 @@
 # Copyright (c) 2025 Solovev Ivan, Usenko Evgeny, Alexandrov Arseniy
 
 import asyncio
+import heapq
+import itertools
 import logging
+import math
+import os
 import random
+import socket
+import time
 from datetime import datetime
-from typing import Dict, Optional, List
+from typing import Awaitable, Callable, Dict, Optional, List, Tuple
 from maxapi import Bot
 from core.config import config
+from .weights import question_weights, choose_weighted
+from .schedule import DAYS, compile_schedule, user_offset
+from .repetition import RepetitionEngine
+from .outbox import (
+    Outbox, TokenBucket, PRIORITY_SCHEDULED, KIND_QUESTION, is_delivered, is_permanent, describe_failure
+)
+from .dead_letters import DeadLetterStore
+from .leases import LeaseStore
+from .sharding import shard_of
+
+class QuizScheduler:
+    """
+    Единый планировщик викторины для всех пользователей.
+
+    Хранит min-кучу записей (время срабатывания, user_id); отмена ленивая —
+    устаревшие записи пропускаются при извлечении. Сработавшие записи
+    раздаются ограниченному пулу обработчиков через ограниченную очередь,
+    но не быстрее max_qps в секунду (0 — без ограничения): если срабатываний
+    накопилось больше, они выполняются с запаздыванием, ровным потоком.
+    """
+
+    def __init__(self, handler: Callable[[str], Awaitable], workers: int, max_qps: float = 0):
+        self.handler = handler
+        self.workers = workers
+        self.logger = logging.getLogger(__name__)
+        self._budget = TokenBucket(max_qps, max_qps)
+        self.admitted = 0
+        self.throttled = 0
+        self.lag_max = 0.0
+
+        self._heap: List[Tuple[float, int, str]] = []
+        self._entries: Dict[str, Tuple[float, int]] = {}
+        self._counter = itertools.count()
+        self._wakeup = asyncio.Event()
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=workers * 4)
+        self._tasks: List[asyncio.Task] = []
+
+    def __contains__(self, user_id: str) -> bool:
+        return user_id in self._entries
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def schedule(self, user_id: str, fire_at: float):
+        """Планирует срабатывание для пользователя (заменяет прежнее)"""
+        entry = (fire_at, next(self._counter))
+        self._entries[user_id] = entry
+        heapq.heappush(self._heap, (*entry, user_id))
+        if self._heap[0][2] == user_id:
+            self._wakeup.set()
+
+    def cancel(self, user_id: str):
+        """Отменяет запланированное срабатывание"""
+        if self._entries.pop(user_id, None) is not None and len(self._heap) > 2 * len(self._entries) + 64:
+            self._compact()
+
+    def next_fire_time(self, user_id: str) -> Optional[float]:
+        entry = self._entries.get(user_id)
+        return entry[0] if entry else None
+
+    def _compact(self):
+        self._heap = [(fire_at, seq, user_id) for user_id, (fire_at, seq) in self._entries.items()]
+        heapq.heapify(self._heap)
+
+    def _is_live(self, item: Tuple[float, int, str]) -> bool:
+        fire_at, seq, user_id = item
+        return self._entries.get(user_id) == (fire_at, seq)
+
+    async def _run(self):
+        reserved = False
+        while True:
+            while self._heap and not self._is_live(self._heap[0]):
+                heapq.heappop(self._heap)
+
+            timeout = None
+            if self._heap:
+                timeout = self._heap[0][0] - time.time()
+                if timeout <= 0:
+                    if not reserved:
+                        # Токен бюджета берется один раз; за время ожидания
+                        # вершина кучи может смениться — он достанется ей
+                        reserved = True
+                        wait = self._budget.reserve()
+                        if wait > 0:
+                            self.throttled += 1
+                            await asyncio.sleep(wait)
+                            continue
+                    reserved = False
+                    fire_at, _, user_id = heapq.heappop(self._heap)
+                    del self._entries[user_id]
+                    self.admitted += 1
+                    self.lag_max = max(self.lag_max, time.time() - fire_at)
+                    await self._queue.put(user_id)
+                    continue
+
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _worker(self):
+        while True:
+            user_id = await self._queue.get()
+            try:
+                await self.handler(user_id)
+            except Exception as e:
+                self.logger.error(f"Scheduler handler failed for {user_id}: {e}")
+            finally:
+                self._queue.task_done()
+
+    def start(self):
+        """Запускает цикл планировщика и пул обработчиков"""
+        self._tasks.append(asyncio.create_task(self._run()))
+        for _ in range(self.workers):
+            self._tasks.append(asyncio.create_task(self._worker()))
+
+    async def stop(self):
+        """Останавливает планировщик"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks.clear()
+
+    def get_stats(self) -> Dict[str, float]:
+        """Запланировано, выпущено, сколько раз сработал бюджет и наибольшее запаздывание"""
+        now = time.time()
+        return {
+            "scheduled": len(self._entries),
+            "overdue": sum(1 for fire_at, _ in self._entries.values() if fire_at <= now),
+            "admitted": self.admitted,
+            "throttled": self.throttled,
+            "max_qps": self._budget.rate,
+            "lag_max": self.lag_max
+        }
+
 
 class QuizManager:
     """Сервис управления викториной"""
     
-    def __init__(self, bot: Bot, storage):
+    RETRY_DELAY = 300
+    IDLE_DELAY = 86400
+
+    def __init__(self, bot: Bot, storage, outbox: Optional[Outbox] = None, shard: Tuple[int, int] = (0, 1)):
         self.bot = bot
         self.storage = storage
-        self.active_users = set()
+        # (номер, всего): в режиме WORKER_PROCESSES процесс ведет только своих пользователей
+        self.shard = shard
+        index, shards = shard
+        letters_file = "dead_letters.db" if shards == 1 else f"dead_letters.{index}.db"
+        self.dead_letters = DeadLetterStore(config.database.data_dir / letters_file)
+        self.leases: Optional[LeaseStore] = None
+        if config.quiz.lease_ttl > 0:
+            replica = config.quiz.replica_id or f"{socket.gethostname()}-{os.getpid()}"
+            self.leases = LeaseStore(
+                config.database.data_dir / "leases.db",
+                owner=replica if shards == 1 else f"{replica}/{index}",
+                ttl=config.quiz.lease_ttl,
+                shard=index
+            )
+        # Общие лимиты Max API и бюджет планировщика делятся между процессами
+        self.outbox = outbox or Outbox(
+            bot,
+            workers=config.outbox.workers,
+            rate=config.outbox.rate / shards,
+            burst=max(1.0, config.outbox.burst / shards),
+            chat_rate=config.outbox.chat_rate,
+            chat_burst=config.outbox.chat_burst,
+            retries=config.outbox.retries,
+            retry_delay=config.outbox.retry_delay,
+            dead_letters=self.dead_letters
+        )
+        self.active_users: Dict[str, str] = {}
+        self.scheduler = QuizScheduler(
+            self._on_timer,
+            workers=config.quiz.dispatch_workers,
+            max_qps=config.quiz.max_qps / shards
+        )
+        self._restore_task: Optional[asyncio.Task] = None
+        self._lease_task: Optional[asyncio.Task] = None
+        self.repetition = RepetitionEngine(
+            max_users=config.quiz.due_queue_users,
+            ask_cooldown=config.quiz.ask_cooldown
+        )
+        # Последняя прочитанная отметка изменений других реплик (LeaseStore.changes)
+        self._changes_seen = 0
         self.logger = logging.getLogger(__name__)
 
-    async def smart_quiz_scheduler(self, user_id: str, chat_id: str):
-        """Умный планировщик вопросов с адаптивным алгоритмом"""
+    def start(self):
+        """Запускает очередь отправки, общий планировщик и восстановление активных викторин"""
+        self.outbox.start()
+        self.scheduler.start()
+        if self.leases:
+            # Викторины поднимает цикл аренды: он же делит пользователей между репликами
+            self._lease_task = asyncio.create_task(self._lease_loop())
+        else:
+            self._restore_task = asyncio.create_task(self.restore_active_users())
+
+    async def stop(self):
+        """Останавливает общий планировщик вопросов и досылает очередь отправки"""
+        if self._restore_task:
+            self._restore_task.cancel()
+        if self._lease_task:
+            self._lease_task.cancel()
+        await self.scheduler.stop()
+        await self.outbox.stop()
+        self.dead_letters.close()
+        if self.leases:
+            # Штатная остановка: другие реплики забирают пользователей сразу, не дожидаясь ttl
+            await asyncio.to_thread(self.leases.release_all)
+            self.leases.close()
+
+    def owns(self, user_id: str) -> bool:
+        """Пользователь относится к шарду этого процесса"""
+        index, shards = self.shard
+        return shards == 1 or shard_of(user_id, shards) == index
+
+    async def start_quiz_for_user(self, user_id: str, chat_id: str):
+        """Ставит пользователя в общий планировщик"""
         if user_id in self.active_users:
             return
+        if self.leases and not await asyncio.to_thread(self.leases.acquire, user_id):
+            self.logger.info(f"User {user_id} is scheduled by another replica")
+            return
 
-        self.active_users.add(user_id)
+        self.active_users[user_id] = chat_id
+        async with self.storage.asession(user_id) as session:
+            settings = session.get_user_settings(user_id)
+            delay = self._calculate_next_delay(session, settings)
+            self._schedule(session, time.time() + delay)
         self.logger.info(f"Smart quiz started for user {user_id}")
-        
-        while user_id in self.active_users:
-            settings = self.storage.get_user_settings(user_id)
-            
-            if not self._can_send_question_now(user_id, settings):
-                await asyncio.sleep(300)  
-                continue
-            
-            interval = await self._calculate_next_interval(user_id, settings)
-            await asyncio.sleep(interval)
-            
-            if user_id not in self.active_users:
-                break
-                
-            if self._can_send_question_now(user_id, settings):
-                await self._send_smart_question(user_id, chat_id)
-        
-        self.logger.warning(f"Запущен smart_quiz_scheduler для {user_id}, task_id={id(asyncio.current_task())}")
 
+    def _schedule(self, session, fire_at: float):
+        """Планирует срабатывание и сохраняет его в сессии пользователя"""
+        user_id = session.user_id
+        self.scheduler.schedule(user_id, fire_at)
+        session.save_schedule(user_id, self.active_users[user_id], fire_at)
+
+    async def restore_active_users(self):
+        """
+        Восстанавливает активные викторины после перезапуска.
+
+        Пользователи поднимаются пачками с паузой между ними, а просроченные
+        срабатывания равномерно размазываются по окну restore_spread секунд.
+        """
+        user_ids = [user_id for user_id in await self.storage.aget_active_user_ids() if self.owns(user_id)]
+        batch_size = config.quiz.restore_batch_size
+        restored = 0
+
+        for start in range(0, len(user_ids), batch_size):
+            batch = user_ids[start:start + batch_size]
+            results = await asyncio.gather(*(self._restore_user(user_id) for user_id in batch))
+            restored += sum(results)
+            if start + batch_size < len(user_ids):
+                await asyncio.sleep(config.quiz.restore_batch_delay)
+
+        self.logger.info(f"Restored {restored} active quizzes")
+        return restored
+
+    async def _restore_user(self, user_id: str) -> bool:
+        if user_id in self.active_users:
+            return False
+
+        async with self.storage.asession(user_id) as session:
+            settings = session.get_user_settings(user_id)
+            record = session.get_schedule(user_id)
+        if not settings["active"]:
+            return False
+
+        if not record or not record.get("chat_id"):
+            self.logger.warning(f"Active user {user_id} has no schedule record, skipping restore")
+            return False
+        if self.leases and not await asyncio.to_thread(self.leases.acquire, user_id):
+            return False
+
+        now = time.time()
+        fire_at = record.get("next_due") or now
+        if fire_at < now:
+            fire_at = now + user_offset(user_id, config.quiz.restore_spread)
+
+        self.active_users[user_id] = record["chat_id"]
+        self.scheduler.schedule(user_id, fire_at)
+        return True
+
+    async def _on_timer(self, user_id: str):
+        """
+        Срабатывание планировщика: отправка вопроса и планирование следующего.
+
+        Очередь пользователя держится только на время коротких сессий до и
+        после отправки: сама отправка (очередь Outbox, лимиты, повторы)
+        идет без нее и не задерживает обработку сообщений пользователя.
+        """
+        chat_id = self.active_users.get(user_id)
+        if chat_id is None:
+            return
+        if not await self._renew_lease(user_id):
+            # Аренду забрала другая реплика (эта не продлила ее вовремя)
+            return
+
+        try:
+            async with self.storage.asession(user_id) as session:
+                settings = session.get_user_settings(user_id)
+                if not settings["active"]:
+                    # Викторину остановили в другой реплике
+                    self._forget_user(user_id)
+                    if self.leases:
+                        await asyncio.to_thread(self.leases.release, user_id)
+                    return
+                if not self._can_send_question_now(user_id, settings):
+                    self._schedule(session, time.time() + self._calculate_next_delay(session, settings))
+                    return
+                qa_list = session.get_user_qa(user_id)
+                qa = self._pick_question(session, qa_list) if qa_list else None
+                asked = session.get_current_question(user_id)
+
+            permanent = False
+            if not qa_list:
+                await self._handle_empty_questions(user_id, chat_id)
+            elif qa:
+                failure, permanent = await self._send_question(user_id, chat_id, qa)
+                if failure:
+                    self.repetition.release(user_id, qa.get('id'))
+                    self.logger.error(f"Error sending question to {user_id}: {failure}")
+                    qa = None
+
+            async with self.storage.asession(user_id) as session:
+                if not await self._renew_lease(user_id):
+                    # Пока шла отправка, пользователя забрала другая реплика:
+                    # записывать вопрос и планировать следующий будет она
+                    if qa:
+                        self.logger.warning(f"Question for {user_id} sent, but the lease was lost meanwhile; not recorded")
+                    return
+                if permanent and self.active_users.get(user_id) == chat_id:
+                    # Бот заблокирован или чат удален: вопросы по расписанию
+                    # только копили бы недоставленные сообщения
+                    self._stop_undeliverable(session)
+                if qa:
+                    if self._can_commit_question(session, chat_id, qa, asked):
+                        self._commit_question_sent(session, qa)
+                        self.logger.info(f"Sent smart question to {user_id}: {qa['question']}")
+                    else:
+                        self.logger.warning(f"Question for {user_id} sent, but the quiz changed meanwhile; not recorded")
+                if user_id in self.active_users:
+                    settings = session.get_user_settings(user_id)
+                    delay = self._calculate_next_delay(session, settings)
+                    if not qa_list:
+                        delay += config.quiz.empty_qa_interval
+                    self._schedule(session, time.time() + delay)
+            if permanent and self.leases and user_id not in self.active_users:
+                await asyncio.to_thread(self.leases.release, user_id)
+        except Exception:
+            # Состояние сессии отброшено — повторяем попытку позже
+            if user_id in self.active_users:
+                async with self.storage.asession(user_id) as session:
+                    self._schedule(session, time.time() + self.RETRY_DELAY)
+            raise
+
+    def _calculate_next_delay(self, session, settings: Dict) -> float:
+        """
+        Через сколько секунд снова проверить пользователя.
+
+        К открытию окна добавляется постоянный сдвиг пользователя (до
+        open_spread секунд, но не больше половины окна), чтобы окна,
+        открывающиеся у всех в 09:00, не давали всплеска отправок.
+        """
+        now = datetime.now()
+        schedule = compile_schedule(settings["schedule"])
+
+        if settings["questions_today"] >= settings["daily_goal"]:
+            next_open = schedule.next_open_after_today(now)
+        elif not schedule.is_open(now):
+            next_open = schedule.next_open(now)
+        else:
+            return self._calculate_next_interval(session, settings)
+
+        if next_open is None:
+            return self.IDLE_DELAY
+        spread = min(config.quiz.open_spread, schedule.open_until(next_open) / 2)
+        return max(1.0, (next_open - now).total_seconds() + user_offset(session.user_id, spread))
+
+    async def refresh_user(self, user_id: str):
+        """Пересчитывает срабатывание после изменения настроек пользователя"""
+        if user_id not in self.active_users:
+            return
+        async with self.storage.asession(user_id) as session:
+            settings = session.get_user_settings(user_id)
+            delay = self._calculate_next_delay(session, settings)
+            self._schedule(session, time.time() + delay)
 
     def _can_send_question_now(self, user_id: str, settings: Dict) -> bool:
         """Проверяет, можно ли отправить вопрос сейчас"""
-        now = datetime.now()
-        
         if settings["questions_today"] >= settings["daily_goal"]:
             return False
         
-        weekday = now.strftime("%A").lower()
-        day_schedule = settings["schedule"][weekday]
-        
-        if not day_schedule["enabled"]:
-            return False
-        
-        current_time = now.time()
-        start_time = datetime.strptime(day_schedule["start"], "%H:%M").time()
-        end_time = datetime.strptime(day_schedule["end"], "%H:%M").time()
-        
-        return start_time <= current_time <= end_time
+        return compile_schedule(settings["schedule"]).is_open(datetime.now())
 
-    async def _calculate_next_interval(self, user_id: str, settings: Dict) -> int:
+    def _calculate_next_interval(self, session, settings: Dict) -> int:
         """Рассчитывает интервал до следующего вопроса на основе алгоритма"""
         base_min = settings["min_interval"] * 60
         base_max = settings["max_interval"] * 60
         
-        stats = self.storage.get_user_stats(user_id)
+        stats = session.get_user_stats(session.user_id)
         
         if stats["total_questions_answered"] == 0:
             return random.randint(base_min // 2, base_max // 2)
@@ -87,127 +433,139 @@ class QuizManager:
         
         return random.randint(adjusted_min, adjusted_max)
 
-    async def _send_smart_question(self, user_id: str, chat_id: str):
-        """Отправляет умно выбранный вопрос и обновляет статистику"""
-        qa_list = self.storage.get_user_qa(user_id)
-        if not qa_list:
-            await self._handle_empty_questions(user_id, chat_id)
-            return
-        
-        qa = self._select_question_by_algorithm(user_id, qa_list)
+    def _pick_question(self, session, qa_list: List[Dict]) -> Optional[Dict]:
+        """Выбирает вопрос: сначала карточку к повторению, иначе по весам статистики"""
+        qa = self.repetition.pick_due(session, qa_list)
         if not qa:
-            return
-        
-        question_id = qa.get('id')
-        if question_id:
-            self.storage.update_question_last_reviewed(user_id, question_id)
-        
-        self.storage.save_current_question(user_id, qa)
-        
+            stats = session.get_user_stats(session.user_id)
+            qa = self._select_question_by_algorithm(qa_list, stats)
+        return qa
+
+    async def _send_question(self, user_id: str, chat_id: str, qa: Dict) -> Tuple[Optional[str], bool]:
+        """
+        Отправляет вопрос (вне сессии пользователя). Возвращает описание
+        ошибки (None — доставлен) и признак постоянного отказа.
+        """
         try:
-            await self.bot.send_message(
-                chat_id=chat_id, 
-                text=f"❓ Вопрос: {qa['question']}"
+            result = await self.outbox.send(
+                chat_id=chat_id,
+                text=f"❓ Вопрос: {qa['question']}",
+                priority=PRIORITY_SCHEDULED,
+                kind=KIND_QUESTION,
+                payload={"user_id": user_id, "qa": qa}
             )
-            
-            settings = self.storage.get_user_settings(user_id)
-            new_questions_today = settings.get("questions_today", 0) + 1
+        except Exception as e:
+            return describe_failure(e), is_permanent(e)
+        if is_delivered(result):
+            return None, False
+        return describe_failure(result), is_permanent(result)
 
-            self.storage.update_user_settings(
-                user_id,
-                questions_today=new_questions_today,
-                last_question_date=datetime.now().isoformat()
-            )
+    def _can_commit_question(self, session, chat_id: str, qa: Dict, asked: Optional[Dict]) -> bool:
+        """
+        Можно ли записать отправленный вопрос: пока он отправлялся, викторину
+        могли остановить, вопрос — удалить, а текущим — сделать другой вопрос.
+        """
+        user_id = session.user_id
+        if self.active_users.get(user_id) != chat_id or not session.get_user_settings(user_id)["active"]:
+            return False
+        if session.get_user_qa_by_id(user_id, qa.get('id')) != qa:
+            return False
+        current = session.get_current_question(user_id)
+        return current is None or current == asked
+
+    def _commit_question_sent(self, session, qa: Dict):
+        """Делает вопрос текущим и учитывает его в статистике — после доставки"""
+        user_id = session.user_id
+        session.save_current_question(user_id, qa)
+        session.record_question_asked(user_id)
+        # В журнал, а не в снимок статистики: снимок пишется раз в review_snapshot_every записей
+        session.log_question_sent(user_id, qa.get('id'))
+
+    async def replay_dead_letters(self, limit: int = 20) -> Dict[str, int]:
+        """
+        Повторно отправляет самые старые недоставленные сообщения.
 
-            stats = self.storage.get_user_stats(user_id)
-            last_time = stats.get("last_study_date")
-            if last_time:
-                delta = (datetime.now() - datetime.fromisoformat(last_time)).total_seconds() / 60
+        Вопрос викторины отправляется, только если викторина пользователя
+        активна и он не ждет ответа на другой вопрос; иначе вопрос устарел
+        и удаляется. Сообщение, снова не доставленное, остается в очереди.
+        """
+        counts = {"sent": 0, "failed": 0, "dropped": 0}
+        for letter in await asyncio.to_thread(self.dead_letters.list, limit):
+            if letter["kind"] == KIND_QUESTION:
+                outcome, error = await self._replay_question(letter)
             else:
-                delta = 0
-                
-            stats["total_study_time_minutes"] = stats.get("total_study_time_minutes", 0) + int(delta)
-            stats["last_study_date"] = datetime.now().isoformat()
+                outcome, error = await self._replay_message(letter)
 
-            self.storage.save_user_stats(user_id, stats)
-            
-            self.logger.info(f"Sent smart question to {user_id}: {qa['question']}")
-            
+            counts[outcome] += 1
+            if outcome == "failed":
+                await asyncio.to_thread(self.dead_letters.record_failure, letter["id"], error)
+            else:
+                await asyncio.to_thread(self.dead_letters.remove, letter["id"])
+
+        self.logger.info(f"Replayed dead letters: {counts}")
+        return counts
+
+    async def _resend(self, letter: Dict, **kwargs) -> Optional[str]:
+        """Отправка без повторного попадания в очередь недоставленных; возвращает ошибку"""
+        try:
+            result = await self.outbox.send(
+                chat_id=letter["chat_id"],
+                user_id=letter["user_id"],
+                text=letter["text"],
+                dead_letter=False,
+                **kwargs
+            )
         except Exception as e:
-            self.logger.error(f"Error sending question to {user_id}: {e}")
+            return describe_failure(e)
+        return None if is_delivered(result) else describe_failure(result)
 
-        
+    async def _replay_message(self, letter: Dict) -> Tuple[str, Optional[str]]:
+        error = await self._resend(letter)
+        return ("failed", error) if error else ("sent", None)
+
+    async def _replay_question(self, letter: Dict) -> Tuple[str, Optional[str]]:
+        payload = letter["payload"] or {}
+        user_id, qa = payload.get("user_id"), payload.get("qa")
+        chat_id = self.active_users.get(user_id)
+        if not user_id or not qa or chat_id is None:
+            return "dropped", None
+
+        async with self.storage.asession(user_id) as session:
+            if session.get_current_question(user_id):
+                return "dropped", None
+            if session.get_user_qa_by_id(user_id, qa.get("id")) != qa:
+                return "dropped", None
 
-    def _select_question_by_algorithm(self, user_id: str, qa_list: List[Dict]) -> Optional[Dict]:
-        """Выбирает вопрос по умному алгоритму на основе статистики"""
+        error = await self._resend(letter, priority=PRIORITY_SCHEDULED)
+        if error:
+            return "failed", error
+        async with self.storage.asession(user_id) as session:
+            if not await self._renew_lease(user_id):
+                self.logger.warning(f"Replayed question for {user_id} not recorded: the lease was lost meanwhile")
+                return "sent", None
+            if not self._can_commit_question(session, chat_id, qa, None):
+                self.logger.warning(f"Replayed question for {user_id} not recorded: the quiz changed meanwhile")
+                return "sent", None
+            self._commit_question_sent(session, qa)
+        return "sent", None
+
+    def _select_question_by_algorithm(self, qa_list: List[Dict], stats: Dict) -> Optional[Dict]:
+        """Выбирает вопрос по весам статистики, когда к повторению ничего не подошло"""
         if not qa_list:
             return None
         
         if len(qa_list) <= 3:
             return random.choice(qa_list)
         
-        weights = []
-        for qa in qa_list:
-            weight = self._calculate_question_weight(user_id, qa)
-            weights.append(weight)
-
-        total_weight = sum(weights)
-        if total_weight == 0:
-            return random.choice(qa_list)
-        
-        normalized_weights = [w / total_weight for w in weights]
-        
-        return random.choices(qa_list, weights=normalized_weights, k=1)[0]
-
-    def _calculate_question_weight(self, user_id: str, qa: Dict) -> float:
-        """Рассчитывает вес вопроса для алгоритма выбора"""
-        question_id = qa.get('id')
-        if not question_id:
-            return 1.0  
-        
-        stats = self.storage.get_question_stats(user_id, question_id)
-        times_asked = stats.get('times_asked', 0)
-        times_correct = stats.get('times_correct', 0)
-        last_quality = stats.get('last_quality', 0)
-        last_reviewed = stats.get('last_reviewed')
-        
-        weight = 1.0
-        
-        if times_asked == 0:
-            weight *= 3.0  
-        
-        if times_asked > 0:
-            success_rate = times_correct / times_asked
-            if success_rate < 0.3:
-                weight *= 2.5  
-            elif success_rate < 0.7:
-                weight *= 1.5  
-            else:
-                weight *= 0.7  
-        
-        if last_reviewed:
-            last_review_date = datetime.fromisoformat(last_reviewed)
-            days_since_review = (datetime.now() - last_review_date).days
-            
-            if days_since_review > 30:
-                weight *= 3.0
-            elif days_since_review > 7:
-                weight *= 2.0
-            elif days_since_review > 1:
-                weight *= 1.5
-        
-        if last_quality <= 2:
-            weight *= 2.0  
-        elif last_quality >= 4:
-            weight *= 0.6 
-        
-        return max(0.1, weight)
+        weights = question_weights(qa_list, stats.get("question_stats", {}))
+        return choose_weighted(qa_list, weights)
 
     async def _handle_empty_questions(self, user_id: str, chat_id: str):
         """Обрабатывает ситуацию, когда у пользователя нет вопросов"""
         try:
-            await self.bot.send_message(
-                chat_id=chat_id, 
+            await self.outbox.send(
+                chat_id=chat_id,
+                priority=PRIORITY_SCHEDULED,
                 text=(
                     "📝 У тебя нет вопросов для викторины!\n\n"
                     "Добавь вопросы через команду:\n"
@@ -217,57 +575,151 @@ class QuizManager:
                 )
             )
             
-            await asyncio.sleep(config.quiz.empty_qa_interval)
-            
         except Exception as e:
             self.logger.error(f"Failed to notify user {user_id} about empty questions: {e}")
 
-    def stop_quiz_for_user(self, user_id: str):
+    async def stop_quiz_for_user(self, user_id: str):
         """Останавливает цикл викторины для пользователя"""
-        self.active_users.discard(user_id)
-        self.storage.remove_current_question(user_id)
+        self._forget_user(user_id)
+        async with self.storage.asession(user_id) as session:
+            session.remove_schedule(user_id)
+            session.remove_current_question(user_id)
+        if self.leases:
+            await asyncio.to_thread(self.leases.release, user_id)
         self.logger.info(f"Quiz stopped for user {user_id}")
 
-    def get_user_quiz_status(self, user_id: str) -> Dict[str, any]:
+    def _stop_undeliverable(self, session):
+        """Останавливает викторину пользователя, которому вопросы не доставляются"""
+        user_id = session.user_id
+        self._forget_user(user_id)
+        session.update_user_settings(user_id, active=False)
+        session.remove_schedule(user_id)
+        session.remove_current_question(user_id)
+        self.logger.warning(f"Quiz stopped for {user_id}: the chat is blocked or deleted")
+
+    async def _renew_lease(self, user_id: str) -> bool:
+        """
+        Продлевает аренду пользователя. False — его держит другая реплика:
+        здесь пользователь забывается, а результаты его отправок не пишутся.
+        """
+        if not self.leases or await asyncio.to_thread(self.leases.acquire, user_id):
+            return True
+        self._forget_user(user_id)
+        self.repetition.invalidate(user_id)
+        return False
+
+    async def user_changed(self, user_id: str, reviewed: bool = False):
+        """
+        Колода или карточки пользователя изменились вне планировщика.
+
+        Своя очередь повторения сбрасывается (после ответа, reviewed,
+        RepetitionEngine.review уже обновил ее сам). Если пользователя
+        держит другая реплика, изменение отмечается для нее в аренде.
+        """
+        if not reviewed or user_id not in self.active_users:
+            self.repetition.invalidate(user_id)
+        if self.leases and user_id not in self.active_users:
+            await asyncio.to_thread(self.leases.mark_changed, user_id)
+
+    def _forget_user(self, user_id: str):
+        """Убирает пользователя из планировщика этого процесса (записи в хранилище остаются)"""
+        self.active_users.pop(user_id, None)
+        self.scheduler.cancel(user_id)
+
+    async def _lease_loop(self):
+        """
+        Heartbeat аренды раз в ttl/3.
+
+        Продлевает свои аренды и забывает пользователей, чьи аренды
+        потеряны. Затем выравнивает нагрузку: реплика держит не больше
+        доли ceil(активных / живых реплик). Лишних она отпускает, а
+        свободных (без аренды или с истекшей арендой упавшей реплики)
+        поднимает из хранилища до своей доли. Очереди повторения
+        пользователей, которых эта реплика не держала или которые
+        изменились на других репликах, сбрасываются и собираются заново.
+        """
+        interval = self.leases.ttl / 3
+        while True:
+            try:
+                await self._balance_leases()
+            except Exception as e:
+                self.logger.error(f"Lease heartbeat failed: {e}")
+            await asyncio.sleep(interval)
+
+    async def _balance_leases(self):
+        replicas = await asyncio.to_thread(self.leases.heartbeat)
+        owned = await asyncio.to_thread(self.leases.owned)
+        for user_id in [user_id for user_id in self.active_users if user_id not in owned]:
+            self.logger.warning(f"Lease for {user_id} was lost, leaving it to another replica")
+            self._forget_user(user_id)
+            self.repetition.invalidate(user_id)
+        changed, self._changes_seen = await asyncio.to_thread(self.leases.changes_after, self._changes_seen)
+        for user_id in changed:
+            self.repetition.invalidate(user_id)
+
+        active = [user_id for user_id in await self.storage.aget_active_user_ids() if self.owns(user_id)]
+        share = math.ceil(len(active) / max(1, replicas))
+
+        excess = len(self.active_users) - share
+        if excess > 0:
+            for user_id in list(itertools.islice(self.active_users, excess)):
+                self._forget_user(user_id)
+                self.repetition.invalidate(user_id)
+                await asyncio.to_thread(self.leases.release, user_id)
+            self.logger.info(f"Released {excess} users to other replicas ({replicas} alive, share {share})")
+            return
+
+        others = await asyncio.to_thread(self.leases.held_by_others)
+        free = [user_id for user_id in active if user_id not in self.active_users and user_id not in others]
+        claimed = 0
+        for user_id in free[:share - len(self.active_users)]:
+            if await self._restore_user(user_id):
+                # Пока пользователя держала другая реплика, очередь могла устареть
+                self.repetition.invalidate(user_id)
+                claimed += 1
+        if claimed:
+            self.logger.info(f"Took over {claimed} users ({replicas} replicas alive, share {share})")
+
+    async def get_user_quiz_status(self, user_id: str) -> Dict[str, any]:
         """Возвращает статус викторины для пользователя"""
-        settings = self.storage.get_user_settings(user_id)
+        settings = await self.storage.aget_user_settings(user_id)
         return {
             "active": user_id in self.active_users,
             "questions_today": settings.get("questions_today", 0),
             "daily_goal": settings.get("daily_goal", 10),
-            "next_possible_question": self._calculate_next_possible_question(user_id)
+            "next_possible_question": self._calculate_next_possible_question(user_id, settings)
         }
 
-    def _calculate_next_possible_question(self, user_id: str) -> str:
+    def _calculate_next_possible_question(self, user_id: str, settings: Dict) -> str:
         """Рассчитывает, когда может быть следующий вопрос"""
         if user_id not in self.active_users:
             return "викторина остановлена"
         
-        settings = self.storage.get_user_settings(user_id)
         now = datetime.now()
-        
-        weekday = now.strftime("%A").lower()
-        day_schedule = settings["schedule"][weekday]
-        
-        if not day_schedule["enabled"]:
-            next_day = self._find_next_available_day(weekday, settings)
-            return f"следующий доступный день: {next_day}"
-        
-        current_time = now.time()
-        start_time = datetime.strptime(day_schedule["start"], "%H:%M").time()
-        end_time = datetime.strptime(day_schedule["end"], "%H:%M").time()
-        
-        if current_time < start_time:
-            return f"сегодня в {start_time}"
-        elif current_time > end_time:
-            next_day = self._find_next_available_day(weekday, settings)
-            return f"следующий доступный день: {next_day}"
-        else:
+        schedule = compile_schedule(settings["schedule"])
+        daily = settings.get("daily_counts") or {}
+        asked = daily.get("questions", 0) if daily.get("date") == now.date().isoformat() else 0
+        if asked >= settings["daily_goal"]:
+            # Цель на сегодня выполнена: сегодняшние окна уже не в счет
+            next_open = schedule.next_open_after_today(now)
+            if next_open is None:
+                return "нет доступных дней"
+            return (
+                "цель на сегодня выполнена, следующий доступный день: "
+                f"{self._find_next_available_day(next_open)} в {next_open.strftime('%H:%M')}"
+            )
+
+        next_open = schedule.next_open(now)
+        if next_open is None:
+            return "нет доступных дней"
+        if next_open == now:
             return "в течение интервала"
+        if next_open.date() == now.date():
+            return f"сегодня в {next_open.strftime('%H:%M')}"
+        return f"следующий доступный день: {self._find_next_available_day(next_open)}"
 
-    def _find_next_available_day(self, current_day: str, settings: Dict) -> str:
-        """Находит следующий доступный день в расписании"""
-        days = ["monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday"]
+    def _find_next_available_day(self, next_open: datetime) -> str:
+        """Название дня, в который откроется следующее окно расписания"""
         days_ru = {
             "monday": "понедельник",
             "tuesday": "вторник", 
@@ -278,12 +730,4 @@ class QuizManager:
             "sunday": "воскресенье"
         }
         
-        current_index = days.index(current_day)
-        
-        for i in range(1, 8):
-            next_day_index = (current_index + i) % 7
-            next_day = days[next_day_index]
-            if settings["schedule"][next_day]["enabled"]:
-                return days_ru[next_day]
-        
-        return "нет доступных дней"
\ No newline at end of file
+        return days_ru[DAYS[next_open.weekday()]]
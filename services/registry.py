@@ -0,0 +1,105 @@
+# Copyright (c) 2025 Solovev Ivan, Usenko Evgeny, Alexandrov Arseniy
+
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Any
+
+
+class UserRegistry:
+    """
+    Индекс пользователей JSON-хранилища в SQLite.
+
+    Хранит идентификатор, время последней записи, признак активной
+    викторины и признак переноса в холодное хранилище, так что перебор
+    пользователей — это запрос к индексу, а не обход каталога с данными.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS users (
+            user_id TEXT PRIMARY KEY,
+            last_active REAL NOT NULL,
+            quiz_active INTEGER NOT NULL DEFAULT 0,
+            archived INTEGER NOT NULL DEFAULT 0
+        ) WITHOUT ROWID;
+        CREATE INDEX IF NOT EXISTS users_quiz_active ON users (quiz_active);
+    """
+
+    def __init__(self, db_path: Path):
+        self.db_path = Path(db_path)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(self.SCHEMA)
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(users)")}
+        if "archived" not in columns:
+            # Индекс, созданный до появления холодного хранилища
+            self._conn.execute("ALTER TABLE users ADD COLUMN archived INTEGER NOT NULL DEFAULT 0")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS users_archived ON users (archived, last_active)")
+
+    def touch(self, user_id: str, quiz_active: Optional[bool] = None, last_active: Optional[float] = None):
+        """Отмечает запись пользователя; quiz_active=None оставляет признак как есть"""
+        last_active = last_active if last_active is not None else time.time()
+        with self._lock:
+            if quiz_active is None:
+                self._conn.execute(
+                    "INSERT INTO users (user_id, last_active) VALUES (?, ?) "
+                    "ON CONFLICT(user_id) DO UPDATE SET last_active = excluded.last_active",
+                    (user_id, last_active)
+                )
+            else:
+                self._conn.execute(
+                    "INSERT INTO users (user_id, last_active, quiz_active) VALUES (?, ?, ?) "
+                    "ON CONFLICT(user_id) DO UPDATE SET last_active = excluded.last_active, "
+                    "quiz_active = excluded.quiz_active",
+                    (user_id, last_active, int(quiz_active))
+                )
+
+    def user_ids(self, active_only: bool = False, archived: bool = False) -> List[str]:
+        """Пользователи горячего (или, с archived=True, холодного) хранилища"""
+        query = "SELECT user_id FROM users WHERE archived = ?"
+        if active_only:
+            query += " AND quiz_active = 1"
+        with self._lock:
+            return [row[0] for row in self._conn.execute(query, (int(archived),)).fetchall()]
+
+    def inactive_user_ids(self, before: float) -> List[str]:
+        """Горячие пользователи без викторины, не писавшие с момента before"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT user_id FROM users WHERE archived = 0 AND quiz_active = 0 AND last_active < ?",
+                (before,)
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def set_archived(self, user_id: str, archived: bool):
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO users (user_id, last_active, archived) VALUES (?, ?, ?) "
+                "ON CONFLICT(user_id) DO UPDATE SET archived = excluded.archived",
+                (user_id, time.time(), int(archived))
+            )
+
+    def is_archived(self, user_id: str) -> bool:
+        with self._lock:
+            row = self._conn.execute("SELECT archived FROM users WHERE user_id = ?", (user_id,)).fetchone()
+        return bool(row and row[0])
+
+    def get(self, user_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT last_active, quiz_active, archived FROM users WHERE user_id = ?", (user_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        return {"user_id": user_id, "last_active": row[0], "quiz_active": bool(row[1]), "archived": bool(row[2])}
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM users").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
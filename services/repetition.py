@@ -0,0 +1,148 @@
+# Copyright (c) 2025 Solovev Ivan, Usenko Evgeny, Alexandrov Arseniy
+
+import heapq
+import logging
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple, Any
+
+SECONDS_PER_DAY = 86400
+
+
+def new_card() -> Dict[str, Any]:
+    """Состояние карточки, которую еще ни разу не повторяли"""
+    return {"ease_factor": 2.5, "interval": 0, "repetitions": 0, "due": 0}
+
+
+def sm2_review(card: Dict[str, Any], quality: int, now: float) -> Dict[str, Any]:
+    """
+    Один шаг алгоритма SuperMemo-2.
+
+    quality — оценка ответа от 0 до 5; interval в днях, due — unix-время.
+    """
+    ease_factor = card["ease_factor"]
+    repetitions = card["repetitions"]
+    interval = card["interval"]
+
+    if quality >= 3:
+        if repetitions == 0:
+            interval = 1
+        elif repetitions == 1:
+            interval = 6
+        else:
+            interval = round(interval * ease_factor)
+        repetitions += 1
+    else:
+        repetitions = 0
+        interval = 1
+
+    ease_factor += 0.1 - (5 - quality) * (0.08 + (5 - quality) * 0.02)
+
+    return {
+        "ease_factor": max(1.3, ease_factor),
+        "interval": interval,
+        "repetitions": repetitions,
+        "due": now + interval * SECONDS_PER_DAY
+    }
+
+
+class DueQueue:
+    """Min-куча карточек пользователя по времени повторения"""
+
+    def __init__(self, qa_list: List[Dict], cards: Dict[str, Dict]):
+        self.questions: Dict[str, Dict] = {}
+        self.due: Dict[str, float] = {}
+        for qa in qa_list:
+            question_id = str(qa.get('id'))
+            self.questions[question_id] = qa
+            self.due[question_id] = cards.get(question_id, new_card())["due"]
+        self._heap: List[Tuple[float, str]] = [(due, question_id) for question_id, due in self.due.items()]
+        heapq.heapify(self._heap)
+
+    def push(self, question_id: str, due: float):
+        if question_id not in self.questions:
+            return
+        self.due[question_id] = due
+        heapq.heappush(self._heap, (due, question_id))
+
+    def pop_due(self, now: float) -> Optional[str]:
+        """Извлекает самую просроченную карточку, если она уже к повторению"""
+        while self._heap:
+            due, question_id = self._heap[0]
+            if self.due.get(question_id) != due:
+                heapq.heappop(self._heap)
+                continue
+            if due > now:
+                return None
+            heapq.heappop(self._heap)
+            return question_id
+        return None
+
+
+class RepetitionEngine:
+    """
+    Движок интервального повторения по SM-2.
+
+    Состояние карточек (ease factor, интервал, число повторений, срок)
+    хранится в документе пользователя, а в памяти для активных пользователей
+    держится очередь к повторению, так что выбор вопроса стоит O(log n).
+    Методы работают внутри сессии пользователя (Storage.asession).
+    """
+
+    def __init__(self, max_users: int, ask_cooldown: float):
+        self.max_users = max_users
+        self.ask_cooldown = ask_cooldown
+        self.logger = logging.getLogger(__name__)
+        self._queues: "OrderedDict[str, DueQueue]" = OrderedDict()
+
+    def _queue(self, session, qa_list: List[Dict]) -> DueQueue:
+        user_id = session.user_id
+        queue = self._queues.get(user_id)
+        if queue is None:
+            queue = DueQueue(qa_list, session.get_user_cards(user_id))
+            self._queues[user_id] = queue
+            while len(self._queues) > self.max_users:
+                self._queues.popitem(last=False)
+        else:
+            self._queues.move_to_end(user_id)
+        return queue
+
+    def pick_due(self, session, qa_list: List[Dict]) -> Optional[Dict]:
+        """
+        Возвращает карточку, срок повторения которой наступил.
+
+        Выданная карточка откладывается на ask_cooldown секунд, пока
+        пользователь не ответит и SM-2 не назначит ей настоящий срок.
+        """
+        now = time.time()
+        queue = self._queue(session, qa_list)
+        question_id = queue.pop_due(now)
+        if question_id is None:
+            return None
+        queue.push(question_id, now + self.ask_cooldown)
+        return queue.questions[question_id]
+
+    def review(self, session, question_id: int, quality: int):
+        """Учитывает ответ пользователя (в сессии UserSession) и переносит срок карточки"""
+        if question_id is None:
+            return
+        user_id = session.user_id
+        question_id = str(question_id)
+        cards = session.get_user_cards(user_id)
+        card = sm2_review(cards.get(question_id, new_card()), quality, time.time())
+        cards[question_id] = card
+        session.save_user_cards(user_id, cards)
+
+        queue = self._queues.get(user_id)
+        if queue is not None:
+            queue.push(question_id, card["due"])
+
+    def release(self, user_id: str, question_id):
+        """Возвращает выданную, но не доставленную карточку: она снова к повторению"""
+        queue = self._queues.get(user_id)
+        if queue is not None and question_id is not None:
+            queue.push(str(question_id), time.time())
+
+    def invalidate(self, user_id: str):
+        """Сбрасывает очередь пользователя после изменения колоды"""
+        self._queues.pop(user_id, None)
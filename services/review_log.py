@@ -0,0 +1,132 @@
+# Copyright (c) 2025 Solovev Ivan, Usenko Evgeny, Alexandrov Arseniy
+
+"""
+Журнал ответов пользователя.
+
+Каждый ответ — компактная запись [seq, timestamp, question_id, correct,
+response_time, quality], которая дописывается в конец журнала. Отправка
+вопроса тоже пишется в журнал записью с correct = None: она обновляет
+last_reviewed вопроса и время занятий, но не счетчики ответов. Документ
+статистики служит снимком: поле log_seq хранит номер последней учтенной
+записи, а при чтении к снимку применяются записи журнала после него.
+"""
+
+from datetime import datetime
+from typing import Dict, List, Optional, Any
+
+SEQ, TIMESTAMP, QUESTION_ID, CORRECT, RESPONSE_TIME, QUALITY = range(6)
+
+
+def default_question_stats() -> Dict[str, Any]:
+    return {
+        "times_asked": 0,
+        "times_correct": 0,
+        "total_response_time": 0,
+        "last_quality": 0,
+        "last_reviewed": None
+    }
+
+
+def make_record(seq: int, question_id: Optional[int], correct: bool,
+                response_time: Optional[float], quality: Optional[int],
+                timestamp: Optional[float] = None) -> List[Any]:
+    """Создает запись журнала"""
+    timestamp = timestamp if timestamp is not None else datetime.now().timestamp()
+    return [seq, round(timestamp, 3), question_id, 1 if correct else 0, response_time, quality]
+
+
+def make_asked_record(seq: int, question_id: Optional[int], timestamp: Optional[float] = None) -> List[Any]:
+    """Создает запись об отправленном вопросе"""
+    timestamp = timestamp if timestamp is not None else datetime.now().timestamp()
+    return [seq, round(timestamp, 3), question_id, None, None, None]
+
+
+def is_answer(record: List[Any]) -> bool:
+    """Запись — ответ пользователя, а не отправка вопроса"""
+    return record[CORRECT] is not None
+
+
+def apply_asked(stats: Dict[str, Any], record: List[Any]) -> Dict[str, Any]:
+    """Возвращает новую статистику с учетом отправленного вопроса"""
+    stats = dict(stats)
+    asked_at = datetime.fromtimestamp(record[TIMESTAMP])
+    question_id = record[QUESTION_ID]
+
+    if question_id:
+        question_stats = dict(stats["question_stats"])
+        q_stats = dict(question_stats.get(str(question_id)) or default_question_stats())
+        q_stats["last_reviewed"] = asked_at.isoformat()
+        question_stats[str(question_id)] = q_stats
+        stats["question_stats"] = question_stats
+
+    # Время занятий — минуты с предыдущего вопроса или ответа
+    last_time = stats.get("last_study_date")
+    delta = (asked_at - datetime.fromisoformat(last_time)).total_seconds() / 60 if last_time else 0
+    stats["total_study_time_minutes"] = stats.get("total_study_time_minutes", 0) + int(delta)
+    stats["last_study_date"] = asked_at.isoformat()
+    stats["log_seq"] = record[SEQ]
+    stats["log_tail"] = stats.get("log_tail", 0) + 1
+    return stats
+
+
+def apply_review(stats: Dict[str, Any], record: List[Any]) -> Dict[str, Any]:
+    """
+    Возвращает новую статистику с учетом записи журнала.
+
+    Исходный словарь не меняется: копируются только верхний уровень и
+    затронутая статистика вопроса, поэтому фоновый сброс кэша никогда
+    не видит наполовину обновленный документ.
+    """
+    if not is_answer(record):
+        return apply_asked(stats, record)
+    stats = dict(stats)
+    reviewed_at = datetime.fromtimestamp(record[TIMESTAMP]).isoformat()
+    correct = bool(record[CORRECT])
+    response_time = record[RESPONSE_TIME]
+    question_id = record[QUESTION_ID]
+
+    stats["total_questions_answered"] += 1
+    if correct:
+        stats["correct_answers"] += 1
+        stats["current_streak"] += 1
+        stats["best_streak"] = max(stats["best_streak"], stats["current_streak"])
+    else:
+        stats["incorrect_answers"] += 1
+        stats["current_streak"] = 0
+
+    if response_time is not None:
+        total_time = stats["average_response_time"] * (stats["total_questions_answered"] - 1)
+        stats["average_response_time"] = (total_time + response_time) / stats["total_questions_answered"]
+
+    if question_id is not None:
+        question_stats = dict(stats["question_stats"])
+        q_stats = dict(question_stats.get(str(question_id)) or default_question_stats())
+        q_stats["times_asked"] += 1
+        q_stats["last_reviewed"] = reviewed_at
+
+        if correct:
+            q_stats["times_correct"] += 1
+
+        if response_time is not None:
+            q_stats["total_response_time"] += response_time
+
+        if record[QUALITY] is not None:
+            q_stats["last_quality"] = record[QUALITY]
+
+        question_stats[str(question_id)] = q_stats
+        stats["question_stats"] = question_stats
+
+    stats["last_study_date"] = reviewed_at
+    stats["log_seq"] = record[SEQ]
+    stats["log_tail"] = stats.get("log_tail", 0) + 1
+    return stats
+
+
+def replay(stats: Dict[str, Any], records: List[List[Any]]) -> Dict[str, Any]:
+    """Применяет к снимку записи журнала, которые еще не учтены в нем"""
+    log_seq = stats.get("log_seq", 0)
+    for record in records:
+        if record[SEQ] > log_seq:
+            stats = apply_review(stats, record)
+            log_seq = record[SEQ]
+    return stats
@@ -0,0 +1,117 @@
+# Copyright (c) 2025 Solovev Ivan, Usenko Evgeny, Alexandrov Arseniy
+
+import hashlib
+from bisect import bisect_right
+from datetime import datetime, timedelta
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple, Any
+
+DAYS = ["monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday"]
+
+SECONDS_PER_DAY = 86400
+SECONDS_PER_WEEK = 7 * SECONDS_PER_DAY
+
+
+class CompiledSchedule:
+    """
+    Недельное расписание, скомпилированное в отсортированный список
+    интервалов [начало, конец] в секундах от понедельника 00:00.
+    Конец интервала включается, как и в исходной проверке по HH:MM.
+    """
+
+    def __init__(self, intervals: List[Tuple[int, int]]):
+        self.intervals = sorted(intervals)
+        self._starts = [start for start, _ in self.intervals]
+
+    @staticmethod
+    def _week_seconds(moment: datetime) -> int:
+        return moment.weekday() * SECONDS_PER_DAY + moment.hour * 3600 + moment.minute * 60 + moment.second
+
+    def is_open(self, moment: datetime) -> bool:
+        """Попадает ли момент в одно из окон расписания"""
+        offset = self._week_seconds(moment)
+        index = bisect_right(self._starts, offset) - 1
+        return index >= 0 and offset <= self.intervals[index][1]
+
+    def open_until(self, moment: datetime) -> int:
+        """Сколько секунд от moment окно останется открытым (0 — закрыто)"""
+        offset = self._week_seconds(moment)
+        index = bisect_right(self._starts, offset) - 1
+        if index < 0 or offset > self.intervals[index][1]:
+            return 0
+        return self.intervals[index][1] - offset
+
+    def next_open(self, moment: datetime) -> Optional[datetime]:
+        """Ближайший момент не раньше moment, когда окно открыто (None — окон нет)"""
+        if not self.intervals:
+            return None
+        if self.is_open(moment):
+            return moment
+
+        offset = self._week_seconds(moment)
+        index = bisect_right(self._starts, offset)
+        if index < len(self._starts):
+            wait = self._starts[index] - offset
+        else:
+            wait = self._starts[0] + SECONDS_PER_WEEK - offset
+        return moment.replace(microsecond=0) + timedelta(seconds=wait)
+
+    def next_open_after_today(self, moment: datetime) -> Optional[datetime]:
+        """Ближайшее открытие окна начиная со следующего календарного дня"""
+        tomorrow = datetime.combine(moment.date() + timedelta(days=1), datetime.min.time())
+        return self.next_open(tomorrow)
+
+
+def user_offset(user_id: str, spread: float) -> float:
+    """
+    Постоянный для пользователя сдвиг в [0, spread) секунд.
+
+    Считается по хэшу id, а не случайно: после перезапуска и в любом
+    процессе пользователь попадает в ту же точку окна, и открытие окна
+    у всех пользователей растягивается равномерно на spread секунд.
+    """
+    if spread <= 0:
+        return 0.0
+    digest = hashlib.sha1(user_id.encode('utf-8')).digest()
+    return int.from_bytes(digest[:8], "big") / 2 ** 64 * spread
+
+
+def _parse_minutes(value: str) -> int:
+    hours, minutes = value.split(":")
+    return int(hours) * 60 + int(minutes)
+
+
+@lru_cache(maxsize=4096)
+def _compile(key: Tuple[Tuple[bool, str, str], ...]) -> CompiledSchedule:
+    intervals = []
+    for day_index, (enabled, start, end) in enumerate(key):
+        if not enabled:
+            continue
+        try:
+            start_seconds = _parse_minutes(start) * 60
+            end_seconds = _parse_minutes(end) * 60
+        except (AttributeError, ValueError):
+            continue
+        if start_seconds > end_seconds:
+            continue
+        day_offset = day_index * SECONDS_PER_DAY
+        intervals.append((day_offset + start_seconds, day_offset + end_seconds))
+    return CompiledSchedule(intervals)
+
+
+def compile_schedule(schedule: Dict[str, Any]) -> CompiledSchedule:
+    """
+    Компилирует расписание из настроек пользователя.
+
+    Результат кэшируется по содержимому расписания, поэтому повторная
+    компиляция происходит только после изменения настроек.
+    """
+    key = tuple(
+        (
+            bool(schedule.get(day, {}).get("enabled")),
+            schedule.get(day, {}).get("start"),
+            schedule.get(day, {}).get("end")
+        )
+        for day in DAYS
+    )
+    return _compile(key)
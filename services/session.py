@@ -0,0 +1,119 @@
+# Copyright (c) 2025 Solovev Ivan, Usenko Evgeny, Alexandrov Arseniy
+
+import json
+from typing import Dict, Iterator, List, Optional, Set, Any
+from .backends import StorageBackend
+
+_MISSING = object()
+
+
+class SessionBackend(StorageBackend):
+    """
+    Буфер документов одного пользователя на время единицы работы.
+
+    Документы читаются из вложенного бэкенда одним load_many при первом
+    обращении и выдаются копиями. Изменения, записи журнала ответов и
+    операции над колодой копятся в памяти и уходят вложенному бэкенду
+    одним commit. Обращения к другим пользователям передаются вложенному
+    бэкенду напрямую.
+    """
+
+    def __init__(self, backend: StorageBackend, user_id: str):
+        self.backend = backend
+        self.user_id = user_id
+        self._loaded: Optional[Dict[str, Any]] = None
+        self._docs: Dict[str, Any] = {}
+        self._dirty: Set[str] = set()
+        self._remembered: Set[str] = set()
+        self._reviews: List[List[Any]] = []
+        self._deck_ops: List[List[Any]] = []
+
+    def preload(self):
+        """Читает документы пользователя (блокирующий вызов)"""
+        if self._loaded is None:
+            self._loaded = self.backend.load_many(self.user_id)
+
+    @property
+    def dirty(self) -> bool:
+        return bool(self._dirty or self._remembered or self._reviews or self._deck_ops)
+
+    def load(self, user_id: str, kind: str) -> Any:
+        if user_id != self.user_id:
+            return self.backend.load(user_id, kind)
+        data = self._docs.get(kind, _MISSING)
+        if data is _MISSING:
+            self.preload()
+            data = self._loaded.get(kind, _MISSING)
+            if data is _MISSING:
+                data = self.backend.load(user_id, kind)
+            # Копия: незакоммиченные изменения не должны попасть в общий кэш
+            data = None if data is None else json.loads(json.dumps(data, ensure_ascii=False))
+            self._docs[kind] = data
+        return data
+
+    def save(self, user_id: str, kind: str, data: Any) -> bool:
+        if user_id != self.user_id:
+            return self.backend.save(user_id, kind, data)
+        self._docs[kind] = data
+        self._dirty.add(kind)
+        return True
+
+    def delete(self, user_id: str, kind: str) -> bool:
+        if user_id != self.user_id:
+            return self.backend.delete(user_id, kind)
+        existed = self.load(user_id, kind) is not None
+        self._docs[kind] = None
+        self._dirty.add(kind)
+        return existed
+
+    def user_ids(self, active_only: bool = False) -> List[str]:
+        return self.backend.user_ids(active_only)
+
+    def append_review(self, user_id: str, record: List[Any]) -> bool:
+        if user_id != self.user_id:
+            return self.backend.append_review(user_id, record)
+        self._reviews.append(record)
+        return True
+
+    def read_reviews(self, user_id: str, after_seq: int = 0) -> List[List[Any]]:
+        records = self.backend.read_reviews(user_id, after_seq)
+        if user_id == self.user_id:
+            records += [record for record in self._reviews if record[0] > after_seq]
+        return records
+
+    def append_deck_ops(self, user_id: str, ops: List[List[Any]]) -> bool:
+        if user_id != self.user_id:
+            return self.backend.append_deck_ops(user_id, ops)
+        self._deck_ops.extend(ops)
+        return True
+
+    def iter_reviews(self, user_id: str) -> Iterator[List[Any]]:
+        yield from self.backend.iter_reviews(user_id)
+        if user_id == self.user_id:
+            yield from self._reviews
+
+    def remember(self, user_id: str, kind: str, data: Any):
+        if user_id != self.user_id:
+            self.backend.remember(user_id, kind, data)
+            return
+        self._docs[kind] = data
+        self._remembered.add(kind)
+
+    def commit(self) -> bool:
+        """Передает накопленные изменения вложенному бэкенду"""
+        ok = True
+        # Сначала журнал: снимок статистики не должен опережать его
+        for record in self._reviews:
+            ok = self.backend.append_review(self.user_id, record) and ok
+        if self._deck_ops:
+            ok = self.backend.append_deck_ops(self.user_id, self._deck_ops) and ok
+        if self._dirty:
+            ok = self.backend.save_many(self.user_id, {kind: self._docs[kind] for kind in self._dirty}) and ok
+        for kind in self._remembered - self._dirty:
+            self.backend.remember(self.user_id, kind, self._docs[kind])
+
+        self._reviews.clear()
+        self._deck_ops.clear()
+        self._dirty.clear()
+        self._remembered.clear()
+        return ok
@@ -0,0 +1,31 @@
+# Copyright (c) 2025 Solovev Ivan, Usenko Evgeny, Alexandrov Arseniy
+
+import hashlib
+from typing import Any, Dict, Optional
+
+# Где в обновлении Max лежит пользователь, по которому оно маршрутизируется
+_USER_PATHS = (
+    ("callback", "user", "user_id"),
+    ("message", "sender", "user_id"),
+    ("user", "user_id"),
+    ("chat_id",),
+)
+
+
+def shard_of(user_id: str, shards: int) -> int:
+    """Номер шарда пользователя (одинаковый во всех процессах и запусках)"""
+    if shards <= 1:
+        return 0
+    digest = hashlib.sha1(user_id.encode('utf-8')).digest()
+    return int.from_bytes(digest[-4:], "big") % shards
+
+
+def update_user_id(update: Dict[str, Any]) -> Optional[str]:
+    """user_id из необработанного обновления Max (или chat_id, если пользователя нет)"""
+    for path in _USER_PATHS:
+        value: Any = update
+        for key in path:
+            value = value.get(key) if isinstance(value, dict) else None
+        if value is not None:
+            return str(value)
+    return None
@@ -1,51 +1,87 @@
 # Copyright (c) 2025 Solovev Ivan, Usenko Evgeny, Alexandrov Arseniy
 
-import json
 import logging
-from pathlib import Path
+import time
+from contextlib import asynccontextmanager
 from datetime import datetime, date
-from typing import Dict, List, Optional, Any
+from typing import Callable, Dict, Iterator, List, Optional, Tuple, Any
 from core.config import config
+from .backends import create_backend, KIND_QA, KIND_SETTINGS, KIND_STATS, KIND_CURRENT, KIND_SCHEDULE, KIND_CARDS
+from .cache import CachedBackend
+from .deck import OP_ADD, OP_DEL, as_deck, empty_deck, deck_from_list, deck_items, apply_op
+from .review_log import make_record, make_asked_record, apply_review, default_question_stats, SEQ
+from .io_pool import UserIOExecutor
+from .session import SessionBackend
 
 class Storage:
     """Сервис для работы с хранилищем данных"""
+
+    DAILY_HISTORY_DAYS = 90
     
     def __init__(self):
         self.data_dir = config.database.data_dir
         self.data_dir.mkdir(exist_ok=True)
         self.logger = logging.getLogger(__name__)
+        self.backend = create_backend(config.database)
+        self.cache = None
+        if config.database.cache_size > 0 and config.quiz.lease_ttl > 0:
+            # Копии бота на одном каталоге данных не видят кэшей друг друга
+            self.logger.warning("QUIZ_LEASE_TTL is set: CACHE_SIZE is ignored, the user cache is disabled")
+        elif config.database.cache_size > 0:
+            self.cache = CachedBackend(
+                self.backend,
+                max_users=config.database.cache_size,
+                flush_interval=config.database.cache_flush_interval
+            )
+            self.backend = self.cache
+        self.io = UserIOExecutor(config.database.io_workers)
 
-    # --- Вспомогательные методы ---
-    
-    def _user_qa_file(self, user_id: str) -> Path:
-        return self.data_dir / f"user_{user_id}.json"
-
-    def _current_question_file(self, user_id: str) -> Path:
-        return self.data_dir / f"current_{user_id}.json"
-
-    def _user_settings_file(self, user_id: str) -> Path:
-        return self.data_dir / f"user_settings_{user_id}.json"
-
-    def _user_stats_file(self, user_id: str) -> Path:
-        return self.data_dir / f"user_stats_{user_id}.json"
-
-    def _load_json_file(self, file_path: Path) -> Any:
-        try:
-            if file_path.exists():
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    return json.load(f)
-        except Exception as e:
-            self.logger.error(f"Error loading {file_path}: {e}")
-        return None
-
-    def _save_json_file(self, file_path: Path, data: Any) -> bool:
-        try:
-            with open(file_path, 'w', encoding='utf-8') as f:
-                json.dump(data, f, ensure_ascii=False, indent=2)
-            return True
-        except Exception as e:
-            self.logger.error(f"Error saving {file_path}: {e}")
-            return False
+    def flush(self) -> int:
+        """Сбрасывает отложенные изменения на диск"""
+        return self.cache.flush() if self.cache else 0
+
+    def get_cache_stats(self) -> Optional[Dict[str, Any]]:
+        """Счетчики кэша пользователей (None, если кэш отключен)"""
+        return self.cache.get_stats() if self.cache else None
+
+    def quiesce(self):
+        """
+        Контекст, на время которого данные на диске согласованы и не
+        меняются: кэш сброшен, записи хранилища приостановлены.
+        """
+        return self.backend.quiesce()
+
+    def close(self):
+        """Сбрасывает кэш и закрывает хранилище"""
+        self.io.shutdown()
+        self.backend.close()
+
+    # --- Единица работы ---
+
+    def session(self, user_id: str) -> "UserSession":
+        """
+        Синхронная сессия пользователя: with storage.session(user_id) as s.
+        Очередь пользователя не захватывается — вызывающий код сам отвечает
+        за то, чтобы сессии одного пользователя не пересекались.
+        """
+        return UserSession(self, user_id)
+
+    @asynccontextmanager
+    async def asession(self, user_id: str):
+        """
+        Асинхронная сессия пользователя.
+
+        На все время сессии захватывается очередь пользователя в пуле I/O,
+        документы читаются одним обращением к хранилищу, и методы сессии
+        внутри блока синхронны и работают в памяти. Изменения записываются
+        одной операцией на выходе; при исключении они отбрасываются.
+        """
+        async with self.io.lock(user_id):
+            session = UserSession(self, user_id)
+            await self.io.run_unlocked(session.backend.preload)
+            yield session
+            if session.backend.dirty:
+                await self.io.run_unlocked(session.commit)
 
     # --- Настройки пользователя ---
     
@@ -58,23 +94,78 @@ class Storage:
             "schedule": config.get_default_schedule(),
             "questions_today": 0,
             "last_question_date": None,
-            "last_reset_date": date.today().isoformat()
+            "daily_counts": {"date": date.today().isoformat(), "questions": 0},
+            "daily_history": {}
         }
 
+    @staticmethod
+    def _daily_counts(settings: Dict[str, Any]) -> Dict[str, Any]:
+        daily = settings.get("daily_counts")
+        if daily is None:
+            # Настройки в старом формате: счетчик и дата последнего сброса
+            daily = {"date": settings.get("last_reset_date"), "questions": settings.get("questions_today", 0)}
+        return daily
+
+    @classmethod
+    def _with_history(cls, settings: Dict[str, Any], daily: Dict[str, Any]) -> Dict[str, int]:
+        """История по дням с добавленным счетчиком прошедшего дня"""
+        history = dict(settings.get("daily_history") or {})
+        if daily["date"] and daily["questions"]:
+            history[daily["date"]] = daily["questions"]
+        return dict(sorted(history.items())[-cls.DAILY_HISTORY_DAYS:])
+
     def get_user_settings(self, user_id: str) -> Dict[str, Any]:
-        settings = self._load_json_file(self._user_settings_file(user_id))
+        """
+        Настройки пользователя. questions_today вычисляется из счетчика,
+        привязанного к дате: наступление нового дня — это сравнение дат,
+        а не перезапись файла. daily_counts в результате всегда относится
+        к дню чтения, а прошедший день переносится в историю.
+        """
+        settings = self.backend.load(user_id, KIND_SETTINGS)
         if not settings:
             return self.get_default_settings()
         
-        if settings.get('last_reset_date') != date.today().isoformat():
-            settings['questions_today'] = 0
-            settings['last_reset_date'] = date.today().isoformat()
-            self.save_user_settings(user_id, settings)
-        
+        today = date.today().isoformat()
+        daily = self._daily_counts(settings)
+        if daily["date"] != today:
+            settings["daily_history"] = self._with_history(settings, daily)
+            daily = {"date": today, "questions": 0}
+        settings["daily_counts"] = daily
+        settings["questions_today"] = daily["questions"]
         return settings
 
     def save_user_settings(self, user_id: str, settings: Dict[str, Any]) -> bool:
-        return self._save_json_file(self._user_settings_file(user_id), settings)
+        """
+        Сохраняет настройки. questions_today относится к дню daily_counts:
+        если настройки прочитаны в другой день, их счетчик уходит в историю
+        того дня, а сегодняшний начинается с нуля.
+        """
+        today = date.today().isoformat()
+        daily = self._daily_counts(settings)
+        questions = settings.get("questions_today", 0)
+        if daily["date"] != today:
+            settings["daily_history"] = self._with_history(settings, {"date": daily["date"], "questions": questions})
+            questions = 0
+        settings["daily_counts"] = {"date": today, "questions": questions}
+        settings["questions_today"] = questions
+        settings.pop("last_reset_date", None)
+        return self.backend.save(user_id, KIND_SETTINGS, settings)
+
+    def record_question_asked(self, user_id: str) -> bool:
+        """Увеличивает счетчик вопросов за сегодня"""
+        settings = self.get_user_settings(user_id)
+        settings["questions_today"] += 1
+        settings["last_question_date"] = datetime.now().isoformat()
+        return self.save_user_settings(user_id, settings)
+
+    @staticmethod
+    def get_daily_history(settings: Dict[str, Any]) -> Dict[str, int]:
+        """Число заданных вопросов по дням, включая сегодняшний"""
+        history = dict(settings.get("daily_history") or {})
+        daily = Storage._daily_counts(settings)
+        if daily["date"] and daily["questions"]:
+            history[daily["date"]] = daily["questions"]
+        return history
 
     def update_user_settings(self, user_id: str, **kwargs) -> bool:
         settings = self.get_user_settings(user_id)
@@ -82,48 +173,108 @@ class Storage:
         return self.save_user_settings(user_id, settings)
 
     # --- Вопросы-ответы ---
+
+    def get_user_deck(self, user_id: str) -> Dict[str, Any]:
+        """Колода вопросов: {"next_id": N, "items": {"<id>": qa}}"""
+        deck = as_deck(self.backend.load(user_id, KIND_QA))
+        return deck if deck else empty_deck()
     
     def save_user_qa(self, user_id: str, qa_list: List[Dict]) -> bool:
-        return self._save_json_file(self._user_qa_file(user_id), qa_list)
+        """Заменяет колоду целиком; счетчик идентификаторов не уменьшается"""
+        deck = deck_from_list(qa_list, self.get_user_deck(user_id)["next_id"])
+        return self.backend.save(user_id, KIND_QA, deck)
 
     def get_user_qa(self, user_id: str) -> List[Dict]:
-        data = self._load_json_file(self._user_qa_file(user_id))
-        return data if data else []
+        return deck_items(as_deck(self.backend.load(user_id, KIND_QA)))
+
+    def get_user_qa_by_id(self, user_id: str, qa_id: int) -> Optional[Dict]:
+        return self.get_user_deck(user_id)["items"].get(str(qa_id))
 
     def add_user_qa(self, user_id: str, question: str, answer: str) -> bool:
-        qa_list = self.get_user_qa(user_id)
-        qa_list.append({
+        deck = self.get_user_deck(user_id)
+        qa = {
             "question": question,
             "answer": answer,
             "created_date": datetime.now().isoformat(),
-            "id": len(qa_list) + 1
-        })
-        return self.save_user_qa(user_id, qa_list)
+            "id": deck["next_id"]
+        }
+        op = [OP_ADD, qa]
+        if not self.backend.append_deck_ops(user_id, [op]):
+            return False
+        apply_op(deck, op)
+        self.backend.remember(user_id, KIND_QA, deck)
+        return True
+
+    def add_user_qa_many(self, user_id: str, pairs: List[Dict[str, str]]) -> List[Dict]:
+        """
+        Добавляет пачку вопросов одной записью в хранилище.
+        Возвращает добавленные вопросы (пустой список при ошибке записи).
+        """
+        deck = self.get_user_deck(user_id)
+        created_date = datetime.now().isoformat()
+        added = []
+        for qa_id, pair in enumerate(pairs, deck["next_id"]):
+            added.append({
+                "question": pair["question"],
+                "answer": pair["answer"],
+                "created_date": created_date,
+                "id": qa_id
+            })
+        ops = [[OP_ADD, qa] for qa in added]
+        if not ops or not self.backend.append_deck_ops(user_id, ops):
+            return []
+        for op in ops:
+            apply_op(deck, op)
+        self.backend.remember(user_id, KIND_QA, deck)
+        return added
 
     def remove_user_qa(self, user_id: str, qa_id: int) -> bool:
-        qa_list = self.get_user_qa(user_id)
-        qa_list = [qa for qa in qa_list if qa.get('id') != qa_id]
-        return self.save_user_qa(user_id, qa_list)
+        deck = self.get_user_deck(user_id)
+        if str(qa_id) not in deck["items"]:
+            return True
+        cards = self.get_user_cards(user_id)
+        if cards.pop(str(qa_id), None) is not None:
+            self.save_user_cards(user_id, cards)
+        op = [OP_DEL, qa_id]
+        if not self.backend.append_deck_ops(user_id, [op]):
+            return False
+        apply_op(deck, op)
+        self.backend.remember(user_id, KIND_QA, deck)
+        return True
+
+    # --- Интервальное повторение ---
+
+    def get_user_cards(self, user_id: str) -> Dict[str, Dict[str, Any]]:
+        data = self.backend.load(user_id, KIND_CARDS)
+        return data if data else {}
+
+    def save_user_cards(self, user_id: str, cards: Dict[str, Dict[str, Any]]) -> bool:
+        return self.backend.save(user_id, KIND_CARDS, cards)
 
     # --- Текущий вопрос ---
     
     def save_current_question(self, user_id: str, question_data: Dict[str, Any]) -> bool:
-        question_data['asked_at'] = datetime.now().isoformat()
-        return self._save_json_file(self._current_question_file(user_id), question_data)
+        question_data = dict(question_data)
+        question_data.setdefault('asked_at', datetime.now().isoformat())
+        return self.backend.save(user_id, KIND_CURRENT, question_data)
 
     def get_current_question(self, user_id: str) -> Optional[Dict[str, Any]]:
-        data = self._load_json_file(self._current_question_file(user_id))
+        data = self.backend.load(user_id, KIND_CURRENT)
         return data if data else None
 
     def remove_current_question(self, user_id: str) -> bool:
-        file_path = self._current_question_file(user_id)
-        if file_path.exists():
-            try:
-                file_path.unlink()
-                return True
-            except Exception as e:
-                self.logger.error(f"Error deleting {file_path}: {e}")
-        return False
+        return self.backend.delete(user_id, KIND_CURRENT)
+
+    # --- Расписание викторины ---
+
+    def save_schedule(self, user_id: str, chat_id: str, next_due: float) -> bool:
+        return self.backend.save(user_id, KIND_SCHEDULE, {"chat_id": chat_id, "next_due": next_due})
+
+    def get_schedule(self, user_id: str) -> Optional[Dict[str, Any]]:
+        return self.backend.load(user_id, KIND_SCHEDULE)
+
+    def remove_schedule(self, user_id: str) -> bool:
+        return self.backend.delete(user_id, KIND_SCHEDULE)
 
     # --- Статистика ---
     
@@ -137,117 +288,211 @@ class Storage:
             "average_response_time": 0,
             "total_study_time_minutes": 0,
             "last_study_date": None,
-            "question_stats": {}
+            "question_stats": {},
+            "log_seq": 0,
+            "log_tail": 0
         }
 
+    def get_default_question_stats(self) -> Dict[str, Any]:
+        return default_question_stats()
+
     def get_user_stats(self, user_id: str) -> Dict[str, Any]:
-        stats = self._load_json_file(self._user_stats_file(user_id))
+        stats = self.backend.load(user_id, KIND_STATS)
         return stats if stats else self.get_default_stats()
 
     def save_user_stats(self, user_id: str, stats: Dict[str, Any]) -> bool:
-        return self._save_json_file(self._user_stats_file(user_id), stats)
+        stats["log_tail"] = 0
+        return self.backend.save(user_id, KIND_STATS, stats)
 
     def update_user_stats(self, user_id: str, question_id: int = None, correct: bool = None, 
                          response_time: float = None, quality: int = None) -> bool:
+        """
+        Дописывает ответ в журнал и обновляет статистику в памяти.
+
+        Снимок статистики сохраняется только для первого ответа и затем
+        раз в review_snapshot_every ответов, остальные ответы при чтении
+        восстанавливаются из журнала.
+        """
         stats = self.get_user_stats(user_id)
-        
-        stats["total_questions_answered"] += 1
-        if correct:
-            stats["correct_answers"] += 1
-            stats["current_streak"] += 1
-            stats["best_streak"] = max(stats["best_streak"], stats["current_streak"])
-        else:
-            stats["incorrect_answers"] += 1
-            stats["current_streak"] = 0
-        
-        if response_time is not None:
-            total_time = stats["average_response_time"] * (stats["total_questions_answered"] - 1)
-            stats["average_response_time"] = (total_time + response_time) / stats["total_questions_answered"]
-        
-        if question_id is not None:
-            if str(question_id) not in stats["question_stats"]:
-                stats["question_stats"][str(question_id)] = {
-                    "times_asked": 0,
-                    "times_correct": 0,
-                    "total_response_time": 0,
-                    "last_quality": 0,
-                    "last_reviewed": None
-                }
-            
-            q_stats = stats["question_stats"][str(question_id)]
-            q_stats["times_asked"] += 1
-            q_stats["last_reviewed"] = datetime.now().isoformat()
-            
-            if correct:
-                q_stats["times_correct"] += 1
-            
-            if response_time is not None:
-                q_stats["total_response_time"] += response_time
-            
-            if quality is not None:
-                q_stats["last_quality"] = quality
-        
-        stats["last_study_date"] = datetime.now().isoformat()
-        
-        return self.save_user_stats(user_id, stats)
+        record = make_record(stats.get("log_seq", 0) + 1, question_id, correct, response_time, quality)
+        return self._append_log(user_id, stats, record)
+
+    def log_question_sent(self, user_id: str, question_id: Optional[int]) -> bool:
+        """Учитывает отправленный вопрос (last_reviewed, время занятий) записью журнала"""
+        stats = self.get_user_stats(user_id)
+        record = make_asked_record(stats.get("log_seq", 0) + 1, question_id)
+        return self._append_log(user_id, stats, record)
+
+    def _append_log(self, user_id: str, stats: Dict[str, Any], record: List[Any]) -> bool:
+        if not self.backend.append_review(user_id, record):
+            return False
+
+        stats = apply_review(stats, record)
+        if record[SEQ] == 1 or stats["log_tail"] >= config.database.review_snapshot_every:
+            return self.save_user_stats(user_id, stats)
+
+        self.backend.remember(user_id, KIND_STATS, stats)
+        return True
+
+    def iter_user_reviews(self, user_id: str) -> Iterator[List[Any]]:
+        """Журнал ответов пользователя целиком, запись за записью"""
+        return self.backend.iter_reviews(user_id)
 
     def update_question_last_reviewed(self, user_id: str, question_id: int) -> bool:
         stats = self.get_user_stats(user_id)
         
         if str(question_id) not in stats["question_stats"]:
-            stats["question_stats"][str(question_id)] = {
-                "times_asked": 0,
-                "times_correct": 0,
-                "total_response_time": 0,
-                "last_quality": 0,
-                "last_reviewed": None
-            }
+            stats["question_stats"][str(question_id)] = self.get_default_question_stats()
         
         stats["question_stats"][str(question_id)]["last_reviewed"] = datetime.now().isoformat()
         return self.save_user_stats(user_id, stats)
 
     def get_question_stats(self, user_id: str, question_id: int) -> Dict[str, Any]:
-        stats = self.get_user_stats(user_id)
-        return stats["question_stats"].get(str(question_id), {
-            "times_asked": 0,
-            "times_correct": 0,
-            "total_response_time": 0,
-            "last_quality": 0,
-            "last_reviewed": None
-        })
+        q_stats = self.backend.load_question_stats(user_id, question_id)
+        return q_stats or self.get_default_question_stats()
 
     # --- Администрирование ---
     
     def reset_daily_counters(self) -> int:
-        reset_count = 0
-        today = date.today().isoformat()
-        
-        for settings_file in self.data_dir.glob("user_settings_*.json"):
-            try:
-                user_id = settings_file.stem.replace("user_settings_", "")
-                settings = self._load_json_file(settings_file)
-                if settings and settings.get('last_reset_date') != today:
-                    settings['questions_today'] = 0
-                    settings['last_reset_date'] = today
-                    if self._save_json_file(settings_file, settings):
-                        reset_count += 1
-            except Exception as e:
-                self.logger.error(f"Error resetting counters for {settings_file}: {e}")
-        
-        self.logger.info(f"Reset daily counters for {reset_count} users")
-        return reset_count
+        """
+        Оставлено для совместимости: дневные счетчики привязаны к дате и
+        обнуляются сами, обходить пользователей больше не нужно.
+        """
+        return 0
 
     def get_all_user_ids(self) -> List[str]:
-        user_ids = set()
-        
-        for qa_file in self.data_dir.glob("user_*.json"):
-            user_id = qa_file.stem.replace("user_", "")
-            if user_id and not user_id.startswith("settings_") and not user_id.startswith("stats_"):
-                user_ids.add(user_id)
-        
-        for settings_file in self.data_dir.glob("user_settings_*.json"):
-            user_id = settings_file.stem.replace("user_settings_", "")
-            if user_id:
-                user_ids.add(user_id)
-        
-        return list(user_ids)
\ No newline at end of file
+        return self.backend.user_ids()
+
+    def get_active_user_ids(self) -> List[str]:
+        """Пользователи с запущенной викториной (по индексу хранилища)"""
+        return self.backend.user_ids(active_only=True)
+
+    def get_archived_user_ids(self) -> List[str]:
+        """Пользователи, перенесенные в холодное хранилище"""
+        return self.backend.archived_user_ids()
+
+    def iter_archived_users(self) -> Iterator[Tuple[str, Dict[str, Any], List[List[Any]]]]:
+        """
+        Пользователи холодного хранилища, прочитанные прямо из архива:
+        (user_id, документы, журнал ответов). В горячее они не возвращаются.
+        """
+        return self.backend.iter_archived()
+
+    def archive_inactive_users(self, days: float, owns: Optional[Callable[[str], bool]] = None) -> int:
+        """Переносит в холодное хранилище пользователей, не писавших days дней (owns — только своих)"""
+        return len(self.backend.archive_inactive(time.time() - days * 86400, owns))
+
+    # --- Асинхронный фасад ---
+
+    async def aget_user_settings(self, user_id: str) -> Dict[str, Any]:
+        return await self.io.run(user_id, self.get_user_settings, user_id)
+
+    async def asave_user_settings(self, user_id: str, settings: Dict[str, Any]) -> bool:
+        return await self.io.run(user_id, self.save_user_settings, user_id, settings)
+
+    async def aupdate_user_settings(self, user_id: str, **kwargs) -> bool:
+        return await self.io.run(user_id, self.update_user_settings, user_id, **kwargs)
+
+    async def aget_user_deck(self, user_id: str) -> Dict[str, Any]:
+        return await self.io.run(user_id, self.get_user_deck, user_id)
+
+    async def aget_user_qa(self, user_id: str) -> List[Dict]:
+        return await self.io.run(user_id, self.get_user_qa, user_id)
+
+    async def asave_user_qa(self, user_id: str, qa_list: List[Dict]) -> bool:
+        return await self.io.run(user_id, self.save_user_qa, user_id, qa_list)
+
+    async def aadd_user_qa(self, user_id: str, question: str, answer: str) -> bool:
+        return await self.io.run(user_id, self.add_user_qa, user_id, question, answer)
+
+    async def aremove_user_qa(self, user_id: str, qa_id: int) -> bool:
+        return await self.io.run(user_id, self.remove_user_qa, user_id, qa_id)
+
+    async def aget_user_cards(self, user_id: str) -> Dict[str, Dict[str, Any]]:
+        return await self.io.run(user_id, self.get_user_cards, user_id)
+
+    async def asave_user_cards(self, user_id: str, cards: Dict[str, Dict[str, Any]]) -> bool:
+        return await self.io.run(user_id, self.save_user_cards, user_id, cards)
+
+    async def asave_current_question(self, user_id: str, question_data: Dict[str, Any]) -> bool:
+        return await self.io.run(user_id, self.save_current_question, user_id, question_data)
+
+    async def aget_current_question(self, user_id: str) -> Optional[Dict[str, Any]]:
+        return await self.io.run(user_id, self.get_current_question, user_id)
+
+    async def aremove_current_question(self, user_id: str) -> bool:
+        return await self.io.run(user_id, self.remove_current_question, user_id)
+
+    async def asave_schedule(self, user_id: str, chat_id: str, next_due: float) -> bool:
+        return await self.io.run(user_id, self.save_schedule, user_id, chat_id, next_due)
+
+    async def aget_schedule(self, user_id: str) -> Optional[Dict[str, Any]]:
+        return await self.io.run(user_id, self.get_schedule, user_id)
+
+    async def aremove_schedule(self, user_id: str) -> bool:
+        return await self.io.run(user_id, self.remove_schedule, user_id)
+
+    async def aget_user_stats(self, user_id: str) -> Dict[str, Any]:
+        return await self.io.run(user_id, self.get_user_stats, user_id)
+
+    async def asave_user_stats(self, user_id: str, stats: Dict[str, Any]) -> bool:
+        return await self.io.run(user_id, self.save_user_stats, user_id, stats)
+
+    async def aupdate_user_stats(self, user_id: str, question_id: int = None, correct: bool = None,
+                                 response_time: float = None, quality: int = None) -> bool:
+        return await self.io.run(user_id, self.update_user_stats, user_id, question_id,
+                                 correct, response_time, quality)
+
+    async def aupdate_question_last_reviewed(self, user_id: str, question_id: int) -> bool:
+        return await self.io.run(user_id, self.update_question_last_reviewed, user_id, question_id)
+
+    async def aget_question_stats(self, user_id: str, question_id: int) -> Dict[str, Any]:
+        return await self.io.run(user_id, self.get_question_stats, user_id, question_id)
+
+    async def areset_daily_counters(self) -> int:
+        return await self.io.run(None, self.reset_daily_counters)
+
+    async def aget_all_user_ids(self) -> List[str]:
+        return await self.io.run(None, self.get_all_user_ids)
+
+    async def aget_active_user_ids(self) -> List[str]:
+        return await self.io.run(None, self.get_active_user_ids)
+
+    async def aget_archived_user_ids(self) -> List[str]:
+        return await self.io.run(None, self.get_archived_user_ids)
+
+    async def aarchive_inactive_users(self, days: float, owns: Optional[Callable[[str], bool]] = None) -> int:
+        return await self.io.run(None, self.archive_inactive_users, days, owns)
+
+
+class UserSession(Storage):
+    """
+    Единица работы над документами одного пользователя.
+
+    Имеет тот же синхронный интерфейс, что и Storage, но читает документы
+    один раз и откладывает все записи до commit (выход из блока with).
+    Асинхронные a*-методы внутри сессии не используются: они ждут ту же
+    очередь пользователя, которую держит сессия.
+    """
+
+    def __init__(self, storage: Storage, user_id: str):
+        self.data_dir = storage.data_dir
+        self.logger = storage.logger
+        self.cache = storage.cache
+        self.io = storage.io
+        self.user_id = user_id
+        self.backend = SessionBackend(storage.backend, user_id)
+
+    def __enter__(self) -> "UserSession":
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.commit()
+
+    def commit(self) -> bool:
+        """Записывает накопленные изменения"""
+        return self.backend.commit()
+
+    def close(self):
+        """Сессия не владеет хранилищем"""
@@ -0,0 +1,106 @@
+# Copyright (c) 2025 Solovev Ivan, Usenko Evgeny, Alexandrov Arseniy
+
+import random
+from datetime import datetime
+from typing import Dict, List, Optional, Any
+import numpy as np
+
+SECONDS_PER_DAY = 86400
+
+
+def question_weight(q_stats: Dict[str, Any], now: Optional[datetime] = None) -> float:
+    """Вес одного вопроса (скалярная версия, эталон для question_weights)"""
+    now = now or datetime.now()
+    times_asked = q_stats.get('times_asked', 0)
+    times_correct = q_stats.get('times_correct', 0)
+    last_quality = q_stats.get('last_quality', 0)
+    last_reviewed = q_stats.get('last_reviewed')
+
+    weight = 1.0
+
+    if times_asked == 0:
+        weight *= 3.0
+    else:
+        success_rate = times_correct / times_asked
+        if success_rate < 0.3:
+            weight *= 2.5
+        elif success_rate < 0.7:
+            weight *= 1.5
+        else:
+            weight *= 0.7
+
+    if last_reviewed:
+        days_since_review = (now - datetime.fromisoformat(last_reviewed)).days
+        if days_since_review > 30:
+            weight *= 3.0
+        elif days_since_review > 7:
+            weight *= 2.0
+        elif days_since_review > 1:
+            weight *= 1.5
+
+    if last_quality <= 2:
+        weight *= 2.0
+    elif last_quality >= 4:
+        weight *= 0.6
+
+    return max(0.1, weight)
+
+
+def question_weights(qa_list: List[Dict], question_stats: Dict[str, Dict],
+                     now: Optional[datetime] = None) -> np.ndarray:
+    """
+    Веса всех вопросов колоды за один векторный проход.
+
+    question_stats — словарь статистики из документа пользователя,
+    загруженный один раз на выбор вопроса.
+    """
+    now = now or datetime.now()
+    count = len(qa_list)
+
+    has_id = np.zeros(count, dtype=bool)
+    times_asked = np.zeros(count)
+    times_correct = np.zeros(count)
+    last_quality = np.zeros(count)
+    last_reviewed = np.full(count, np.nan)
+
+    for i, qa in enumerate(qa_list):
+        question_id = qa.get('id')
+        if not question_id:
+            continue
+        has_id[i] = True
+        q_stats = question_stats.get(str(question_id))
+        if not q_stats:
+            continue
+        times_asked[i] = q_stats.get('times_asked', 0)
+        times_correct[i] = q_stats.get('times_correct', 0)
+        last_quality[i] = q_stats.get('last_quality', 0)
+        if q_stats.get('last_reviewed'):
+            last_reviewed[i] = datetime.fromisoformat(q_stats['last_reviewed']).timestamp()
+
+    weights = np.ones(count)
+
+    asked = times_asked > 0
+    success_rate = np.divide(times_correct, times_asked, out=np.zeros(count), where=asked)
+    weights *= np.where(~asked, 3.0,
+                        np.where(success_rate < 0.3, 2.5,
+                                 np.where(success_rate < 0.7, 1.5, 0.7)))
+
+    days_since_review = np.floor((now.timestamp() - last_reviewed) / SECONDS_PER_DAY)
+    reviewed = ~np.isnan(days_since_review)
+    days_since_review = np.where(reviewed, days_since_review, 0)
+    weights *= np.where(days_since_review > 30, 3.0,
+                        np.where(days_since_review > 7, 2.0,
+                                 np.where(days_since_review > 1, 1.5, 1.0)))
+
+    weights *= np.where(last_quality <= 2, 2.0, np.where(last_quality >= 4, 0.6, 1.0))
+
+    weights = np.maximum(0.1, weights)
+    weights[~has_id] = 1.0
+    return weights
+
+
+def choose_weighted(qa_list: List[Dict], weights: np.ndarray) -> Dict:
+    """Выбирает вопрос пропорционально весам"""
+    cumulative = np.cumsum(weights)
+    index = int(np.searchsorted(cumulative, random.random() * cumulative[-1], side='right'))
+    return qa_list[min(index, len(qa_list) - 1)]
@@ -0,0 +1,545 @@
+# Copyright (c) 2025 Solovev Ivan, Usenko Evgeny, Alexandrov Arseniy
+
+"""
+Режим нескольких процессов (WORKER_PROCESSES > 0).
+
+Главный процесс только получает обновления Max (long polling) и
+раскладывает их по очередям процессов-обработчиков: пользователь
+закреплен за шардом shard_of(user_id), поэтому все его обновления,
+вопросы викторины, кэш и записи в хранилище живут в одном процессе,
+а порядок его обновлений сохраняется.
+
+Каждый обработчик — обычный бот без polling: свое хранилище с кэшем,
+QuizManager с планировщиком и очередью отправки (лимиты Max API
+делятся между процессами) и хендлеры. Упавший обработчик
+перезапускается с нарастающей паузой; неподтвержденные обновления его
+шарда ждут в главном процессе и уходят новому, а тот поднимает
+активные викторины шарда из хранилища. Внутри шарда обновления разных
+пользователей обрабатываются параллельно (WORKER_CONCURRENCY), а одного
+пользователя — по порядку. Процессы раз в WORKER_METRICS_INTERVAL присылают метрики.
+
+Для резервной копии главный процесс просит все обработчики сбросить кэш
+и приостановить запись (команда quiesce) и снимает каталог данных,
+только когда все подтвердили; после снимка запись возобновляется.
+"""
+
+import asyncio
+import itertools
+import logging
+import multiprocessing
+import os
+import queue
+import signal
+import threading
+import time
+from typing import Any, Dict, List, Optional
+import aiohttp
+from maxapi.exceptions.max import MaxConnection
+from maxapi.types.errors import Error
+from .sharding import shard_of, update_user_id
+
+# Команды администратора касаются всех шардов и рассылаются каждому
+BROADCAST_COMMANDS = ("/dead_letters", "/replay_dead")
+
+POLL_RETRY_DELAY = 5
+IDLE_WAIT = 1
+
+# Команды обработчику идут по тому же каналу, что и обновления
+CMD_QUIESCE = "quiesce"
+CMD_RESUME = "resume"
+# Дольше обработчик не держит запись остановленной, даже если главный процесс пропал
+QUIESCE_HOLD_MAX = 900
+
+
+def _is_broadcast(update: Dict[str, Any]) -> bool:
+    text = ((update.get("message") or {}).get("body") or {}).get("text") or ""
+    command = text.split(maxsplit=1)[0] if text.startswith("/") else ""
+    return command in BROADCAST_COMMANDS
+
+
+class _ShardLink:
+    """
+    Канал к процессу-обработчику шарда (двусторонний Pipe).
+
+    Обновление хранится здесь, пока обработчик не подтвердит его
+    обработку; после перезапуска процесса неподтвержденные обновления
+    отправляются новому в том же порядке (последнее могло быть
+    обработано дважды, если процесс упал посреди него).
+    """
+
+    def __init__(self, index: int, restart_delay: float):
+        self.index = index
+        self.process = None
+        self.conn = None
+        self.generation = 0
+        self.outstanding: Dict[int, Dict[str, Any]] = {}
+        self.report: Optional[Dict[str, Any]] = None
+        self.routed = 0
+        self.restarts = 0
+        self.started = 0.0
+        self.delay = restart_delay
+        self.respawn_at: Optional[float] = None
+
+        self.quiesced_token: Optional[int] = None
+        self.quiesced = threading.Event()
+
+        self._lock = threading.Lock()
+        self._seq = itertools.count()
+        self._pending: queue.Queue = queue.Queue()
+        threading.Thread(target=self._send_loop, name=f"shard-{index}-send", daemon=True).start()
+
+    def connect(self, conn, process):
+        """Новый процесс: неподтвержденные обновления уходят ему заново"""
+        with self._lock:
+            self.generation += 1
+            old, self.conn, self.process = self.conn, conn, process
+            for seq in self.outstanding:
+                self._pending.put((self.generation, seq, None))
+        if old is not None:
+            old.close()
+        threading.Thread(target=self._recv_loop, args=(conn,), name=f"shard-{self.index}-recv", daemon=True).start()
+
+    def submit(self, update: Dict[str, Any]):
+        with self._lock:
+            seq = next(self._seq)
+            self.outstanding[seq] = update
+            self._pending.put((self.generation, seq, None))
+        self.routed += 1
+
+    def command(self, name: str, token: int):
+        """Команда текущему процессу (после перезапуска не повторяется)"""
+        if name == CMD_QUIESCE:
+            self.quiesced.clear()
+            self.quiesced_token = token
+        with self._lock:
+            self._pending.put((self.generation, None, (name, token)))
+
+    def finish(self):
+        """После уже поставленных обновлений процесс получит команду завершиться"""
+        self._pending.put(None)
+
+    def _send_loop(self):
+        while True:
+            item = self._pending.get()
+            with self._lock:
+                conn = self.conn
+                if item is None:
+                    message = None
+                else:
+                    generation, seq, command = item
+                    if generation != self.generation:
+                        continue
+                    if seq is None:
+                        message = command
+                    elif seq in self.outstanding:
+                        message = (seq, self.outstanding[seq])
+                    else:
+                        continue
+            try:
+                conn.send(message)
+            except (OSError, ValueError):
+                # Процесс упал: обновление отправится заново после перезапуска
+                pass
+            if item is None:
+                return
+
+    def _recv_loop(self, conn):
+        while True:
+            try:
+                kind, value = conn.recv()
+            except (EOFError, OSError):
+                return
+            if kind == "ack":
+                with self._lock:
+                    self.outstanding.pop(value, None)
+            elif kind == "report":
+                self.report = value
+            elif kind == "quiesced" and value == self.quiesced_token:
+                self.quiesced.set()
+
+
+class ShardSupervisor:
+    """Главный процесс: маршрутизация обновлений и присмотр за обработчиками"""
+
+    MAX_RESTART_DELAY = 60
+
+    def __init__(self, bot, shards: int, restart_delay: float = 1, metrics_interval: float = 60):
+        self.bot = bot
+        self.shards = shards
+        self.restart_delay = restart_delay
+        self.metrics_interval = metrics_interval
+        self.polling = False
+        self.logger = logging.getLogger(__name__)
+
+        # spawn: обработчик не наследует цикл событий и потоки главного процесса
+        self._ctx = multiprocessing.get_context("spawn")
+        self._links = [_ShardLink(index, restart_delay) for index in range(shards)]
+        self._stopping = False
+        self._quiescing = False
+        self._tokens = itertools.count(1)
+
+    # --- Процессы ---
+
+    def start(self):
+        for link in self._links:
+            self._spawn(link)
+
+    def _spawn(self, link: _ShardLink):
+        conn, child_conn = self._ctx.Pipe()
+        process = self._ctx.Process(
+            target=worker_main,
+            args=(link.index, self.shards, child_conn),
+            name=f"shard-{link.index}"
+        )
+        process.start()
+        # Конец обработчика закрывается здесь, чтобы его падение было видно как EOF
+        child_conn.close()
+        link.connect(conn, process)
+        link.started = time.monotonic()
+        link.respawn_at = None
+        self.logger.info(
+            f"Shard {link.index + 1}/{self.shards} started, pid {process.pid}, "
+            f"{len(link.outstanding)} pending updates"
+        )
+
+    def _check_processes(self):
+        now = time.monotonic()
+        for link in self._links:
+            if link.respawn_at is not None:
+                # Новый процесс начал бы писать посреди снимка — ждем его конца
+                if now >= link.respawn_at and not self._quiescing:
+                    link.restarts += 1
+                    self._spawn(link)
+                continue
+            if link.process is None or link.process.is_alive():
+                continue
+
+            # Падение сразу после старта удваивает паузу, долгая работа ее сбрасывает
+            if now - link.started > self.MAX_RESTART_DELAY:
+                link.delay = self.restart_delay
+            else:
+                link.delay = min(self.MAX_RESTART_DELAY, link.delay * 2)
+            link.respawn_at = now + link.delay
+            self.logger.error(
+                f"Shard {link.index + 1}/{self.shards} (pid {link.process.pid}) exited with code "
+                f"{link.process.exitcode}, restarting in {link.delay:.0f}s; its updates are kept"
+            )
+
+    async def supervise(self):
+        """Перезапускает упавшие обработчики и пишет их метрики в лог"""
+        logged = time.monotonic()
+        while not self._stopping:
+            await asyncio.sleep(IDLE_WAIT)
+            self._check_processes()
+            if self.metrics_interval > 0 and time.monotonic() - logged >= self.metrics_interval:
+                logged = time.monotonic()
+                self._log_stats()
+
+    async def stop(self, timeout: float = 30):
+        """Просит обработчики дообработать свои обновления и завершиться, не дольше timeout"""
+        self._stopping = True
+        self.polling = False
+        for link in self._links:
+            link.finish()
+        deadline = time.monotonic() + timeout
+        for link in self._links:
+            process = link.process
+            if process is None or link.respawn_at is not None:
+                continue
+            await asyncio.to_thread(process.join, max(0.0, deadline - time.monotonic()))
+            if process.is_alive():
+                self.logger.warning(f"Shard {link.index + 1}/{self.shards} did not stop in time, terminating")
+                process.terminate()
+                await asyncio.to_thread(process.join, 5)
+            if link.outstanding:
+                self.logger.warning(
+                    f"Shard {link.index + 1}/{self.shards} stopped with {len(link.outstanding)} unhandled updates"
+                )
+        self.logger.info("All shards stopped")
+
+    async def run_quiesced(self, func, timeout: float = 60):
+        """
+        Выполняет func (в потоке), пока все живые обработчики держат
+        запись остановленной, а их кэши сброшены на диск. Если кто-то
+        не подтвердил остановку за timeout секунд, func не выполняется
+        и возвращается None.
+        """
+        token = next(self._tokens)
+        self._quiescing = True
+        links = [link for link in self._links
+                 if link.respawn_at is None and link.process is not None and link.process.is_alive()]
+        try:
+            for link in links:
+                link.command(CMD_QUIESCE, token)
+            deadline = time.monotonic() + timeout
+            for link in links:
+                if not await asyncio.to_thread(link.quiesced.wait, max(0.0, deadline - time.monotonic())):
+                    self.logger.error(
+                        f"Shard {link.index + 1}/{self.shards} did not pause writes in {timeout:.0f}s, "
+                        f"skipping the snapshot"
+                    )
+                    return None
+            return await asyncio.to_thread(func)
+        finally:
+            for link in links:
+                link.command(CMD_RESUME, token)
+            self._quiescing = False
+
+    # --- Обновления ---
+
+    def route(self, update: Dict[str, Any]) -> int:
+        """Передает обновление шарду его пользователя; возвращает номер шарда (-1 — всем)"""
+        if _is_broadcast(update):
+            for link in self._links:
+                link.submit(update)
+            return -1
+        user_id = update_user_id(update)
+        index = shard_of(user_id, self.shards) if user_id else 0
+        self._links[index].submit(update)
+        return index
+
+    async def poll(self):
+        """Long polling Max API с раскладкой обновлений по шардам (как Dispatcher.start_polling)"""
+        self.polling = True
+        while self.polling:
+            try:
+                events = await self.bot.get_updates(marker=self.bot.marker_updates)
+            except asyncio.TimeoutError:
+                continue
+            except (MaxConnection, aiohttp.ClientError) as e:
+                self.logger.error(f"Polling connection error: {e}, retry in {POLL_RETRY_DELAY}s")
+                await asyncio.sleep(POLL_RETRY_DELAY)
+                continue
+
+            if isinstance(events, Error):
+                self.logger.error(f"Polling error: {events}, retry in {POLL_RETRY_DELAY}s")
+                await asyncio.sleep(POLL_RETRY_DELAY)
+                continue
+
+            self.bot.marker_updates = events.get("marker")
+            for update in events.get("updates", []):
+                try:
+                    self.route(update)
+                except Exception as e:
+                    self.logger.error(f"Failed to route update: {e}")
+
+    # --- Метрики ---
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Метрики по шардам: процесс, перезапуски, необработанные обновления и последний отчет"""
+        return {
+            "shards": [
+                {
+                    "shard": link.index,
+                    "pid": link.process.pid if link.process else None,
+                    "alive": bool(link.process and link.process.is_alive()),
+                    "restarts": link.restarts,
+                    "routed": link.routed,
+                    "pending": len(link.outstanding),
+                    "report": link.report
+                }
+                for link in self._links
+            ]
+        }
+
+    def _log_stats(self):
+        for shard in self.get_stats()["shards"]:
+            report = shard["report"] or {}
+            scheduler = report.get("scheduler") or {}
+            outbox = report.get("outbox") or {}
+            self.logger.info(
+                f"Shard {shard['shard'] + 1}/{self.shards}: pid {shard['pid']}, alive {shard['alive']}, "
+                f"restarts {shard['restarts']}, routed {shard['routed']}, pending {shard['pending']}, "
+                f"handled {report.get('handled', 0)}, active quizzes {report.get('active_users', 0)}, "
+                f"scheduled {scheduler.get('scheduled', 0)}, outbox depth {outbox.get('depth', 0)}, "
+                f"dead letters {report.get('dead_letters', 0)}"
+            )
+
+
+# --- Процесс-обработчик ---
+
+class _UserOrder:
+    """
+    Параллельная обработка обновлений шарда: обновление пользователя ждет
+    только предыдущее обновление того же пользователя. Одновременно
+    выполняется не больше limit обновлений; accept ждет свободного места,
+    так что непринятые обновления остаются в канале.
+    """
+
+    def __init__(self, limit: int):
+        self._slots = asyncio.Semaphore(max(1, limit))
+        self._tails: Dict[Optional[str], asyncio.Task] = {}
+
+    async def accept(self, key: Optional[str], handle) -> asyncio.Task:
+        """Принимает обновление key в работу; handle — корутина-функция обработки"""
+        await self._slots.acquire()
+        task = asyncio.create_task(self._run(self._tails.get(key), handle))
+        self._tails[key] = task
+        task.add_done_callback(lambda done: self._done(key, done))
+        return task
+
+    async def _run(self, previous: Optional[asyncio.Task], handle):
+        try:
+            if previous is not None:
+                await asyncio.wait([previous])
+            await handle()
+        finally:
+            self._slots.release()
+
+    def _done(self, key: Optional[str], task: asyncio.Task):
+        if self._tails.get(key) is task:
+            del self._tails[key]
+
+    async def drain(self):
+        """Дожидается всех принятых обновлений"""
+        while self._tails:
+            await asyncio.wait(list(self._tails.values()))
+
+
+def worker_main(index: int, shards: int, conn):
+    """Точка входа процесса-обработчика шарда"""
+    # Ctrl+C получает вся группа процессов; останавливает их главный процесс
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    asyncio.run(_serve_shard(index, shards, conn))
+
+
+async def _serve_shard(index: int, shards: int, conn):
+    from maxapi import Bot, Dispatcher
+    from maxapi.methods.types.getted_updates import process_update_webhook
+    from core.config import config
+    from core.logger import logger
+    from handlers import register_handlers
+    from .storage import Storage
+    from .quiz_manager import QuizManager
+
+    storage = Storage()
+    bot = Bot(config.bot.token)
+    quiz_manager = QuizManager(bot, storage, shard=(index, shards))
+    quiz_manager.start()
+
+    dp = Dispatcher()
+    register_handlers(dp, quiz_manager, storage)
+    # Подготовка, которую делает start_polling, без запросов к API
+    dp.bot = bot
+    dp.routers.append(dp)
+
+    send_lock = threading.Lock()
+
+    def send(message):
+        # Отвечают и цикл событий, и поток, держащий запись остановленной
+        with send_lock:
+            conn.send(message)
+
+    loop = asyncio.get_running_loop()
+    updates: asyncio.Queue = asyncio.Queue()
+    threading.Thread(
+        target=_read_commands, args=(conn, loop, updates, storage, send), name="shard-recv", daemon=True
+    ).start()
+
+    counters = {"handled": 0, "errors": 0}
+    order = _UserOrder(config.workers.concurrency)
+
+    async def handle(update):
+        try:
+            event = await process_update_webhook(event_json=update, bot=bot)
+            await dp.handle(event)
+            counters["handled"] += 1
+        except Exception as e:
+            counters["errors"] += 1
+            logger.error(f"Shard {index + 1}/{shards} failed to handle update: {e}")
+
+    tasks = [asyncio.create_task(_report_loop(index, quiz_manager, storage, counters, send, config))]
+    if config.database.archive_after_days > 0:
+        tasks.append(asyncio.create_task(_archive_loop(storage, quiz_manager, config)))
+    logger.info(f"Shard {index + 1}/{shards} ready, pid {os.getpid()}")
+
+    try:
+        while True:
+            message = await updates.get()
+            if message is _LOST:
+                logger.error(f"Shard {index + 1}/{shards} lost the main process, stopping")
+                break
+            if message is None:
+                break
+            seq, update = message
+            await order.accept(update_user_id(update), lambda update=update: handle(update))
+            send(("ack", seq))
+        await order.drain()
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await quiz_manager.stop()
+        storage.close()
+        await bot.close_session()
+        logger.info(f"Shard {index + 1}/{shards} stopped")
+
+
+_LOST = object()
+
+
+def _read_commands(conn, loop, updates: asyncio.Queue, storage, send):
+    """
+    Чтение канала в отдельном потоке: команды quiesce/resume выполняются
+    сразу, даже когда цикл событий ждет записи, остановленной quiesce,
+    а обновления по порядку уходят в очередь цикла событий.
+    """
+    resumes: Dict[int, threading.Event] = {}
+    while True:
+        try:
+            message = conn.recv()
+        except (EOFError, OSError):
+            message = _LOST
+        if isinstance(message, tuple) and isinstance(message[0], str):
+            name, token = message
+            if name == CMD_QUIESCE:
+                resumes[token] = threading.Event()
+                threading.Thread(
+                    target=_hold_quiesced, args=(storage, token, resumes[token], send), daemon=True
+                ).start()
+            elif name == CMD_RESUME and token in resumes:
+                resumes.pop(token).set()
+            continue
+        if message is None or message is _LOST:
+            for resume in resumes.values():
+                resume.set()
+        loop.call_soon_threadsafe(updates.put_nowait, message)
+        if message is None or message is _LOST:
+            return
+
+
+def _hold_quiesced(storage, token: int, resume: threading.Event, send):
+    """Сбрасывает кэш и держит запись остановленной до команды resume"""
+    logger = logging.getLogger(__name__)
+    try:
+        # Блокировки quiesce отпускаются в том же потоке, где взяты
+        with storage.quiesce():
+            send(("quiesced", token))
+            if not resume.wait(QUIESCE_HOLD_MAX):
+                logger.warning(f"No resume after {QUIESCE_HOLD_MAX}s, resuming writes")
+    except Exception as e:
+        logger.error(f"Failed to pause writes for a snapshot: {e}")
+
+
+async def _report_loop(index: int, quiz_manager, storage, counters: Dict[str, int], send, config):
+    while True:
+        send(("report", {
+            "shard": index,
+            "pid": os.getpid(),
+            "time": time.time(),
+            "handled": counters["handled"],
+            "errors": counters["errors"],
+            "active_users": len(quiz_manager.active_users),
+            "scheduler": quiz_manager.scheduler.get_stats(),
+            "outbox": quiz_manager.outbox.get_stats(),
+            "cache": storage.get_cache_stats(),
+            "dead_letters": await asyncio.to_thread(quiz_manager.dead_letters.count)
+        }))
+        await asyncio.sleep(config.workers.metrics_interval or 60)
+
+
+async def _archive_loop(storage, quiz_manager, config):
+    """Холодное хранилище: каждый процесс переносит только пользователей своего шарда"""
+    while True:
+        await asyncio.sleep(config.database.archive_interval * 3600)
+        await storage.aarchive_inactive_users(config.database.archive_after_days, quiz_manager.owns)
@@ -0,0 +1,45 @@
+# Copyright (c) 2025 Solovev Ivan, Usenko Evgeny, Alexandrov Arseniy
+
+import os
+import tempfile
+
+import pytest
+
+# core.config читает окружение при импорте: токен не нужен, а каталог
+# данных по умолчанию не должен указывать на настоящий bot_data
+os.environ.setdefault("BOT_TOKEN", "test")
+os.environ["DATA_DIR"] = tempfile.mkdtemp(prefix="quizbot_tests_")
+
+from core.config import config  # noqa: E402
+
+
+@pytest.fixture
+def data_dir(tmp_path, monkeypatch):
+    """Пустой каталог данных теста"""
+    monkeypatch.setattr(config.database, "data_dir", tmp_path)
+    return tmp_path
+
+
+@pytest.fixture
+def make_storage(data_dir, monkeypatch):
+    """
+    Фабрика Storage на каталоге теста: make_storage("sqlite", cache_size=10).
+    Остальные именованные аргументы — поля config.database. Повторный
+    вызов открывает то же хранилище заново (например, после close).
+    """
+    from services.storage import Storage
+
+    storages = []
+
+    def make(backend: str = "json", cache_size: int = 0, **database):
+        monkeypatch.setattr(config.database, "backend", backend)
+        monkeypatch.setattr(config.database, "cache_size", cache_size)
+        for name, value in database.items():
+            monkeypatch.setattr(config.database, name, value)
+        storage = Storage()
+        storages.append(storage)
+        return storage
+
+    yield make
+    for storage in storages:
+        storage.close()
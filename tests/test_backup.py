@@ -0,0 +1,31 @@
+# Copyright (c) 2025 Solovev Ivan, Usenko Evgeny, Alexandrov Arseniy
+
+from services.backup import BackupManager
+
+
+def test_snapshot_keeps_files_as_of_stage(make_storage, tmp_path):
+    storage = make_storage("json")
+    for n in range(5):
+        storage.add_user_qa("u1", f"Q{n}", "A")
+        storage.update_user_stats("u1", question_id=1, correct=True, response_time=1.0, quality=5)
+    manager = BackupManager(storage.data_dir, tmp_path / "backups", storage=storage)
+    reviews = storage.backend._reviews_file("u1")
+
+    with storage.quiesce():
+        staged = manager.stage()
+    expected = reviews.read_bytes()
+    # Запись возобновлена до сжатия: журнал дописывается, профиль подменяется
+    storage.update_user_stats("u1", question_id=1, correct=False, response_time=1.0, quality=1)
+    storage.update_user_settings("u1", daily_goal=3)
+    snapshot_id = manager.finish(staged)
+
+    assert snapshot_id and manager.verify(snapshot_id) == []
+    target = tmp_path / "restored"
+    assert manager.restore(snapshot_id, target)
+    assert (target / reviews.relative_to(storage.data_dir)).read_bytes() == expected
+    assert not list((storage.data_dir / "tmp").glob("backup-*"))
+
+    # Следующий снимок берет неизменившиеся файлы из предыдущего
+    staged = manager.stage()
+    assert staged["pending"] and len(staged["pending"]) < len(staged["files"])
+    manager.finish(staged)
@@ -0,0 +1,75 @@
+# Copyright (c) 2025 Solovev Ivan, Usenko Evgeny, Alexandrov Arseniy
+
+import asyncio
+import random
+
+from services.backends import JsonStorageBackend, KIND_SETTINGS
+from services.cache import CachedBackend
+
+
+class FlakyBackend(JsonStorageBackend):
+    """JSON-хранилище, запись в которое можно сломать"""
+
+    failing = False
+
+    def save_many(self, user_id, docs):
+        if self.failing:
+            return False
+        return super().save_many(user_id, docs)
+
+
+def test_eviction_and_reload_return_latest(tmp_path):
+    cache = CachedBackend(JsonStorageBackend(tmp_path), max_users=2, flush_interval=3600)
+    rng = random.Random(7)
+    expected = {}
+    for step in range(200):
+        user_id = f"u{rng.randrange(6)}"
+        expected[user_id] = {"step": step}
+        cache.save(user_id, KIND_SETTINGS, {"step": step})
+        probe = rng.choice(sorted(expected))
+        assert cache.load(probe, KIND_SETTINGS) == expected[probe]
+        if step % 50 == 49:
+            cache.flush()
+    cache.close()
+
+    backend = JsonStorageBackend(tmp_path)
+    assert {user_id: backend.load(user_id, KIND_SETTINGS) for user_id in expected} == expected
+    backend.close()
+
+
+def test_failed_write_is_kept_until_next_flush(tmp_path):
+    backend = FlakyBackend(tmp_path)
+    cache = CachedBackend(backend, max_users=1, flush_interval=3600)
+
+    backend.failing = True
+    cache.save("a", KIND_SETTINGS, {"v": 1})
+    cache.save("b", KIND_SETTINGS, {"v": 2})
+    assert cache.failed_writes >= 1
+    # Вытесненный пользователь читается из несброшенной копии, а не с диска
+    assert cache.load("a", KIND_SETTINGS) == {"v": 1}
+    assert backend.load("a", KIND_SETTINGS) is None
+
+    backend.failing = False
+    cache.flush()
+    assert backend.load("a", KIND_SETTINGS) == {"v": 1}
+    assert backend.load("b", KIND_SETTINGS) == {"v": 2}
+    assert cache.get_stats()["pending_users"] == 0
+    cache.close()
+
+
+def test_concurrent_sessions_lose_no_updates(make_storage):
+    storage = make_storage(cache_size=3, cache_flush_interval=0.01)
+
+    async def bump(user_id):
+        async with storage.asession(user_id) as session:
+            settings = session.get_user_settings(user_id)
+            session.update_user_settings(user_id, counter=settings.get("counter", 0) + 1)
+
+    async def main():
+        await asyncio.gather(*(bump(f"u{n % 8}") for n in range(400)))
+
+    asyncio.run(main())
+    storage.close()
+
+    reopened = make_storage()
+    assert [reopened.get_user_settings(f"u{n}")["counter"] for n in range(8)] == [50] * 8
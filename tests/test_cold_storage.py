@@ -0,0 +1,87 @@
+# Copyright (c) 2025 Solovev Ivan, Usenko Evgeny, Alexandrov Arseniy
+
+import json
+
+import pytest
+
+
+def raw_backend(storage):
+    return getattr(storage.backend, "backend", storage.backend)
+
+
+def fill(storage, user_id, active=False):
+    for n in range(3):
+        storage.add_user_qa(user_id, f"Q{n}", "A")
+    storage.remove_user_qa(user_id, 2)
+    for n in range(30):
+        storage.update_user_stats(user_id, question_id=1, correct=n % 2 == 0, response_time=2.0, quality=4)
+    storage.update_user_settings(user_id, active=active, daily_goal=7)
+
+
+def state(storage, user_id):
+    return {
+        "settings": storage.get_user_settings(user_id),
+        "deck": storage.get_user_deck(user_id),
+        "stats": storage.get_user_stats(user_id),
+        "reviews": list(storage.iter_user_reviews(user_id)),
+    }
+
+
+@pytest.mark.parametrize("cache_size", [0, 2])
+def test_thaw_round_trip(make_storage, cache_size):
+    # Маленький журнал: у пользователя есть и журнал, и его сжатый архив
+    storage = make_storage("json", cache_size, review_log_max_bytes=256, review_snapshot_every=5)
+    fill(storage, "cold")
+    fill(storage, "busy", active=True)
+    storage.flush()
+    expected = state(storage, "cold")
+    backend = raw_backend(storage)
+    files = [path for path in backend._user_files("cold") if path.exists()]
+    assert len(files) == 4
+
+    # Пользователи с активной викториной в архив не уходят
+    assert storage.archive_inactive_users(-1) == 1
+    assert storage.get_archived_user_ids() == ["cold"]
+    assert not any(path.exists() for path in files)
+    assert backend._pack_file("cold").exists()
+    storage.close()
+
+    storage = make_storage("json", cache_size, review_log_max_bytes=256, review_snapshot_every=5)
+    assert state(storage, "cold") == expected
+    assert storage.get_archived_user_ids() == []
+    assert all(path.exists() for path in files)
+
+
+def test_write_to_archived_user_thaws_first(make_storage):
+    storage = make_storage("json")
+    fill(storage, "cold")
+    assert storage.archive_inactive_users(-1) == 1
+
+    # Запись не создает профиль с нуля поверх архива
+    storage.add_user_qa("cold", "Q3", "A")
+    assert [qa["id"] for qa in storage.get_user_qa("cold")] == [1, 3, 4]
+    assert storage.get_user_settings("cold")["daily_goal"] == 7
+    assert storage.get_archived_user_ids() == []
+
+
+@pytest.mark.parametrize("cache_size", [0, 2])
+def test_export_reads_archived_users_in_place(make_storage, tmp_path, cache_size):
+    from services.exporter import Exporter
+
+    storage = make_storage("json", cache_size, review_log_max_bytes=256, review_snapshot_every=5)
+    fill(storage, "cold")
+    fill(storage, "busy", active=True)
+    storage.flush()
+    exporter = Exporter(storage)
+    before = list(exporter.iter_rows("all", ["cold"]))
+
+    assert storage.archive_inactive_users(-1) == 1
+    out = tmp_path / "dump.jsonl"
+    exporter.export(out, "all")
+
+    rows = [json.loads(line) for line in out.read_text(encoding="utf-8").splitlines()]
+    assert [row for row in rows if row["user_id"] == "cold"] == before
+    assert any(row["user_id"] == "busy" for row in rows)
+    # Экспорт не возвращает пользователя из архива
+    assert storage.get_archived_user_ids() == ["cold"]
+    assert raw_backend(storage)._pack_file("cold").exists()
@@ -0,0 +1,74 @@
+# Copyright (c) 2025 Solovev Ivan, Usenko Evgeny, Alexandrov Arseniy
+
+from datetime import date, datetime
+
+import pytest
+
+import services.storage
+
+
+class Clock(date):
+    current = date(2025, 3, 10)
+
+    @classmethod
+    def today(cls):
+        return cls.current
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    monkeypatch.setattr(services.storage, "date", Clock)
+    Clock.current = date(2025, 3, 10)
+    return Clock
+
+
+@pytest.mark.parametrize("cache_size", [0, 2])
+def test_settings_read_yesterday_do_not_carry_the_count(make_storage, clock, cache_size):
+    storage = make_storage("json", cache_size)
+    for _ in range(3):
+        storage.record_question_asked("u1")
+    settings = storage.get_user_settings("u1")
+    assert settings["questions_today"] == 3
+
+    # Настройки прочитаны вчера, а сохраняются сегодня
+    clock.current = date(2025, 3, 11)
+    settings["daily_goal"] = 5
+    storage.save_user_settings("u1", settings)
+
+    settings = storage.get_user_settings("u1")
+    assert settings["questions_today"] == 0
+    assert settings["daily_goal"] == 5
+    assert storage.get_daily_history(settings) == {"2025-03-10": 3}
+
+    # Первый вопрос нового дня, прочитанного уже сегодня, не теряется
+    clock.current = date(2025, 3, 12)
+    storage.record_question_asked("u1")
+    assert storage.get_user_settings("u1")["questions_today"] == 1
+    assert storage.get_daily_history(storage.get_user_settings("u1")) == {"2025-03-10": 3, "2025-03-12": 1}
+
+
+def test_status_after_daily_goal_points_to_a_later_day(make_storage, clock, monkeypatch):
+    import services.quiz_manager
+    from services.quiz_manager import QuizManager
+    from services.schedule import DAYS
+
+    class Now(datetime):
+        @classmethod
+        def now(cls, tz=None):
+            return cls(2025, 3, 10, 10, 0)
+
+    monkeypatch.setattr(services.quiz_manager, "datetime", Now)
+    storage = make_storage("json")
+    schedule = {day: {"enabled": day != "tuesday", "start": "09:00", "end": "21:00"} for day in DAYS}
+    storage.update_user_settings("u1", daily_goal=2, schedule=schedule)
+    manager = QuizManager(None, storage)
+    manager.active_users["u1"] = "chat"
+
+    storage.record_question_asked("u1")
+    status = manager._calculate_next_possible_question("u1", storage.get_user_settings("u1"))
+    assert status == "в течение интервала"
+
+    # Окно сегодня еще открыто, но вопросов сегодня больше не будет
+    storage.record_question_asked("u1")
+    status = manager._calculate_next_possible_question("u1", storage.get_user_settings("u1"))
+    assert status == "цель на сегодня выполнена, следующий доступный день: среда в 09:00"
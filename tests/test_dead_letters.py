@@ -0,0 +1,92 @@
+# Copyright (c) 2025 Solovev Ivan, Usenko Evgeny, Alexandrov Arseniy
+
+import asyncio
+
+import pytest
+from maxapi.types.errors import Error
+
+from core.config import config
+from services.dead_letters import DeadLetterStore
+
+
+def question(user_id, qa_id):
+    return {"user_id": user_id, "qa": {"id": qa_id, "question": "Q", "answer": "A"}}
+
+
+def test_repeated_question_failures_share_one_letter(tmp_path):
+    store = DeadLetterStore(tmp_path / "dead_letters.db")
+    first = store.add("c1", None, "question", "Q", question("u1", 1), "HTTP 503", 4)
+    store.add("c2", None, "message", "hi", None, "HTTP 503", 4)
+    assert store.add("c1", None, "question", "Q", question("u1", 1), "HTTP 502", 4) == first
+    store.add("c1", None, "question", "Q", question("u1", 2), "HTTP 503", 4)
+    store.add("c2", None, "message", "hi", None, "HTTP 503", 4)
+
+    letters = store.list()
+    assert len(letters) == 4
+    assert letters[0]["id"] == first
+    assert letters[0]["error"] == "HTTP 502" and letters[0]["attempts"] == 8
+    store.close()
+
+
+class RefusingBot:
+    def __init__(self, code):
+        self.code = code
+
+    async def send_message(self, chat_id=None, user_id=None, text=None, **kwargs):
+        return Error(code=self.code, raw={})
+
+
+@pytest.mark.parametrize("code, stopped", [(503, False), (403, True)])
+def test_permanent_failure_stops_the_quiz(make_storage, monkeypatch, code, stopped):
+    from services.quiz_manager import QuizManager
+
+    monkeypatch.setattr(config.outbox, "retry_delay", 0.01)
+    monkeypatch.setattr(config.outbox, "chat_rate", 0)
+    storage = make_storage()
+    schedule = {day: {"start": "00:00", "end": "23:59", "enabled": True} for day in config.get_default_schedule()}
+    storage.add_user_qa("u1", "Q", "A")
+    storage.update_user_settings("u1", active=True, daily_goal=100, schedule=schedule)
+    manager = QuizManager(RefusingBot(code), storage)
+
+    async def fire():
+        manager.outbox.start()
+        await manager.start_quiz_for_user("u1", "chat-u1")
+        await manager._on_timer("u1")
+        await manager._on_timer("u1")
+        await manager.outbox.stop()
+
+    try:
+        asyncio.run(fire())
+        assert storage.get_user_settings("u1")["active"] is not stopped
+        assert ("u1" in manager.scheduler) is not stopped
+        assert manager.dead_letters.count() == 1
+    finally:
+        manager.dead_letters.close()
+
+
+def test_posted_reply_does_not_wait_and_is_dead_lettered(tmp_path):
+    from services.outbox import Outbox
+
+    class SlowRefusingBot:
+        async def send_message(self, chat_id=None, user_id=None, text=None, **kwargs):
+            await asyncio.sleep(0.2)
+            return Error(code=503, raw={})
+
+    store = DeadLetterStore(tmp_path / "dead_letters.db")
+    outbox = Outbox(SlowRefusingBot(), retries=1, retry_delay=0.01, chat_rate=0, dead_letters=store)
+
+    async def run():
+        outbox.start()
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        future = outbox.post(chat_id="c1", text="hi")
+        assert loop.time() - started < 0.05
+        assert not future.done()
+        await asyncio.wait([future])
+        await outbox.stop()
+
+    asyncio.run(run())
+    letters = store.list()
+    assert len(letters) == 1
+    assert letters[0]["kind"] == "message" and letters[0]["attempts"] == 2
+    store.close()
@@ -0,0 +1,57 @@
+# Copyright (c) 2025 Solovev Ivan, Usenko Evgeny, Alexandrov Arseniy
+
+import pytest
+
+from services.backends import JsonStorageBackend
+from services.deck import OP_ADD, OP_DEL, apply_op, compacted_ops, deck_from_list, empty_deck
+
+
+def ids(storage, user_id):
+    return [qa["id"] for qa in storage.get_user_qa(user_id)]
+
+
+def test_compaction_keeps_counter_after_removing_last():
+    deck = empty_deck()
+    for qa_id in (1, 2, 3):
+        apply_op(deck, [OP_ADD, {"id": qa_id, "question": "q", "answer": "a"}])
+    apply_op(deck, [OP_DEL, 3])
+
+    rebuilt = empty_deck()
+    for op in compacted_ops(deck):
+        apply_op(rebuilt, op)
+    assert rebuilt == deck
+    assert rebuilt["next_id"] == 4
+
+
+def test_legacy_duplicate_ids_are_renumbered():
+    deck = deck_from_list([{"id": 1}, {"id": 2}, {"id": 2}, {}])
+    assert list(deck["items"]) == ["1", "2", "3", "4"]
+    assert deck["next_id"] == 5
+
+
+@pytest.mark.parametrize("backend", ["json", "sqlite"])
+@pytest.mark.parametrize("cache_size", [0, 2])
+def test_ids_stay_monotonic_across_remove_and_compaction(make_storage, monkeypatch, backend, cache_size):
+    # Журнал колоды JSON сжимается уже после пары удалений
+    monkeypatch.setattr(JsonStorageBackend, "DECK_COMPACT_MIN", 2)
+    storage = make_storage(backend, cache_size)
+    for n in range(5):
+        assert storage.add_user_qa("u1", f"Q{n}", "A")
+    storage.remove_user_qa("u1", 5)
+    storage.remove_user_qa("u1", 3)
+    storage.remove_user_qa("u1", 4)
+    assert ids(storage, "u1") == [1, 2]
+    storage.close()
+
+    storage = make_storage(backend, cache_size)
+    storage.add_user_qa("u1", "Q5", "A")
+    assert ids(storage, "u1") == [1, 2, 6]
+
+    # Замена колоды целиком тоже не возвращает счетчик назад
+    storage.save_user_qa("u1", [])
+    storage.add_user_qa("u1", "Q6", "A")
+    storage.close()
+
+    storage = make_storage(backend, cache_size)
+    assert ids(storage, "u1") == [7]
+    assert storage.get_user_deck("u1")["next_id"] == 8
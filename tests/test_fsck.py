@@ -0,0 +1,47 @@
+# Copyright (c) 2025 Solovev Ivan, Usenko Evgeny, Alexandrov Arseniy
+
+import json
+import sqlite3
+
+from core.config import config
+from services.deck import as_deck
+from services.fsck import DataChecker
+
+
+def test_legacy_files_get_per_user_checks(data_dir):
+    qa = [{"id": 1, "question": "Q1", "answer": "A"}, {"id": 1, "question": "Q2", "answer": "A"}]
+    stats = {"question_stats": {"1": {"times_asked": 1}, "7": {"times_asked": 2}}}
+    settings = {"active": False, "schedule": {"start_time": "25:00", "end_time": "10:00"}}
+    (data_dir / "user_u1.json").write_text(json.dumps(qa), encoding="utf-8")
+    (data_dir / "user_stats_u1.json").write_text(json.dumps(stats), encoding="utf-8")
+    (data_dir / "user_settings_u1.json").write_text(json.dumps(settings), encoding="utf-8")
+    (data_dir / "current_u1.json").write_text(json.dumps({"id": 9, "question": "Q9"}), encoding="utf-8")
+
+    result = DataChecker(data_dir, workers=1).run()
+    assert result.users == 1
+    assert result.counts() == {"duplicate_ids": 1, "orphaned_stats": 1, "bad_schedule": 1}
+
+    result = DataChecker(data_dir, workers=1, repair=True, default_schedule=config.get_default_schedule()).run()
+    assert result.repaired == 3
+    assert DataChecker(data_dir, workers=1).run().issues == []
+    deck = as_deck(json.loads((data_dir / "user_u1.json").read_text(encoding="utf-8")))
+    assert sorted(deck["items"]) == ["1", "2"]
+    assert not (data_dir / "current_u1.json").exists()
+
+
+def test_sqlite_orphaned_question_stats(make_storage, data_dir):
+    storage = make_storage("sqlite")
+    storage.add_user_qa("u1", "Q1", "A")
+    storage.add_user_qa("u1", "Q2", "A")
+    storage.update_user_stats("u1", question_id=2, correct=True, response_time=1.0, quality=5)
+    storage.close()
+    db = next(data_dir.glob("*.db"))
+    with sqlite3.connect(db) as conn:
+        conn.execute("DELETE FROM qa_pairs WHERE user_id = 'u1' AND qa_id = 2")
+        conn.execute("INSERT INTO question_stats (user_id, question_id) VALUES ('gone', '1')")
+
+    result = DataChecker(data_dir, workers=1).run()
+    assert [(issue.kind, issue.detail) for issue in result.issues] == [("orphaned_rows", "2 question_stats rows")]
+
+    assert DataChecker(data_dir, workers=1, repair=True).run().repaired == 1
+    assert DataChecker(data_dir, workers=1).run().issues == []
@@ -0,0 +1,178 @@
+# Copyright (c) 2025 Solovev Ivan, Usenko Evgeny, Alexandrov Arseniy
+
+import asyncio
+import os
+import time
+
+import pytest
+
+from core.config import config
+from services.leases import LeaseStore
+
+TTL = 0.3
+
+
+@pytest.fixture
+def replicas(tmp_path):
+    stores = [LeaseStore(tmp_path / "leases.db", owner=owner, ttl=TTL) for owner in ("a", "b")]
+    yield stores
+    for store in stores:
+        store.close()
+
+
+def test_lease_is_taken_over_on_expiry(replicas):
+    a, b = replicas
+    assert a.acquire("u1")
+    assert not b.acquire("u1")
+    assert b.held_by_others() == {"u1"}
+
+    # Реплика a упала: никто не продлевает ее аренду
+    time.sleep(TTL * 1.5)
+    assert a.owned() == set()
+    assert b.acquire("u1")
+    assert b.owned() == {"u1"}
+
+    # Вернувшаяся a не может ни продлить, ни перехватить чужую аренду
+    a.heartbeat()
+    assert not a.acquire("u1")
+    assert a.owned() == set()
+
+
+def test_heartbeat_keeps_lease_and_release_frees_it(replicas):
+    a, b = replicas
+    assert a.acquire("u1")
+    for _ in range(3):
+        time.sleep(TTL / 3)
+        assert a.heartbeat() == 1
+    assert not b.acquire("u1")
+
+    a.release("u1")
+    assert b.acquire("u1")
+    assert b.heartbeat() == 2
+
+
+class StealingBot:
+    """Пока вопрос отправляется, аренду пользователя забирает другая реплика"""
+
+    def __init__(self, other: LeaseStore = None):
+        self.manager = None
+        self.other = other
+
+    async def send_message(self, chat_id=None, user_id=None, text=None, **kwargs):
+        if self.other:
+            self.manager.leases.release("u1")
+            assert self.other.acquire("u1")
+        return {"ok": True}
+
+
+@pytest.mark.parametrize("stolen", [False, True])
+def test_question_is_not_recorded_after_lease_loss(make_storage, monkeypatch, data_dir, stolen):
+    from services.quiz_manager import QuizManager
+
+    monkeypatch.setattr(config.quiz, "lease_ttl", 30)
+    monkeypatch.setattr(config.quiz, "replica_id", "a")
+    storage = make_storage()
+    schedule = {day: {"start": "00:00", "end": "23:59", "enabled": True} for day in config.get_default_schedule()}
+    storage.add_user_qa("u1", "Q", "A")
+    storage.update_user_settings("u1", active=True, daily_goal=100, schedule=schedule)
+
+    other = LeaseStore(data_dir / "leases.db", owner="b", ttl=30)
+    bot = StealingBot(other if stolen else None)
+    manager = bot.manager = QuizManager(bot, storage)
+
+    async def fire():
+        await manager.start_quiz_for_user("u1", "chat-u1")
+        await manager._on_timer("u1")
+
+    try:
+        asyncio.run(fire())
+        current = storage.get_current_question("u1")
+        if stolen:
+            assert current is None
+            assert "u1" not in manager.active_users
+            assert other.owned() == {"u1"}
+        else:
+            assert current["question"] == "Q"
+            assert "u1" in manager.scheduler
+    finally:
+        manager.dead_letters.close()
+        manager.leases.close()
+        other.close()
+
+
+def test_replicas_run_without_user_cache(make_storage, monkeypatch):
+    monkeypatch.setattr(config.quiz, "lease_ttl", 30)
+    storage = make_storage(cache_size=100)
+    assert storage.cache is None
+
+
+def test_change_on_other_replica_resets_due_queue(make_storage, monkeypatch, data_dir):
+    from services.quiz_manager import QuizManager
+
+    monkeypatch.setattr(config.quiz, "lease_ttl", 30)
+    storage = make_storage()
+    schedule = {day: {"start": "00:00", "end": "23:59", "enabled": True} for day in config.get_default_schedule()}
+    storage.add_user_qa("u1", "Q", "A")
+    storage.update_user_settings("u1", active=True, daily_goal=100, schedule=schedule)
+
+    managers = []
+    for replica in ("a", "b"):
+        monkeypatch.setattr(config.quiz, "replica_id", replica)
+        managers.append(QuizManager(StealingBot(), storage))
+    a, b = managers
+
+    async def run():
+        await a.start_quiz_for_user("u1", "chat-u1")
+        with storage.session("u1") as session:
+            assert a.repetition.pick_due(session, session.get_user_qa("u1")) is not None
+        assert "u1" in a.repetition._queues
+
+        # Ответ пришел на реплику b: у владельца a очередь устарела
+        await b.user_changed("u1", reviewed=True)
+        await a._balance_leases()
+        assert "u1" not in a.repetition._queues
+        assert "u1" in a.active_users
+
+    try:
+        asyncio.run(run())
+    finally:
+        for manager in managers:
+            manager.scheduler.cancel("u1")
+            manager.dead_letters.close()
+            manager.leases.close()
+
+
+def _count_in_kind(data_dir, kind, count):
+    from services.backends import JsonStorageBackend
+
+    # Документ kind пишет только этот процесс: потерять приращение может
+    # лишь запись другого процесса поверх профиля, прочитанного раньше
+    backend = JsonStorageBackend(data_dir)
+    for _ in range(count):
+        doc = backend.load("u1", kind) or {"n": 0}
+        backend.save("u1", kind, {"n": doc["n"] + 1})
+    backend.close()
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="нужен fork")
+def test_profile_writes_from_two_processes_keep_both_documents(data_dir):
+    import multiprocessing
+
+    from services.backends import JsonStorageBackend, KIND_SETTINGS, KIND_STATS
+
+    count = 200
+    ctx = multiprocessing.get_context("fork")
+    workers = [ctx.Process(target=_count_in_kind, args=(data_dir, kind, count))
+               for kind in (KIND_SETTINGS, KIND_STATS)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+        assert worker.exitcode == 0
+
+    backend = JsonStorageBackend(data_dir)
+    try:
+        assert backend.load("u1", KIND_SETTINGS) == {"n": count}
+        assert backend.load("u1", KIND_STATS) == {"n": count}
+    finally:
+        backend.close()
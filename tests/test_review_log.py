@@ -0,0 +1,76 @@
+# Copyright (c) 2025 Solovev Ivan, Usenko Evgeny, Alexandrov Arseniy
+
+import json
+
+import pytest
+
+from services.review_log import replay, SEQ
+
+ANSWERS = 60
+
+
+def answer_all(storage, user_id):
+    for n in range(ANSWERS):
+        with storage.session(user_id) as session:
+            session.update_user_stats(user_id, question_id=n % 4 + 1, correct=n % 3 != 0,
+                                      response_time=1.0 + n % 5, quality=n % 6)
+
+
+@pytest.mark.parametrize("backend", ["json", "sqlite"])
+@pytest.mark.parametrize("cache_size", [0, 2])
+def test_replay_matches_snapshot(make_storage, backend, cache_size):
+    # Частые снимки и маленький журнал: записи уходят в архив по ходу теста
+    storage = make_storage(backend, cache_size, review_snapshot_every=7, review_log_max_bytes=256)
+    answer_all(storage, "u1")
+    expected = storage.get_user_stats("u1")
+    assert expected["log_seq"] == ANSWERS
+
+    records = list(storage.iter_user_reviews("u1"))
+    assert [record[SEQ] for record in records] == list(range(1, ANSWERS + 1))
+    replayed = replay(storage.get_default_stats(), records)
+    assert replayed["question_stats"] == expected["question_stats"]
+    assert replayed["log_seq"] == expected["log_seq"]
+    storage.close()
+
+    # Снимок на диске плюс хвост журнала дают ту же статистику
+    reopened = make_storage(backend)
+    assert reopened.get_user_stats("u1") == expected
+    assert [record[SEQ] for record in reopened.iter_user_reviews("u1")] == list(range(1, ANSWERS + 1))
+
+
+def test_sqlite_log_keeps_only_unsnapshotted_tail(make_storage):
+    storage = make_storage("sqlite", review_snapshot_every=7)
+    answer_all(storage, "u1")
+    conn = storage.backend._conn
+    snapshot = json.loads(conn.execute("SELECT data FROM user_stats WHERE user_id = 'u1'").fetchone()[0])
+    live = [row[0] for row in conn.execute("SELECT seq FROM reviews WHERE user_id = 'u1' ORDER BY seq")]
+    archived = [row[0] for row in conn.execute("SELECT seq FROM reviews_archive WHERE user_id = 'u1' ORDER BY seq")]
+    assert archived == list(range(1, snapshot["log_seq"] + 1))
+    assert live == list(range(snapshot["log_seq"] + 1, ANSWERS + 1))
+
+
+@pytest.mark.parametrize("backend", ["json", "sqlite"])
+def test_sent_questions_are_logged_without_snapshots(make_storage, backend):
+    from services.backends import KIND_STATS
+    from services.exporter import Exporter
+
+    storage = make_storage(backend, review_snapshot_every=10)
+    storage.update_user_stats("u1", question_id=1, correct=True, response_time=2.0, quality=5)
+
+    saves = []
+    save_many = storage.backend.save_many
+    storage.backend.save_many = lambda user_id, docs: saves.append(set(docs)) or save_many(user_id, docs)
+    for n in range(8):
+        with storage.session("u1") as session:
+            session.log_question_sent("u1", n % 2 + 2)
+    assert not any(KIND_STATS in kinds for kinds in saves)
+
+    stats = storage.get_user_stats("u1")
+    assert stats["log_seq"] == 9
+    assert stats["total_questions_answered"] == 1
+    assert stats["question_stats"]["2"]["last_reviewed"] is not None
+    assert stats["question_stats"]["3"]["times_asked"] == 0
+    assert len(list(Exporter(storage).iter_reviews("u1"))) == 1
+    storage.close()
+
+    assert make_storage(backend).get_user_stats("u1") == stats
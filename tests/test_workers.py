@@ -0,0 +1,140 @@
+# Copyright (c) 2025 Solovev Ivan, Usenko Evgeny, Alexandrov Arseniy
+
+import asyncio
+import multiprocessing
+import os
+import socket
+import subprocess
+import sys
+import time
+
+import pytest
+
+from services.backends import JsonStorageBackend
+from services.sharding import shard_of
+from services.workers import CMD_QUIESCE, ShardSupervisor, _ShardLink, _UserOrder
+
+
+def message(user_id, text="hi"):
+    return {"update_type": "message_created",
+            "message": {"sender": {"user_id": user_id}, "body": {"text": text}}}
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            pytest.fail("condition not reached")
+        time.sleep(0.01)
+
+
+def connect(link):
+    """Вместо процесса-обработчика — второй конец Pipe"""
+    conn, worker_conn = multiprocessing.Pipe()
+    link.connect(conn, None)
+    return worker_conn
+
+
+def test_updates_are_routed_by_user_and_broadcast():
+    supervisor = ShardSupervisor(None, 3)
+    workers = [connect(link) for link in supervisor._links]
+
+    user_ids = [str(n) for n in range(12)]
+    for user_id in user_ids:
+        assert supervisor.route(message(int(user_id))) == shard_of(user_id, 3)
+    assert supervisor.route(message(1, "/dead_letters")) == -1
+
+    for index, worker in enumerate(workers):
+        expected = [user_id for user_id in user_ids if shard_of(user_id, 3) == index]
+        received = [worker.recv()[1] for _ in expected]
+        assert [str(update["message"]["sender"]["user_id"]) for update in received] == expected
+        assert worker.recv()[1]["message"]["body"]["text"] == "/dead_letters"
+
+
+def test_unacked_updates_are_replayed_after_restart():
+    link = _ShardLink(0, restart_delay=0)
+    worker = connect(link)
+    for n in range(3):
+        link.submit({"n": n})
+    received = [worker.recv() for _ in range(3)]
+    assert [update["n"] for _, update in received] == [0, 1, 2]
+
+    worker.send(("ack", received[0][0]))
+    wait_for(lambda: len(link.outstanding) == 2)
+
+    # Новый процесс получает только неподтвержденные, в прежнем порядке
+    restarted = connect(link)
+    assert [restarted.recv()[1]["n"] for _ in range(2)] == [1, 2]
+
+
+def test_quiesce_waits_for_matching_token():
+    link = _ShardLink(0, restart_delay=0)
+    worker = connect(link)
+    link.command(CMD_QUIESCE, 5)
+    assert worker.recv() == (CMD_QUIESCE, 5)
+
+    worker.send(("quiesced", 4))
+    assert not link.quiesced.wait(0.2)
+    worker.send(("quiesced", 5))
+    assert link.quiesced.wait(5)
+
+
+@pytest.mark.skipif(os.name == "nt", reason="проверка pid только в POSIX")
+def test_temp_dirs_of_other_processes(tmp_path):
+    tmp_root = tmp_path / "tmp"
+    host = socket.gethostname()
+    finished = subprocess.Popen([sys.executable, "-c", "pass"])
+    finished.wait()
+
+    dead = tmp_root / f"{host}-{finished.pid}"
+    alive = tmp_root / f"{host}-{os.getppid()}"
+    remote = tmp_root / "other-host-42"
+    for directory in (dead, alive, remote):
+        directory.mkdir(parents=True)
+        (directory / ".profile.json.fresh.tmp").write_text("{}")
+    old = remote / ".profile.json.old.tmp"
+    old.write_text("{}")
+    stale = time.time() - JsonStorageBackend.STALE_TEMP_AGE - 60
+    os.utime(old, (stale, stale))
+
+    backend = JsonStorageBackend(tmp_path)
+    try:
+        assert not dead.exists()
+        assert (alive / ".profile.json.fresh.tmp").exists()
+        # Живость процесса на другой машине не проверить: удаляется только старое
+        assert (remote / ".profile.json.fresh.tmp").exists()
+        assert not old.exists()
+        assert backend.tmp_dir.is_dir()
+    finally:
+        backend.close()
+
+
+def test_users_are_handled_concurrently_in_order():
+    log = []
+
+    async def run():
+        order = _UserOrder(limit=16)
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+
+        def handler(user_id, n):
+            async def handle():
+                log.append(("start", user_id, n))
+                await asyncio.sleep(0.1)
+                log.append(("end", user_id, n))
+            return handle
+
+        for n in range(3):
+            for user_id in ("u1", "u2", "u3"):
+                await order.accept(user_id, handler(user_id, n))
+        # Приняты сразу, без ожидания обработки
+        assert loop.time() - started < 0.05
+        await order.drain()
+        return loop.time() - started
+
+    elapsed = asyncio.run(run())
+    # Три пользователя параллельно, по три обновления каждого подряд
+    assert elapsed < 0.25 * 3
+    for user_id in ("u1", "u2", "u3"):
+        events = [(kind, n) for kind, user, n in log if user == user_id]
+        assert events == [(kind, n) for n in range(3) for kind in ("start", "end")]
@@ -164,9 +164,9 @@ class Validators:
         }
 
     @staticmethod
-    def validate_question_id(qa_id: Any, qa_list: list) -> Tuple[bool, Optional[str], Optional[Dict]]:
+    def validate_question_id(qa_id: Any, questions: Dict[str, Dict]) -> Tuple[bool, Optional[str], Optional[Dict]]:
         """
-        Валидирует ID вопроса
+        Валидирует ID вопроса по вопросам колоды ({"<id>": qa})
         
         Returns:
             Tuple[bool, Optional[str], Optional[Dict]]: 
@@ -177,7 +177,7 @@ class Validators:
         except (ValueError, TypeError):
             return False, "ID вопроса должен быть числом", None
         
-        question = next((q for q in qa_list if q.get('id') == qa_id_int), None)
+        question = questions.get(str(qa_id_int))
         if not question:
             return False, f"Вопрос с ID {qa_id_int} не найден", None
         